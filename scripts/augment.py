@@ -1,63 +1,185 @@
 import os
 import json
+import time
+import argparse
 import numpy as np
-from augment_utils import AUGMENTATIONS
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from augment_utils import AUGMENTATIONS, apply_batch, task_hash
 from tqdm import tqdm
 
 
 base_path = "/home/tangwenhao/Workspace/ARC"
 
-def augment_data(version: int, split: str, name: str):
+
+def write_json_atomic(path: str, data):
+    """
+    Write JSON to a temporary file and move it into place, so readers never see a partial file.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def manifest_path(split: str) -> str:
+    # Kept next to the split directories rather than inside them, where the dataset and visualization
+    # walkers would read it as a task file
+    return os.path.join(base_path, "data", f"manifest_{split}.json")
+
+
+def load_manifest(split: str) -> dict:
+    """
+    Load the augmentation manifest of a split:
+    {name: {"version": int, "done": [augmentation ids], "hashes": {id: task hash}, "aliases": {id: id it duplicates}}}.
+    A manifest left at the old location, data/<split>/manifest.json, is moved to the current one.
+    """
+    path = manifest_path(split)
+    legacy_path = os.path.join(base_path, "data", split, "manifest.json")
+    if os.path.exists(legacy_path):
+        if os.path.exists(path):
+            os.remove(legacy_path)
+        else:
+            os.replace(legacy_path, path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(split: str, manifest: dict):
+    path = manifest_path(split)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, manifest)
+
+
+def augment_data(version: int, split: str, name: str, augment_ids=None, known_hashes=None, dedup=True):
     """
     Augment the data for a given episode.
+    Only the augmentations in `augment_ids` are produced (all of them if None).
+    With `dedup`, an augmented task identical to an earlier one (including those in `known_hashes`,
+    {id: hash} from a previous run) is not written and is recorded as an alias instead.
+    Returns (name, {id: hash} of the produced augmentations, {id: aliased id}, number of written grids).
     """
     input_path = os.path.join(base_path, f"ARC-AGI-{version}", "data", split, f"{name}.json")
     output_dir = os.path.join(base_path, "data", split)
     os.makedirs(output_dir, exist_ok=True)
 
+    if augment_ids is None:
+        augment_ids = sorted(AUGMENTATIONS)
+
     with open(input_path, 'r') as f:
         data = json.load(f)
-        train_data = data['train']
-        test_data = data['test']
-
-    for i in range(len(AUGMENTATIONS)):
-        augment_train_data = []
-        augment_test_data = []
-        for item in train_data:
-            augmented_input = AUGMENTATIONS[i](np.array(item['input'])).tolist()
-            augmented_output = AUGMENTATIONS[i](np.array(item['output'])).tolist()
-            augment_train_data.append({
-                'input': augmented_input,
-                'output': augmented_output
-            })
-
-        for item in test_data:
-            augmented_input = AUGMENTATIONS[i](np.array(item['input'])).tolist()
-            augmented_output = AUGMENTATIONS[i](np.array(item['output'])).tolist()
-            augment_test_data.append({
-                'input': augmented_input,
-                'output': augmented_output
-            })
+    # Convert every grid once, instead of once per augmentation
+    train_data = [(np.array(item['input']), np.array(item['output'])) for item in data['train']]
+    test_data = [(np.array(item['input']), np.array(item['output'])) for item in data['test']]
+
+    # Every grid of the task goes through each augmentation in one batched call
+    grids = [grid for pair in train_data + test_data for grid in pair]
+    num_train = len(train_data)
+
+    seen = {}
+    for i, digest in sorted((known_hashes or {}).items()):
+        seen.setdefault(digest, i)
+
+    hashes, aliases = {}, {}
+    num_grids = 0
+    for i in augment_ids:
+        augmented = apply_batch(AUGMENTATIONS[i], grids)
+        hashes[i] = task_hash(augmented[:2 * num_train]) + task_hash(augmented[2 * num_train:])
+        if dedup and hashes[i] in seen:
+            aliases[i] = seen[hashes[i]]
+            continue
+        seen[hashes[i]] = i
+
+        augmented = [grid.tolist() for grid in augmented]
+        pairs = [{'input': augmented[j], 'output': augmented[j + 1]} for j in range(0, len(augmented), 2)]
 
         output_path = os.path.join(output_dir, f"{name}_{i:02d}.json")
-        with open(output_path, 'w') as f:
-            json.dump({
-                'train': augment_train_data,
-                'test': augment_test_data
-            }, f)
+        write_json_atomic(output_path, {
+            'train': pairs[:num_train],
+            'test': pairs[num_train:]
+        })
+        num_grids += len(grids)
 
+    return name, hashes, aliases, num_grids
 
-if __name__ == "__main__":
-    version = 2
-    split = "training"
-    
-    name_list = [
+
+def augment_split(version: int, split: str, num_workers: int = None, save_every: int = 50, dedup: bool = True):
+    """
+    Augment every task of a split with a process pool.
+    Completion is tracked per task and per augmentation in the manifest, so an interrupted run
+    resumes with exactly the missing augmentations.
+    Returns throughput and deduplication metrics.
+    """
+    names = sorted(
         name.split('.')[0] for name in os.listdir(os.path.join(base_path, f"ARC-AGI-{version}", "data", split))
         if name.endswith('.json')
-    ]
-    for name in tqdm(name_list, desc="Augmenting data"):
-        if os.path.exists(os.path.join(base_path, "data", split, f"{name}_00.json")):
-            continue
-        augment_data(version, split, name)
+    )
+    all_ids = sorted(AUGMENTATIONS)
+
+    manifest = load_manifest(split)
+    pending = {}
+    for name in names:
+        done = set(manifest.get(name, {}).get("done", []))
+        missing = [i for i in all_ids if i not in done]
+        if missing:
+            pending[name] = missing
+
+    num_tasks, num_grids, num_augmented, num_duplicates = 0, 0, 0, 0
+    start = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = []
+            for name, missing in pending.items():
+                # JSON object keys are strings, the augmentation ids are ints
+                known_hashes = {int(i): digest for i, digest in manifest.get(name, {}).get("hashes", {}).items()
+                                if int(i) not in missing}
+                futures.append(executor.submit(augment_data, version, split, name, missing, known_hashes, dedup))
+            progress = tqdm(as_completed(futures), total=len(futures), desc="Augmenting data")
+            for future in progress:
+                name, hashes, aliases, grids = future.result()
+                entry = manifest.setdefault(name, {"version": version, "done": []})
+                entry["done"] = sorted(set(entry["done"]) | set(hashes))
+                entry.setdefault("hashes", {}).update({str(i): digest for i, digest in hashes.items()})
+                entry_aliases = entry.setdefault("aliases", {})
+                for i in hashes:
+                    entry_aliases.pop(str(i), None)
+                entry_aliases.update({str(i): j for i, j in aliases.items()})
+                num_tasks += 1
+                num_grids += grids
+                num_augmented += len(hashes)
+                num_duplicates += len(aliases)
+
+                elapsed = max(time.time() - start, 1e-9)
+                progress.set_postfix(tasks_per_s=f"{num_tasks / elapsed:.1f}", grids_per_s=f"{num_grids / elapsed:.0f}")
+                if num_tasks % save_every == 0:
+                    save_manifest(split, manifest)
+    finally:
+        save_manifest(split, manifest)
+
+    elapsed = max(time.time() - start, 1e-9)
+    return {
+        "tasks": num_tasks,
+        "skipped_tasks": len(names) - len(pending),
+        "grids": num_grids,
+        "seconds": elapsed,
+        "tasks_per_s": num_tasks / elapsed,
+        "grids_per_s": num_grids / elapsed,
+        "duplicates": num_duplicates,
+        "dedup_ratio": num_duplicates / max(num_augmented, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--version", type=int, default=2)
+    parser.add_argument("--split", type=str, default="training")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no_dedup", action="store_true", help="write every augmentation, even exact duplicates")
+    args = parser.parse_args()
+
+    metrics = augment_split(args.version, args.split, num_workers=args.num_workers, dedup=not args.no_dedup)
+    print(f"Augmented {metrics['tasks']} tasks ({metrics['skipped_tasks']} already complete), {metrics['grids']} grids "
+          f"in {metrics['seconds']:.1f}s: {metrics['tasks_per_s']:.2f} tasks/s, {metrics['grids_per_s']:.0f} grids/s")
+    print(f"Skipped {metrics['duplicates']} duplicate augmentations (dedup ratio {metrics['dedup_ratio']:.1%})")
     print("Data augmentation completed.")
-        
\ No newline at end of file
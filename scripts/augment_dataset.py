@@ -0,0 +1,131 @@
+import os
+import json
+import random
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Iterator
+
+from augment_utils import AUGMENTATIONS, apply_batch
+from create_dataset import task_to_item
+from grid_store import GridStore
+
+
+class AugmentedDataset:
+    """
+    Map-style dataset of (task, augmentation) items that applies the augmentation when an item is accessed,
+    so only the source tasks are stored on disk.
+
+    source: a directory of ARC JSON task files, a grid store path (.arcg) or a GridStore
+    augment_ids: the augmentations to expose (all of AUGMENTATIONS if None)
+    cache_size: number of augmented items kept in the LRU cache
+
+    dataset = AugmentedDataset(os.path.join(base_path, "ARC-AGI-2", "data", "training"))
+    item = dataset[("0a938d79", 4)]     # or dataset[i], i in range(len(dataset))
+    Items use the layout of create_dataset.task_to_item, with numpy grids (None for missing outputs).
+    Works with torch.utils.data.DataLoader as is, and with HF datasets through `to_hf_dataset`.
+    """
+
+    def __init__(self, source, augment_ids: List[int] = None, cache_size: int = 1024):
+        if isinstance(source, str) and source.endswith('.arcg'):
+            source = GridStore(source)
+        if isinstance(source, GridStore):
+            self.store = source
+            self.data_path = None
+            self.names = list(source.names)
+        else:
+            self.store = None
+            self.data_path = source
+            self.names = sorted(name[:-len('.json')] for name in os.listdir(source) if name.endswith('.json'))
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        self.augment_ids = sorted(AUGMENTATIONS) if augment_ids is None else list(augment_ids)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self.names) * len(self.augment_ids)
+
+    def load_task(self, task: int) -> Dict:
+        """The source task as ARC JSON structure with numpy grids."""
+        if self.store is not None:
+            return self.store.task(task)
+        with open(os.path.join(self.data_path, f"{self.names[task]}.json"), 'r') as f:
+            data = json.load(f)
+        return {
+            key: [{k: np.array(grid) for k, grid in pair.items()} for pair in data[key]]
+            for key in ['train', 'test']
+        }
+
+    def augment(self, task: int, augment_id: int) -> Dict[str, np.ndarray]:
+        """Apply one augmentation to every grid of a task in one batched call."""
+        data = self.load_task(task)
+        pairs = data['train'] + data['test']
+        keys = [(i, key) for i, pair in enumerate(pairs) for key in ['input', 'output'] if key in pair]
+        augmented = apply_batch(AUGMENTATIONS[augment_id], [pairs[i][key] for i, key in keys])
+
+        augmented_pairs = [{} for _ in pairs]
+        for (i, key), grid in zip(keys, augmented):
+            augmented_pairs[i][key] = grid
+        num_train = len(data['train'])
+        return task_to_item({'train': augmented_pairs[:num_train], 'test': augmented_pairs[num_train:]})
+
+    def get(self, task, augment_id: int) -> Dict[str, np.ndarray]:
+        """Item for a task (index or name) and an augmentation id, served from the LRU cache when possible."""
+        if isinstance(task, str):
+            task = self._index[task]
+        key = (task, augment_id)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        item = self.augment(task, augment_id)
+        if self.cache_size > 0:
+            self._cache[key] = item
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return item
+
+    def __getitem__(self, index) -> Dict[str, np.ndarray]:
+        if isinstance(index, tuple):
+            return self.get(*index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"index {index} out of range for dataset of length {len(self)}")
+        task, augment = divmod(index, len(self.augment_ids))
+        return self.get(task, self.augment_ids[augment])
+
+    def __iter__(self) -> Iterator[Dict[str, np.ndarray]]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def sample_epoch(self, num_per_task: int = 1, seed: int = None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Yield `num_per_task` items per task with augmentations drawn at random, in shuffled task order.
+        """
+        rng = random.Random(seed)
+        order = list(range(len(self.names)))
+        rng.shuffle(order)
+        for task in order:
+            for augment_id in rng.sample(self.augment_ids, min(num_per_task, len(self.augment_ids))):
+                yield self.get(task, augment_id)
+
+    def to_hf_dataset(self, num_per_task: int = None, seed: int = None):
+        """
+        HF `datasets.IterableDataset` over every item, or over `sample_epoch` if `num_per_task` is given.
+        Items are generated lazily while iterating.
+        """
+        from datasets import IterableDataset
+
+        def generate():
+            items = iter(self) if num_per_task is None else self.sample_epoch(num_per_task, seed)
+            for item in items:
+                yield {key: None if grid is None else grid.tolist() for key, grid in item.items()}
+
+        return IterableDataset.from_generator(generate)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "max_size": self.cache_size}
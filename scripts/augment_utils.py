@@ -1,142 +1,167 @@
+import hashlib
 import numpy as np
 
 
-def rotate90(matrix: np.ndarray) -> np.ndarray:
-    """Rotate a 2D matrix 90 degrees clockwise."""
-    return np.rot90(matrix, -1)
+class Transform:
+    """
+    A grid transform in canonical form: upscale, then a D4 element, then a color permutation.
+
+    The D4 element is stored as an optional transpose followed by optional row/column flips.
+    Composing transforms folds everything into a single D4 element, a single upscale factor
+    and a single color lookup table, so applying any composition costs one gather.
+    Transforms accept a single grid (H, W) or a batch of same-shape grids (B, H, W).
+    """
+
+    def __init__(self, transpose: bool = False, flip_rows: bool = False, flip_cols: bool = False,
+                 scale: tuple = (1, 1), colors: np.ndarray = None):
+        self.transpose = transpose
+        self.flip_rows = flip_rows
+        self.flip_cols = flip_cols
+        self.scale = tuple(scale)
+        self.colors = None if colors is None else np.asarray(colors)
+        self._index_maps = {}
+
+    def then(self, other: "Transform") -> "Transform":
+        """Return the transform that applies `self` first and `other` second."""
+        # Moving other's upscale past our transpose swaps its factors,
+        # and moving our flips past other's transpose swaps their axes
+        other_scale = other.scale[::-1] if self.transpose else other.scale
+        if other.transpose:
+            flip_rows, flip_cols = self.flip_cols, self.flip_rows
+        else:
+            flip_rows, flip_cols = self.flip_rows, self.flip_cols
+
+        if self.colors is None:
+            colors = other.colors
+        elif other.colors is None:
+            colors = self.colors
+        else:
+            colors = other.colors[self.colors]
+
+        return Transform(
+            transpose=self.transpose != other.transpose,
+            flip_rows=flip_rows != other.flip_rows,
+            flip_cols=flip_cols != other.flip_cols,
+            scale=(self.scale[0] * other_scale[0], self.scale[1] * other_scale[1]),
+            colors=colors,
+        )
+
+    def index_map(self, shape: tuple):
+        """Row and column indices into an (H, W) grid that produce the transformed grid."""
+        if shape not in self._index_maps:
+            h, w = shape
+            rows = np.arange(h * self.scale[0]) // self.scale[0]
+            cols = np.arange(w * self.scale[1]) // self.scale[1]
+            row_index, col_index = np.meshgrid(rows, cols, indexing='ij')
+            if self.transpose:
+                row_index, col_index = row_index.T, col_index.T
+            if self.flip_rows:
+                row_index, col_index = row_index[::-1], col_index[::-1]
+            if self.flip_cols:
+                row_index, col_index = row_index[:, ::-1], col_index[:, ::-1]
+            self._index_maps[shape] = (row_index, col_index)
+        return self._index_maps[shape]
+
+    def __call__(self, matrix: np.ndarray) -> np.ndarray:
+        row_index, col_index = self.index_map(matrix.shape[-2:])
+        result = matrix[..., row_index, col_index]
+        if self.colors is not None:
+            result = self.colors[result].astype(matrix.dtype, copy=False)
+        return result
+
+    def __repr__(self):
+        return (f"Transform(transpose={self.transpose}, flip_rows={self.flip_rows}, flip_cols={self.flip_cols}, "
+                f"scale={self.scale}, colors={None if self.colors is None else self.colors.tolist()})")
+
+
+def compose(*transforms: Transform) -> Transform:
+    """Compose transforms, applied left to right."""
+    result = Transform()
+    for transform in transforms:
+        result = result.then(transform)
+    return result
+
+
+def upscale(factor_height: int = 2, factor_width: int = 2) -> Transform:
+    """Repeat every cell `factor_height` times vertically and `factor_width` times horizontally."""
+    return Transform(scale=(max(factor_height, 1), max(factor_width, 1)))
+
+
+def color_permutation(mapping) -> Transform:
+    """Recolor with a lookup table of length 10, where mapping[c] is the new color of c."""
+    return Transform(colors=np.asarray(mapping))
+
+
+def roll_colors(shift: int = 1) -> Transform:
+    """Roll the non-background colors by a given shift, keeping the background (0) fixed."""
+    mapping = np.arange(10)
+    mapping[1:] = (mapping[1:] - 1 + shift) % 9 + 1
+    return color_permutation(mapping)
+
+
+identity = Transform()
+rotate90 = Transform(transpose=True, flip_cols=True)     # 90 degrees clockwise
+rotate180 = Transform(flip_rows=True, flip_cols=True)
+rotate270 = Transform(transpose=True, flip_rows=True)    # 270 degrees clockwise
+flip_horizontal = Transform(flip_cols=True)
+flip_vertical = Transform(flip_rows=True)
+transpose = Transform(transpose=True)
+increase_resolution = upscale(2, 2)
+increase_height = upscale(2, 1)
+increase_width = upscale(1, 2)
 
-def rotate180(matrix: np.ndarray) -> np.ndarray:
-    """Rotate a 2D matrix 180 degrees."""
-    return np.rot90(matrix, 2)
-
-def rotate270(matrix: np.ndarray) -> np.ndarray:
-    """Rotate a 2D matrix 270 degrees clockwise."""
-    return np.rot90(matrix, 1)
-
-def flip_horizontal(matrix: np.ndarray) -> np.ndarray:
-    """Flip a 2D matrix horizontally."""
-    return np.flip(matrix, axis=1)
-
-def flip_vertical(matrix: np.ndarray) -> np.ndarray:
-    """Flip a 2D matrix vertically."""
-    return np.flip(matrix, axis=0)
 
 def reflect_to_the_right(matrix: np.ndarray) -> np.ndarray:
     """Flips a grid horizontally and prepends to the right of the original grid."""
     flipped = flip_horizontal(matrix)
-    return np.hstack((matrix, flipped))
+    return np.concatenate((matrix, flipped), axis=-1)
 
 def reflect_to_the_bottom(matrix: np.ndarray) -> np.ndarray:
     """Flips a grid vertically and appends to the bottom of the original grid."""
     flipped = flip_vertical(matrix)
-    return np.vstack((matrix, flipped))
+    return np.concatenate((matrix, flipped), axis=-2)
 
 def reflect_to_the_left(matrix: np.ndarray) -> np.ndarray:
     """Flips a grid horizontally and prepends to the left of the original grid."""
     flipped = flip_horizontal(matrix)
-    return np.hstack((flipped, matrix))
+    return np.concatenate((flipped, matrix), axis=-1)
 
 def reflect_to_the_top(matrix: np.ndarray) -> np.ndarray:
     """Flips a grid vertically and prepends to the top of the original grid."""
     flipped = flip_vertical(matrix)
-    return np.vstack((flipped, matrix))
-
-def transpose(matrix: np.ndarray) -> np.ndarray:
-    """Transpose a 2D matrix."""
-    return np.transpose(matrix)
-
-def increase_resolution(matrix: np.ndarray, factor: int = 2) -> np.ndarray:
-    """Increase the resolution of a 2D matrix by a given factor."""
-    if factor <= 1:
-        return matrix
-    return np.repeat(np.repeat(matrix, factor, axis=0), factor, axis=1)
-
-def increase_height(matrix: np.ndarray, factor: int = 2) -> np.ndarray:
-    """Increase the height of a 2D matrix by a given factor."""
-    if factor <= 1:
-        return matrix
-    return np.repeat(matrix, factor, axis=0)
-
-def increase_width(matrix: np.ndarray, factor: int = 2) -> np.ndarray:
-    """Increase the width of a 2D matrix by a given factor."""
-    if factor <= 1:
-        return matrix
-    return np.repeat(matrix, factor, axis=1)
-
-def roll_colors(matrix: np.ndarray, shift: int = 1) -> np.ndarray:
-    """Roll the colors of a 2D matrix by a given shift."""
-    if shift == 0:
-        return matrix
-    background = matrix == 0
-    rolled = (matrix - 1 + shift) % 9 + 1
-    rolled[background] = 0
-    return rolled
-
-# ====== 组合增强方法 ======
-
-def combo_rotate90_flip_horizontal(matrix: np.ndarray) -> np.ndarray:
-    """Combination: rotate 90 degrees then flip horizontally."""
-    return flip_horizontal(rotate90(matrix))
-
-def combo_rotate180_flip_vertical(matrix: np.ndarray) -> np.ndarray:
-    """Combination: rotate 180 degrees then flip vertically."""
-    return flip_vertical(rotate180(matrix))
-
-def combo_rotate270_flip_horizontal(matrix: np.ndarray) -> np.ndarray:
-    """Combination: rotate 270 degrees then flip horizontally."""
-    return flip_horizontal(rotate270(matrix))
-
-def combo_rotate90_transpose(matrix: np.ndarray) -> np.ndarray:
-    """Combination: rotate 90 degrees then transpose."""
-    return transpose(rotate90(matrix))
-
-def combo_flip_horizontal_vertical(matrix: np.ndarray) -> np.ndarray:
-    """Combination: flip horizontally then vertically."""
-    return flip_vertical(flip_horizontal(matrix))
-
-def combo_rotate90_roll_colors(matrix: np.ndarray) -> np.ndarray:
-    """Combination: rotate 90 degrees then roll colors."""
-    return roll_colors(rotate90(matrix))
-
-def combo_rotate180_roll_colors(matrix: np.ndarray) -> np.ndarray:
-    """Combination: rotate 180 degrees then roll colors."""
-    return roll_colors(rotate180(matrix))
-
-def combo_flip_horizontal_roll_colors(matrix: np.ndarray) -> np.ndarray:
-    """Combination: flip horizontally then roll colors."""
-    return roll_colors(flip_horizontal(matrix))
-
-def combo_flip_vertical_roll_colors(matrix: np.ndarray) -> np.ndarray:
-    """Combination: flip vertically then roll colors."""
-    return roll_colors(flip_vertical(matrix))
-
-def combo_increase_resolution_rotate90(matrix: np.ndarray) -> np.ndarray:
-    """Combination: increase resolution then rotate 90 degrees."""
-    return rotate90(increase_resolution(matrix))
-
-def combo_increase_resolution_rotate180(matrix: np.ndarray) -> np.ndarray:
-    """Combination: increase resolution then rotate 180 degrees."""
-    return rotate180(increase_resolution(matrix))
-
-def combo_increase_resolution_flip_horizontal(matrix: np.ndarray) -> np.ndarray:
-    """Combination: increase resolution then flip horizontally."""
-    return flip_horizontal(increase_resolution(matrix))
-
-def combo_increase_resolution_flip_vertical(matrix: np.ndarray) -> np.ndarray:
-    """Combination: increase resolution then flip vertically."""
-    return flip_vertical(increase_resolution(matrix))
-
-def combo_transpose_roll_colors(matrix: np.ndarray) -> np.ndarray:
-    """Combination: transpose then roll colors."""
-    return roll_colors(transpose(matrix))
-
-def combo_increase_resolution_rotate90_roll_colors(matrix: np.ndarray) -> np.ndarray:
-    """Combination: increase resolution, rotate 90 degrees, then roll colors."""
-    return roll_colors(rotate90(increase_resolution(matrix)))
+    return np.concatenate((flipped, matrix), axis=-2)
+
+
+def apply_batch(augmentation, grids: list) -> list:
+    """
+    Apply an augmentation to a list of grids, stacking same-shape grids into one vectorized call.
+    Returns the augmented grids in the original order.
+    """
+    results = [None] * len(grids)
+    groups = {}
+    for index, grid in enumerate(grids):
+        groups.setdefault(grid.shape, []).append(index)
+    for indices in groups.values():
+        augmented = augmentation(np.stack([grids[i] for i in indices]))
+        for i, grid in zip(indices, augmented):
+            results[i] = grid
+    return results
+
+
+def task_hash(grids: list) -> str:
+    """
+    Canonical hash of a list of grids: shapes and cell values, independent of dtype and memory layout.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for grid in grids:
+        digest.update(np.asarray(grid.shape, dtype=np.int32).tobytes())
+        digest.update(np.ascontiguousarray(grid, dtype=np.uint8).tobytes())
+    return digest.hexdigest()
+
 
 AUGMENTATIONS = {
     # 原始的15种增强方法
-    0: lambda x: x,  # No augmentation
+    0: identity,  # No augmentation
     1: rotate90,
     2: rotate180,
     3: rotate270,
@@ -150,22 +175,22 @@ AUGMENTATIONS = {
     11: increase_resolution,
     12: increase_height,
     13: increase_width,
-    14: roll_colors,
-    
+    14: roll_colors(1),
+
     # 新增的15种组合增强方法
-    15: combo_rotate90_flip_horizontal,         # rotate90 → flip_horizontal
-    16: combo_rotate180_flip_vertical,          # rotate180 → flip_vertical
-    17: combo_rotate270_flip_horizontal,        # rotate270 → flip_horizontal
-    18: combo_rotate90_transpose,               # rotate90 → transpose
-    19: combo_flip_horizontal_vertical,         # flip_horizontal → flip_vertical
-    20: combo_rotate90_roll_colors,             # rotate90 → roll_colors
-    21: combo_rotate180_roll_colors,            # rotate180 → roll_colors
-    22: combo_flip_horizontal_roll_colors,      # flip_horizontal → roll_colors
-    23: combo_flip_vertical_roll_colors,        # flip_vertical → roll_colors
-    24: combo_increase_resolution_rotate90,     # increase_resolution → rotate90
-    25: combo_increase_resolution_rotate180,    # increase_resolution → rotate180
-    26: combo_increase_resolution_flip_horizontal, # increase_resolution → flip_horizontal
-    27: combo_increase_resolution_flip_vertical,   # increase_resolution → flip_vertical
-    28: combo_transpose_roll_colors,            # transpose → roll_colors
-    29: combo_increase_resolution_rotate90_roll_colors, # 3-step combination
+    15: compose(rotate90, flip_horizontal),
+    16: compose(rotate180, flip_vertical),
+    17: compose(rotate270, flip_horizontal),
+    18: compose(rotate90, transpose),
+    19: compose(flip_horizontal, flip_vertical),
+    20: compose(rotate90, roll_colors(1)),
+    21: compose(rotate180, roll_colors(1)),
+    22: compose(flip_horizontal, roll_colors(1)),
+    23: compose(flip_vertical, roll_colors(1)),
+    24: compose(increase_resolution, rotate90),
+    25: compose(increase_resolution, rotate180),
+    26: compose(increase_resolution, flip_horizontal),
+    27: compose(increase_resolution, flip_vertical),
+    28: compose(transpose, roll_colors(1)),
+    29: compose(increase_resolution, rotate90, roll_colors(1)),  # 3-step combination
 }
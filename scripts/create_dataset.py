@@ -1,52 +1,168 @@
 import os
 import json
-from typing import List, Dict
+import argparse
+from typing import List, Dict, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
-from datasets import load_dataset
-
 
 BASE_PATH = "/home/tangwenhao/Workspace/ARC"
 
+def task_to_item(data: Dict) -> Dict[str, List[List[int]]]:
+    """
+    Flatten an ARC task ({'train': [...], 'test': [...]}) into one dataset item.
+    Pairs without an output (unlabeled test pairs) have None as output.
+    """
+    dataset_item = {}
+    for i, item in enumerate(data['train']):
+        dataset_item[f'train_input_{i}'] = item['input']
+        dataset_item[f'train_output_{i}'] = item.get('output')
+    for i, item in enumerate(data['test']):
+        dataset_item[f'test_input_{i}'] = item['input']
+        dataset_item[f'test_output_{i}'] = item.get('output')
+    return dataset_item
+
+
+def iter_dataset_items(data_path: str, names: List[str] = None) -> Iterator[Dict[str, List[List[int]]]]:
+    """
+    Yield the dataset items of the task files in `data_path` one at a time.
+    """
+    if names is None:
+        names = sorted(name for name in os.listdir(data_path) if name.endswith('.json'))
+    for name in names:
+        with open(os.path.join(data_path, name), 'r') as f:
+            data = json.load(f)
+        yield task_to_item(data)
+
+
 def create_dataset_list(data_path: str) -> List[Dict[str, List[List[int]]]]:
     """
     Create a JSON file from the dataset.
     """
-    dataset = []
-    for name in tqdm(os.listdir(data_path), desc="Loading dataset"):
-        if name.endswith('.json'):
-            with open(os.path.join(data_path, name), 'r') as f:
-                data = json.load(f)
-                train_data = data['train']
-                test_data = data['test']
-            dataset_item = {}
-            for i, item in enumerate(train_data):
-                dataset_item[f'train_input_{i}'] = item['input']
-                dataset_item[f'train_output_{i}'] = item['output']
-            for i, item in enumerate(test_data):
-                dataset_item[f'test_input_{i}'] = item['input']
-                dataset_item[f'test_output_{i}'] = item['output']
-            dataset.append(dataset_item)
-    return dataset
+    return list(tqdm(iter_dataset_items(data_path), desc="Loading dataset"))
+
+
+def write_shards(data_path: str, names: List[str], output_dir: str, prefix: str, shard_size_mb: float = 64) -> List[Dict]:
+    """
+    Stream the items of `names` into JSONL shards of at most `shard_size_mb` MB each (a single item larger
+    than that gets a shard of its own). Only one item is held in memory at a time.
+    Returns the manifest entries of the written shards.
+    """
+    max_bytes = int(shard_size_mb * 1024 * 1024)
+    shards = []
+    f, num_rows, num_bytes = None, 0, 0
+    # Largest number of train / test pairs of an item, to give every shard the same columns when loading
+    max_pairs = {"train": 0, "test": 0}
+
+    def close_shard():
+        f.close()
+        path = os.path.join(output_dir, f"{prefix}-{len(shards):05d}.jsonl")
+        os.replace(f"{path}.tmp", path)
+        shards.append({"path": os.path.basename(path), "num_rows": num_rows, "num_bytes": num_bytes,
+                       "max_train_pairs": max_pairs["train"], "max_test_pairs": max_pairs["test"]})
+
+    for item in iter_dataset_items(data_path, names):
+        line = (json.dumps(item) + "\n").encode()
+        if f is not None and num_bytes + len(line) > max_bytes:
+            close_shard()
+            f = None
+        if f is None:
+            f = open(os.path.join(output_dir, f"{prefix}-{len(shards):05d}.jsonl.tmp"), 'wb')
+            num_rows, num_bytes = 0, 0
+            max_pairs = {"train": 0, "test": 0}
+        for key in max_pairs:
+            max_pairs[key] = max(max_pairs[key], sum(column.startswith(f"{key}_input_") for column in item))
+        f.write(line)
+        num_rows += 1
+        num_bytes += len(line)
+    if f is not None:
+        close_shard()
+    return shards
+
+
+def build_sharded_dataset(data_path: str, output_dir: str, split: str, shard_size_mb: float = 64, num_workers: int = None) -> List[Dict]:
+    """
+    Write the tasks in `data_path` as JSONL shards of `split` in parallel, and record them in
+    `output_dir/manifest.json` ({split: [{"path", "num_rows", "num_bytes"}, ...]}).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = sorted(name for name in os.listdir(data_path) if name.endswith('.json'))
+    shards = []
+    if names:
+        num_workers = max(1, min(num_workers or os.cpu_count(), len(names)))
+
+        # Each worker streams a contiguous chunk of the files, so shard order follows file order
+        chunk_size = (len(names) + num_workers - 1) // num_workers
+        chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(write_shards, data_path, chunk, output_dir, f"{split}-{worker:03d}", shard_size_mb)
+                for worker, chunk in enumerate(chunks)
+            ]
+            shards = [shard for future in tqdm(futures, desc=f"Writing {split} shards") for shard in future.result()]
+
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    manifest[split] = shards
+    with open(f"{manifest_path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return shards
+
+
+def dataset_features(max_train_pairs: int, max_test_pairs: int):
+    """
+    Fixed schema of the dataset items: every `train_input_i` ... `test_output_j` column up to the largest
+    number of pairs, as lists of lists of integers. Items with fewer pairs have None in the extra columns, and
+    unlabeled pairs have None as output.
+    """
+    from datasets import Features, Sequence, Value
+
+    grid = Sequence(Sequence(Value('int64')))
+    columns = [f'train_{key}_{i}' for i in range(max_train_pairs) for key in ['input', 'output']]
+    columns += [f'test_{key}_{i}' for i in range(max_test_pairs) for key in ['input', 'output']]
+    return Features({column: grid for column in columns})
+
+
+def load_sharded_dataset(output_dir: str):
+    """
+    Load every split listed in the manifest. `datasets` converts the shards to Arrow once and memory-maps them.
+    The shards of a split have different columns (tasks have different numbers of pairs), so they are read with
+    the explicit schema of `dataset_features` instead of the schema inferred from the first shard.
+    """
+    # Imported here so that the rest of this module (task_to_item, used by augment_dataset) does not need datasets
+    from datasets import load_dataset
+
+    with open(os.path.join(output_dir, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+    data_files = {
+        split: [os.path.join(output_dir, shard["path"]) for shard in shards]
+        for split, shards in manifest.items() if shards
+    }
+    all_shards = [shard for shards in manifest.values() for shard in shards]
+    features = dataset_features(
+        max([shard.get("max_train_pairs", 0) for shard in all_shards], default=0),
+        max([shard.get("max_test_pairs", 0) for shard in all_shards], default=0),
+    )
+    return load_dataset('json', data_files=data_files, features=features)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shard_size_mb", type=float, default=64)
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
     # ========== Create dataset ==========
-    dataset_train = create_dataset_list(os.path.join(BASE_PATH, "data", "training"))
-    with open(os.path.join(BASE_PATH, "train.json"), 'w') as f:
-        json.dump(dataset_train, f)
-    
-    dataset_eval = create_dataset_list(os.path.join(BASE_PATH, "data", "evaluation"))
-    with open(os.path.join(BASE_PATH, "eval.json"), 'w') as f:
-        json.dump(dataset_eval, f)
+    output_dir = os.path.join(BASE_PATH, "dataset")
+    build_sharded_dataset(os.path.join(BASE_PATH, "data", "training"), output_dir, "train", args.shard_size_mb, args.num_workers)
+    build_sharded_dataset(os.path.join(BASE_PATH, "data", "evaluation"), output_dir, "eval", args.shard_size_mb, args.num_workers)
 
     # ========== Load dataset (Example usage) ==========
-    file_paths = {
-        'train': os.path.join(BASE_PATH, "train.json"),
-        'eval': os.path.join(BASE_PATH, "eval.json")
-    }
-
-    dataset = load_dataset('json', data_files=file_paths)
+    dataset = load_sharded_dataset(output_dir)
     print(f"Dataset loaded with {len(dataset['train'])} training examples and {len(dataset['eval'])} evaluation examples.")
     breakpoint()  # For debugging purposes, can be removed later
     print("Dataset creation completed.")
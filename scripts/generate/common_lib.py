@@ -0,0 +1,175 @@
+import os
+import ast
+import argparse
+from typing import List, Set, Iterable
+
+
+current_file_dir = os.path.dirname(os.path.realpath(__file__))
+common_path = os.path.join(current_file_dir, "seeds", "common.py")
+
+INTERNAL_MARKER = "internal function not used by LLM"
+# Always part of the prompt, every puzzle uses colors
+ALWAYS_KEEP = {"Color"}
+
+
+def is_internal(node: ast.AST) -> bool:
+    """Helpers marked with INTERNAL_MARKER in their docstring, and private names."""
+    docstring = ast.get_docstring(node) or ""
+    return node.name.startswith("_") or INTERNAL_MARKER in docstring
+
+
+def _stub(lines: List[str], node: ast.AST, indent: str = "") -> List[str]:
+    """
+    Source of a function definition up to the end of its docstring (or of its signature), with `...` as body.
+    """
+    start = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno]) - 1
+    body = node.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+        end = body[0].end_lineno
+    else:
+        head = lines[body[0].lineno - 1][:body[0].col_offset]
+        # One-line definitions like `def f(x): return x` have the body on the signature line
+        if head.strip():
+            return lines[start:body[0].lineno - 1] + [head.rstrip() + " ..."]
+        end = body[0].lineno - 1
+    return lines[start:end] + [indent + " " * 4 + "..."]
+
+
+def public_definitions(source) -> dict:
+    """
+    Name -> node of the top-level functions and classes of a module (source or parsed tree) that are meant for the LLM.
+    """
+    tree = ast.parse(source) if isinstance(source, str) else source
+    return {
+        node.name: node for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and not is_internal(node)
+    }
+
+
+def compact_common_lib(source: str = None, keep: Iterable[str] = None) -> str:
+    """
+    `common.py` reduced to what a prompt needs: the signatures and docstrings of its public functions and classes
+    (class constants included), with `...` in place of the implementations, and the imports they still reference.
+    Internal helpers are dropped. If `keep` is given, only those definitions (and the classes they depend on) are kept.
+    """
+    if source is None:
+        with open(common_path) as f:
+            source = f.read()
+    lines = source.splitlines()
+    tree = ast.parse(source)
+    definitions = public_definitions(tree)
+    if keep is not None:
+        keep = dependencies(definitions, set(keep) | ALWAYS_KEEP)
+
+    header, imports, output = [], [], []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(node)
+        elif isinstance(node, ast.Expr) and node is tree.body[0] and isinstance(node.value, ast.Constant):
+            header.extend(lines[node.lineno - 1:node.end_lineno])
+        elif node in definitions.values() and (keep is None or node.name in keep):
+            output.append("")
+            if isinstance(node, ast.FunctionDef):
+                output.extend(_stub(lines, node))
+            else:
+                output.extend(_class_stub(lines, node))
+
+    # Imports of the helpers that were dropped (e.g. `contextmanager` for `rng_context`) would only cost tokens
+    used = referenced_names(ast.parse("\n".join(output)))
+    imports = [
+        line for node in imports if any((alias.asname or alias.name.split(".")[0]) in used for alias in node.names)
+        for line in lines[node.lineno - 1:node.end_lineno]
+    ]
+    return "\n".join(header + ([""] + imports if imports else []) + output).strip() + "\n"
+
+
+def _class_stub(lines: List[str], node: ast.ClassDef) -> List[str]:
+    """Class header, docstring, class-level constants and the stubs of its public methods (and __init__)."""
+    indent = " " * node.col_offset
+    body = node.body
+    has_docstring = isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str)
+    end = body[0].end_lineno if has_docstring else body[0].lineno - 1
+    output = lines[node.lineno - 1:end]
+    members = 0
+    for child in body[1:] if has_docstring else body:
+        if isinstance(child, (ast.Assign, ast.AnnAssign)):
+            output.extend(lines[child.lineno - 1:child.end_lineno])
+            members += 1
+        elif isinstance(child, ast.FunctionDef) and (child.name == "__init__" or not is_internal(child) and not child.name.startswith("__")):
+            output.append("")
+            output.extend(_stub(lines, child, indent + " " * 4))
+            members += 1
+    if not members and not has_docstring:
+        output.append(indent + " " * 4 + "...")
+    return output
+
+
+def referenced_names(node: ast.AST) -> Set[str]:
+    """Every name read in a piece of code, including the roots of attribute accesses (`Color` in `Color.RED`)."""
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+
+
+def dependencies(definitions: dict, names: Set[str]) -> Set[str]:
+    """
+    `names` together with the definitions they need to be understood: base classes, and the classes used in default
+    values and annotations of their signatures.
+    """
+    names = {name for name in names if name in definitions}
+    pending = list(names)
+    while pending:
+        node = definitions[pending.pop()]
+        if isinstance(node, ast.ClassDef):
+            needed = set().union(*[referenced_names(base) for base in node.bases])
+        else:
+            needed = referenced_names(node.args)
+        for name in needed & definitions.keys() - names:
+            names.add(name)
+            pending.append(name)
+    return names
+
+
+def common_calls(seed_source: str, common_names: Iterable[str]) -> Set[str]:
+    """
+    Static call analysis of a seed: the names of `common.py` (from `from common import *`) that it uses,
+    whether called, subclassed, or passed around.
+    """
+    return referenced_names(ast.parse(seed_source)) & set(common_names)
+
+
+def count_tokens(text: str, model: str = "gpt-4.1-mini") -> int:
+    """
+    Number of prompt tokens of `text`, with tiktoken when it is installed, else estimated as 4 characters per token.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return (len(text) + 3) // 4
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=str, nargs="*", default=None, help="keep only what these seeds use, e.g. 0dfd9992 4c4377d9")
+    parser.add_argument("--output", type=str, default=None, help="write the compacted library to this file")
+    args = parser.parse_args()
+
+    with open(common_path) as f:
+        source = f.read()
+    keep = None
+    if args.seeds:
+        keep = set()
+        for name in args.seeds:
+            with open(os.path.join(current_file_dir, "seeds", f"{name}.py")) as f:
+                keep |= common_calls(f.read(), public_definitions(source))
+    compacted = compact_common_lib(source, keep)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(compacted)
+    else:
+        print(compacted)
+    before, after = count_tokens(source), count_tokens(compacted)
+    print(f"common.py: {before} tokens -> {after} tokens ({after / before:.1%}), {len(source.splitlines())} -> {len(compacted.splitlines())} lines")
@@ -1,73 +1,53 @@
 import os
-import re
 import json
+import time
+import random
+import asyncio
+import argparse
+from typing import List, Dict
 
-from openai import AzureOpenAI
-with open(os.path.join(os.path.dirname(__file__), "openai.json")) as f:
-    openai_config = json.load(f)
-os.environ["OPENAI_API_VERSION"] = openai_config["OPENAI_API_VERSION"]
-os.environ["AZURE_OPENAI_API_KEY"] = openai_config["AZURE_OPENAI_API_KEY"]
-os.environ["AZURE_OPENAI_ENDPOINT"] = openai_config["AZURE_OPENAI_ENDPOINT"]
+from openai import AsyncAzureOpenAI, AsyncOpenAI, APIConnectionError, APIStatusError
 
+from llm_cache import ResponseCache, assign_slots
+from common_lib import compact_common_lib, count_tokens, common_calls, public_definitions
+from seed_catalog import SeedCatalog
+from seed_index import SeedIndex
+
+
+SYSTEM_PROMPT = "You are a puzzle maker designing geometric, physical, and topological puzzles for curious middle-schoolers. You are creative, playful, and love to explore new ideas."
+
+
+def configure_azure():
+    with open(os.path.join(os.path.dirname(__file__), "openai.json")) as f:
+        openai_config = json.load(f)
+    os.environ["OPENAI_API_VERSION"] = openai_config["OPENAI_API_VERSION"]
+    os.environ["AZURE_OPENAI_API_KEY"] = openai_config["AZURE_OPENAI_API_KEY"]
+    os.environ["AZURE_OPENAI_ENDPOINT"] = openai_config["AZURE_OPENAI_ENDPOINT"]
+
+
+# Kept across calls like `_seed_index`. Between full refreshes, `update` only notices seeds that are added, removed
+# or replaced (saved through a rename) and changes of common.py, not seeds edited in place: `get_prompt` refreshes
+# fully, and `get_problem_prompt` at least every CATALOG_MAX_AGE seconds
+_seed_catalog = SeedCatalog(refresh=False)
+CATALOG_MAX_AGE = 60
+
+def get_prompt(num_generations: int = 5, num_examples: int = 50, seed: int = 0):
+    """
+    Prompt of templates/description_prompt.md: brainstorm `num_generations` puzzles, given the concepts and descriptions
+    of `num_examples` seeds drawn at random (or all of them if None), so the prompt does not grow with the catalog.
+    The draw only depends on `seed`.
+    """
+    catalog = _seed_catalog
+    catalog.refresh()
+    names = catalog.names()
+    if num_examples is not None and len(names) > num_examples:
+        names = sorted(random.Random(seed).sample(names, num_examples))
+    print(f"Using the following {len(names)} of {len(catalog)} seeds:", ", ".join(names))
 
-def get_seeds_contents():
-    # get all files in seeds directory
-    # get current directory path
-    current_file_dir = os.path.dirname(os.path.realpath(__file__))
-    seeds = os.listdir(os.path.join(current_file_dir, "seeds"))
-    # filter files with .py extension and 8 hex value characters in the file name
-    pattern = r"[0-9a-f]{8}(_[a-zA-Z]+)?\.py"
-    # get all files and its content
-    seeds = [seed for seed in seeds if re.match(pattern, seed)]
-    seeds_contents = []
-    for seed in seeds:
-        with open(os.path.join(current_file_dir, "seeds", seed)) as f:
-            content = f.read()
-            content = content.split("# ============= remove below this point for prompting =============")[0].strip()
-            seeds_contents.append((seed, content))
-
-    # print all files
-    print(f"Using the following {len(seeds)} seeds:", ", ".join(seeds).replace(".py", ""))
-
-    return seeds_contents
-
-
-def get_concepts_from_content(content: str):
-    concepts = []
-    lines = content.split("\n")
-    for i, line in enumerate(lines):
-        if "# concepts:" in line:
-            in_line_concepts = lines[i][12:]
-            if in_line_concepts.strip() != "":
-                concepts.extend(lines[i][12:].split(","))
-            while i+1 < len(lines) and lines[i+1].startswith("# ") and not lines[i+1].startswith("# description:"):
-                concepts.extend(lines[i+1][2:].split(","))
-                i += 1
-            concepts = [c.strip() for c in concepts]
-            break
-    return concepts
-
-
-def get_description_from_content(content: str):
-    description = []
-    lines = content.split("\n")
-    for i, line in enumerate(lines):
-        if "# description:" in line:
-            while i+1 < len(lines) and lines[i+1].startswith("# "):
-                description.append(lines[i+1][2:])
-                i += 1
-            description = " ".join(description)
-            break
-    return description if description else "No description found."
-
-
-def get_prompt(num_generations: int = 5):
-    seeds_contents = get_seeds_contents()
     examples = []
-    for seed, content in seeds_contents:
-        concepts = get_concepts_from_content(content)
-        description = get_description_from_content(content)
-        example = f"```python\n# concepts:\n# {', '.join(concepts)}\n\n# description:\n# {description}\n```"
+    for name in names:
+        entry = catalog[name]
+        example = f"```python\n# concepts:\n# {', '.join(entry['concepts'])}\n\n# description:\n# {entry['description']}\n```"
         examples.append(example)
     
     # read the prompt template from prompts/description_prompt.md
@@ -79,39 +59,254 @@ def get_prompt(num_generations: int = 5):
     return prompt
 
 
+_seed_index = SeedIndex()
+
+def get_problem_prompt(description: str, seeds: List[str] = None, num_examples: int = 3, relevant_only: bool = True, verbose: bool = False):
+    """
+    Prompt of templates/problem_from_description.md: implement `description`, with the given seeds as examples,
+    or else the `num_examples` seeds with the most similar concepts and descriptions (completed with random seeds when
+    too few share a term with the description).
+    `common.py` is included as signatures and docstrings only, restricted to the functions the examples use
+    unless `relevant_only` is False.
+    """
+    current_file_dir = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(current_file_dir, "seeds", "common.py")) as f:
+        common_source = f.read()
+
+    catalog = _seed_catalog
+    catalog.update(max_age=CATALOG_MAX_AGE)
+    if seeds is None:
+        # The index is kept across calls, and only seeds added or changed since the last call are (re-)indexed
+        _seed_index.sync(catalog)
+        seeds = [name for name, _ in _seed_index.search(description, k=num_examples)]
+        if len(seeds) < num_examples:
+            # Too few seeds share a term with the description: complete with random ones, seeded by the description
+            # so that the prompt (and its cache key) stays the same for the same description
+            others = [name for name in catalog.names() if name not in seeds]
+            seeds += random.Random(description).sample(others, min(num_examples - len(seeds), len(others)))
+        if verbose:
+            print(f"Examples similar to the description: {', '.join(seeds)}")
+    examples = [catalog[seed]["content"] for seed in seeds]
+    keep = set().union(*[catalog[seed]["common_calls"] for seed in seeds]) if relevant_only else None
+    common_lib = compact_common_lib(common_source, keep)
+    if verbose:
+        print(f"common.py in the prompt: {count_tokens(common_source)} -> {count_tokens(common_lib)} tokens")
+
+    template_path = os.path.join(current_file_dir, "templates", "problem_from_description.md")
+    with open(template_path) as f:
+        prompt_template = f.read()
+
+    examples = "\n\n".join(f"```python\n{content}\n```" for content in examples)
+    return prompt_template.format(description=description, common_lib=common_lib, examples=examples)
+
+
+def get_refactor_prompt(original: str, relevant_only: bool = True):
+    """
+    Prompt of templates/divide_and_conquer_refactor.md: split the `main` of the program `original` into subroutines.
+    `common.py` is included as signatures and docstrings only, restricted to the functions `original` uses
+    unless `relevant_only` is False.
+    """
+    current_file_dir = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(current_file_dir, "seeds", "common.py")) as f:
+        common_source = f.read()
+    keep = common_calls(original, public_definitions(common_source)) if relevant_only else None
+
+    template_path = os.path.join(current_file_dir, "templates", "divide_and_conquer_refactor.md")
+    with open(template_path) as f:
+        prompt_template = f.read()
+    return prompt_template.format(common=compact_common_lib(common_source, keep), original=original)
+
+
+
+# ========== Batch generation ==========
+
+class TokenBucket:
+    """
+    Token bucket: allows `rate` units per second on average, with bursts of up to `capacity` units.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits (429), server errors (5xx), timeouts and dropped connections are worth retrying."""
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def retry_delay(error: Exception, attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Exponential backoff with full jitter, or the server's Retry-After if it sent one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after is not None:
+        try:
+            return min(max_delay, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+async def complete(client, request: Dict, bucket: TokenBucket = None, max_retries: int = 6, base_delay: float = 1.0):
+    """
+    One chat completion, waiting for the rate limiter before every attempt and retrying retryable errors.
+    Returns (completion, number of retries); an exception raised after the last attempt carries the number of
+    retries it took as `e.retries`.
+    """
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            return await client.chat.completions.create(**request), attempt
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                e.retries = attempt
+                raise
+            await asyncio.sleep(retry_delay(e, attempt, base_delay))
+
+
+def make_async_client(base_url: str = None):
+    """
+    Async client for Azure OpenAI, or for any server speaking the OpenAI chat-completions protocol at `base_url`
+    (e.g. `stub_server.py`). Retries are handled by `complete`, so the client's own are disabled.
+    """
+    if base_url:
+        return AsyncOpenAI(base_url=base_url, api_key=os.environ.get("OPENAI_API_KEY", "stub"), max_retries=0)
+    configure_azure()
+    return AsyncAzureOpenAI(max_retries=0)
+
+
+def read_done_ids(output_path: str) -> set:
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if record.get("response") is not None:
+                    done.add(record["id"])
+    return done
+
+
+async def generate_batch(requests: List[Dict], output_path: str, client, concurrency: int = 16, requests_per_minute: float = 600,
+                         max_retries: int = 6, base_delay: float = 1.0, cache: ResponseCache = None) -> Dict:
+    """
+    Run chat-completion requests ({"id", "model", "messages", ...}) concurrently and append one JSON line per
+    request to `output_path` as soon as it finishes. Requests whose id already has a response in the output are
+    skipped, so an interrupted batch can be resumed. With a `cache`, responses already stored for the same
+    request (and sample slot) are returned without calling the model, and new ones are added to it.
+    Returns throughput and usage statistics; the token counts only cover the requests sent to the model.
+    """
+    done = read_done_ids(output_path)
+    slots = assign_slots(requests)
+    pending = [(request, slot) for request, slot in zip(requests, slots) if request["id"] not in done]
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(requests_per_minute / 60, capacity=max(1, concurrency))
+    stats = {"requests": len(pending), "skipped": len(requests) - len(pending), "succeeded": 0, "failed": 0, "retries": 0,
+             "cached": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def write(record, f):
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+
+    async def run(request, slot, f):
+        request_id, request = request["id"], {k: v for k, v in request.items() if k != "id"}
+        cached = cache.get(request, slot) if cache is not None else None
+        if cached is not None:
+            stats["cached"] += 1
+            stats["succeeded"] += 1
+            write({"id": request_id, "model": request["model"], "response": cached["content"], "usage": cached.get("usage"),
+                   "cached": True, "retries": 0, "seconds": 0.0}, f)
+            return
+
+        async with semaphore:
+            start = time.monotonic()
+            record = {"id": request_id, "model": request["model"], "response": None}
+            try:
+                completion, retries = await complete(client, request, bucket, max_retries, base_delay)
+                record["response"] = completion.choices[0].message.content
+                if completion.usage is not None:
+                    record["usage"] = {"prompt_tokens": completion.usage.prompt_tokens, "completion_tokens": completion.usage.completion_tokens}
+                    stats["prompt_tokens"] += completion.usage.prompt_tokens
+                    stats["completion_tokens"] += completion.usage.completion_tokens
+                stats["succeeded"] += 1
+                if cache is not None and record["response"] is not None:
+                    cache.put(request, {"content": record["response"], "usage": record.get("usage")}, slot)
+            except Exception as e:
+                retries = getattr(e, "retries", 0)
+                record["error"] = f"{type(e).__name__}: {e}"
+                stats["failed"] += 1
+            stats["retries"] += retries
+            record["retries"] = retries
+            record["seconds"] = time.monotonic() - start
+            write(record, f)
+
+    start = time.monotonic()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "a") as f:
+        await asyncio.gather(*(run(request, slot, f) for request, slot in pending))
+    stats["seconds"] = time.monotonic() - start
+    stats["requests_per_second"] = stats["requests"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
 
 if __name__ == "__main__":
-    import time
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="gpt-4.1-mini")
+    parser.add_argument("--num_requests", type=int, default=1)
+    parser.add_argument("--num_generations", type=int, default=5, help="descriptions asked for in each request")
+    parser.add_argument("--num_examples", type=int, default=50, help="seeds shown as examples in the prompt, drawn at random")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the drawn examples")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests_per_minute", type=float, default=600)
+    parser.add_argument("--max_retries", type=int, default=6)
+    parser.add_argument("--base_url", type=str, default=None, help="OpenAI-compatible endpoint to use instead of Azure, e.g. http://localhost:8000/v1")
+    parser.add_argument("--cache", type=str, default=os.path.join(os.path.dirname(__file__), "outputs", "llm_cache.sqlite"), help="response cache, '' to disable")
+    parser.add_argument("--samples_per_key", type=int, default=None, help="distinct cached responses kept per prompt (default: --num_requests)")
+    parser.add_argument("--output", type=str, default=os.path.join(os.path.dirname(__file__), "outputs", f"text_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"))
+    args = parser.parse_args()
 
-    model_name = "gpt-4.1-mini"
     price = (0.4, 1.6)  # (prompt, completion) in USD per 1M tokens
-    chat = AzureOpenAI()
 
-    prompt = get_prompt(num_generations=5)
+    prompt = get_prompt(num_generations=args.num_generations, num_examples=args.num_examples, seed=args.seed)
     messages = [
-        {"role": "system", "content": "You are a puzzle maker designing geometric, physical, and topological puzzles for curious middle-schoolers. You are creative, playful, and love to explore new ideas."},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": prompt},
     ]
-    completion = chat.chat.completions.create(model=model_name, messages=messages)
-    response = completion.choices[0].message.content
-    print(response)
-
-    # Save the response to a file
-    output_dir = os.path.join(os.path.dirname(__file__), "outputs")
-    os.makedirs(output_dir, exist_ok=True)
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f"text_{timestamp}.md")
-    with open(output_file, "w") as f:
-        f.write(response)
-    print(f"Response saved to {output_file}")
+    requests = [{"id": i, "model": args.model, "messages": messages} for i in range(args.num_requests)]
+    cache = ResponseCache(args.cache, samples_per_key=args.samples_per_key or args.num_requests) if args.cache else None
+    stats = asyncio.run(generate_batch(
+        requests, args.output, make_async_client(args.base_url),
+        concurrency=args.concurrency, requests_per_minute=args.requests_per_minute, max_retries=args.max_retries, cache=cache,
+    ))
+    print(f"Responses saved to {args.output}")
+    print(f"{stats['succeeded']}/{stats['requests']} requests succeeded ({stats['skipped']} already done), {stats['retries']} retries, "
+          f"{stats['requests_per_second']:.2f} requests/s")
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"Cache: {stats['cached']} responses reused, {cache_stats['entries']} entries, hit rate {cache_stats['hit_rate']:.1%}")
+        cache.close()
 
     # Log the cost
-    prompt_tokens = completion.usage.prompt_tokens
-    completion_tokens = completion.usage.completion_tokens
-    total_tokens = prompt_tokens + completion_tokens
+    prompt_tokens, completion_tokens = stats["prompt_tokens"], stats["completion_tokens"]
     cost = (prompt_tokens / 1_000_000) * price[0] + (completion_tokens / 1_000_000) * price[1]
-    print(f"Total tokens: {total_tokens}, Cost: ${cost:.6f} (Prompt: {prompt_tokens}, Completion: {completion_tokens})")
-    print(f"Model: {model_name}, Price per 1M tokens: ${price[0]:.6f} (prompt), ${price[1]:.6f} (completion)")
-    
-    breakpoint()
-    print("Done!")
\ No newline at end of file
+    print(f"Total tokens: {prompt_tokens + completion_tokens}, Cost: ${cost:.6f} (Prompt: {prompt_tokens}, Completion: {completion_tokens})")
+    print(f"Model: {args.model}, Price per 1M tokens: ${price[0]:.6f} (prompt), ${price[1]:.6f} (completion)")
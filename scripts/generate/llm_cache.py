@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import List, Dict
+
+
+def request_key(request: Dict) -> str:
+    """
+    Content address of a chat-completion request: hash of the model, the messages and the sampling parameters.
+    Bookkeeping fields (the batch "id") are not part of the request sent to the model and are ignored.
+    """
+    content = {key: value for key, value in request.items() if key != "id"}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of chat-completion responses in SQLite, keyed by `request_key`.
+
+    Every key has `samples_per_key` slots, so the same prompt asked several times (n > 1 diversity) keeps that
+    many distinct responses; slot i is filled by the i-th occurrence of the request and later occurrences wrap
+    around. Entries older than `ttl_seconds` are expired, and beyond `max_entries` the least recently used are
+    evicted.
+
+    cache = ResponseCache(os.path.join(current_file_dir, "outputs", "llm_cache.sqlite"), samples_per_key=4)
+    response = cache.get(request, slot=0)      # None on a miss
+    cache.put(request, {"content": ..., "usage": ...}, slot=0)
+    """
+
+    def __init__(self, path: str, samples_per_key: int = 1, max_entries: int = None, ttl_seconds: float = None):
+        self.path = path
+        self.samples_per_key = samples_per_key
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT NOT NULL, slot INTEGER NOT NULL, model TEXT, response TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (key, slot))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, request: Dict, slot: int = 0) -> Dict:
+        key, slot = request_key(request), slot % self.samples_per_key
+        row = self.connection.execute("SELECT response, created FROM responses WHERE key = ? AND slot = ?", (key, slot)).fetchone()
+        now = time.time()
+        if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+            self.connection.execute("DELETE FROM responses WHERE key = ? AND slot = ?", (key, slot))
+            self.connection.commit()
+            self.evictions += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE responses SET accessed = ?, hits = hits + 1 WHERE key = ? AND slot = ?", (now, key, slot))
+        self.connection.commit()
+        return json.loads(row[0])
+
+    def put(self, request: Dict, response: Dict, slot: int = 0):
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR IGNORE INTO responses (key, slot, model, response, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (request_key(request), slot % self.samples_per_key, request.get("model"), json.dumps(response), now, now),
+        )
+        self.evict(commit=False)
+        self.connection.commit()
+
+    def evict(self, commit: bool = True) -> int:
+        """
+        Drop expired entries, then the least recently used ones beyond `max_entries`. Returns the number dropped.
+        """
+        removed = 0
+        if self.ttl_seconds is not None:
+            removed += self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,)).rowcount
+        if self.max_entries is not None:
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                removed += self.connection.execute(
+                    "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY accessed LIMIT ?)", (excess,)
+                ).rowcount
+        self.evictions += removed
+        if commit:
+            self.connection.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self),
+        }
+
+
+def assign_slots(requests: List[Dict]) -> List[int]:
+    """
+    Slot of each request in a batch: the number of identical requests before it, so repeated prompts fill
+    distinct samples of their key instead of all reading the first one.
+    """
+    seen = {}
+    slots = []
+    for request in requests:
+        key = request_key(request)
+        slots.append(seen.get(key, 0))
+        seen[key] = slots[-1] + 1
+    return slots
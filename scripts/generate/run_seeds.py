@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import signal
+import random
+import hashlib
+import argparse
+import resource
+import traceback
+import importlib.util
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict
+from tqdm import tqdm
+
+
+current_file_dir = os.path.dirname(os.path.realpath(__file__))
+seeds_dir = os.path.join(current_file_dir, "seeds")
+seed_pattern = r"[0-9a-f]{8}(_[a-zA-Z]+)?\.py"
+
+
+class SeedTimeout(BaseException):
+    # Not an Exception, so that a seed catching Exception around its loop cannot swallow it
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise SeedTimeout()
+
+
+def _init_worker(memory_limit_mb: int = None):
+    # Seeds do `from common import *`
+    sys.path.insert(0, seeds_dir)
+    # common.py imports scipy lazily; do it here, since a timeout in the middle of an import leaves a broken module
+    import common
+    import scipy.ndimage, scipy.signal, scipy.sparse.csgraph
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+_modules = {}
+
+def load_seed(path: str):
+    """
+    Import a seed program from its file, once per process.
+    """
+    if path not in _modules:
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(f"seed_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[path] = module
+    return _modules[path]
+
+
+def call_with_timeout(function, timeout: float, *args):
+    """
+    Call `function(*args)`, raising SeedTimeout if it runs longer than `timeout` seconds.
+    Returns (result, seconds).
+    """
+    start = time.perf_counter()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = function(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    return result, time.perf_counter() - start
+
+
+def attempt_streams(name: str, num_inputs: int, seed: int = 0) -> List[np.random.SeedSequence]:
+    """
+    One independent random stream per attempt of a seed program. The streams only depend on the run seed, the
+    name of the seed program and the attempt, so any shard (or a single failed seed) can be re-run on its own.
+    """
+    return np.random.SeedSequence(seed, spawn_key=(zlib.crc32(name.encode()),)).spawn(num_inputs)
+
+
+def run_attempts(path: str, attempts: range, streams: List[np.random.SeedSequence], timeout: float = 10) -> List[Dict]:
+    """
+    Run `generate_input` and `main` of a seed once per attempt, in the current (worker) process.
+    Each attempt draws from its own stream: common.py through `rng_context`, and the global `random` and
+    `np.random` state used directly by the seeds.
+    Returns one record per attempt, with status "ok", "error" or "timeout".
+    """
+    import common
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    records = []
+    for attempt, stream in zip(attempts, streams):
+        record = {"seed": name, "attempt": attempt, "status": "ok", "stage": None}
+        # The children `stream.spawn(3)` gives the first time, without counting them as spawned: a rerun on the same
+        # streams draws the same grids
+        python_stream, numpy_stream, generator_stream = (
+            np.random.SeedSequence(stream.entropy, spawn_key=stream.spawn_key + (i,), pool_size=stream.pool_size) for i in range(3)
+        )
+        random.seed(int(python_stream.generate_state(1, np.uint64)[0]))
+        np.random.seed(numpy_stream.generate_state(1)[0])
+        stage = "load"
+        try:
+            module = load_seed(path)
+            with common.rng_context(np.random.default_rng(generator_stream)):
+                stage = "generate_input"
+                input_grid, record["generate_seconds"] = call_with_timeout(module.generate_input, timeout)
+                stage = "main"
+                output_grid, record["main_seconds"] = call_with_timeout(module.main, timeout, np.copy(input_grid))
+            output_grid = np.asarray(output_grid)
+            if output_grid.ndim != 2:
+                raise ValueError(f"main returned an array of shape {output_grid.shape}, expected a 2D grid")
+            record["input"], record["output"] = np.asarray(input_grid), output_grid
+        except SeedTimeout:
+            record.update(status="timeout", stage=stage, traceback=f"SeedTimeout: {stage} took longer than {timeout} seconds")
+        except Exception:
+            record.update(status="error", stage=stage, traceback=traceback.format_exc())
+        records.append(record)
+    return records
+
+
+def pair_hash(input_grid: np.ndarray, output_grid: np.ndarray) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for grid in [input_grid, output_grid]:
+        grid = np.ascontiguousarray(grid, dtype=np.int64)
+        digest.update(np.array(grid.shape, dtype=np.int64).tobytes())
+        digest.update(grid.tobytes())
+    return digest.hexdigest()
+
+
+def summarize(name: str, records: List[Dict], num_unique: int, max_tracebacks: int = 5) -> Dict:
+    """
+    Metrics of one seed: success rate, latency percentiles (ms) and the most common failures.
+    """
+    statuses = Counter(record["status"] for record in records)
+    metrics = {
+        "seed": name,
+        "attempts": len(records),
+        "successes": statuses["ok"],
+        "errors": statuses["error"],
+        "timeouts": statuses["timeout"],
+        "crashes": statuses["crash"],
+        "success_rate": statuses["ok"] / len(records) if records else 0.0,
+        "unique_pairs": num_unique,
+        "duplicates": statuses["ok"] - num_unique,
+    }
+    for stage in ["generate", "main"]:
+        latencies = [1000 * record[f"{stage}_seconds"] for record in records if f"{stage}_seconds" in record]
+        if latencies:
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            metrics[f"{stage}_ms"] = {"p50": p50, "p90": p90, "p99": p99, "max": max(latencies)}
+
+    # Group failures by their last traceback line, keeping one full traceback per group
+    failures = {}
+    for record in records:
+        if record["status"] != "ok":
+            key = (record["stage"], record["traceback"].strip().splitlines()[-1])
+            if key not in failures:
+                failures[key] = {"stage": record["stage"], "error": key[1], "count": 0, "traceback": record["traceback"]}
+            failures[key]["count"] += 1
+    metrics["failures"] = sorted(failures.values(), key=lambda failure: -failure["count"])[:max_tracebacks]
+    return metrics
+
+
+def run_seeds(paths: List[str], output_dir: str, num_inputs: int = 100, timeout: float = 10, memory_limit_mb: int = 4096,
+              num_workers: int = None, chunk_size: int = 10, seed: int = 0, metrics_name: str = "metrics.json") -> List[Dict]:
+    """
+    Run every seed program `num_inputs` times in a process pool with per-call time and memory limits.
+    Unique (input, output) pairs are streamed to output_dir/pairs/<seed>.jsonl as they arrive, and the
+    per-seed metrics are written to output_dir/`metrics_name`. Results are deterministic for a given `seed`.
+    A worker that dies (e.g. killed by the OS) takes the pending chunks of the pool with it: those are retried
+    in a process of their own, and the attempts during which that process dies too are recorded as crashes.
+    """
+    os.makedirs(os.path.join(output_dir, "pairs"), exist_ok=True)
+    names = {path: os.path.splitext(os.path.basename(path))[0] for path in paths}
+    files = {path: open(os.path.join(output_dir, "pairs", f"{names[path]}.jsonl"), "w") for path in paths}
+    records = {path: [] for path in paths}
+    hashes = {path: set() for path in paths}
+
+    def collect(path, chunk_records):
+        for record in chunk_records:
+            if record["status"] == "ok":
+                input_grid, output_grid = record.pop("input"), record.pop("output")
+                key = pair_hash(input_grid, output_grid)
+                if key not in hashes[path]:
+                    hashes[path].add(key)
+                    files[path].write(json.dumps({"seed": names[path], "input": input_grid.tolist(), "output": output_grid.tolist()}) + "\n")
+            records[path].append(record)
+
+    streams = {path: attempt_streams(names[path], num_inputs, seed) for path in paths}
+    jobs = [(path, range(start, min(start + chunk_size, num_inputs))) for path in paths for start in range(0, num_inputs, chunk_size)]
+    failed_jobs = []
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(memory_limit_mb,)) as executor:
+            futures = {
+                executor.submit(run_attempts, path, attempts, streams[path][attempts.start:attempts.stop], timeout): (path, attempts)
+                for path, attempts in jobs
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Running seeds"):
+                try:
+                    collect(futures[future][0], future.result())
+                except BrokenProcessPool:
+                    failed_jobs.append(futures[future])
+
+        # A dead worker breaks the whole pool, so the chunks it took down are retried in a process of their own, one
+        # attempt at a time: if that process dies too, only the attempt it was running is a crash, and a new process
+        # takes over the rest of the chunk
+        for path, attempts in tqdm(failed_jobs, desc="Retrying chunks of dead workers", disable=not failed_jobs):
+            executor = None
+            try:
+                for attempt in attempts:
+                    if executor is None:
+                        executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(memory_limit_mb,))
+                    try:
+                        collect(path, executor.submit(run_attempts, path, range(attempt, attempt + 1), streams[path][attempt:attempt + 1], timeout).result())
+                    except BrokenProcessPool:
+                        collect(path, [{"seed": names[path], "attempt": attempt, "status": "crash", "stage": None, "traceback": "BrokenProcessPool: the worker process died"}])
+                        executor.shutdown()
+                        executor = None
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+    finally:
+        for f in files.values():
+            f.close()
+
+    metrics = [summarize(names[path], records[path], len(hashes[path])) for path in paths]
+    metrics_path = os.path.join(output_dir, metrics_name)
+    with open(f"{metrics_path}.tmp", "w") as f:
+        json.dump(metrics, f, indent=4)
+    os.replace(f"{metrics_path}.tmp", metrics_path)
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds_dir", type=str, default=seeds_dir)
+    parser.add_argument("--output_dir", type=str, default=os.path.join(current_file_dir, "runs"))
+    parser.add_argument("--num_inputs", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds per generate_input / main call")
+    parser.add_argument("--memory_limit_mb", type=int, default=4096, help="address space limit of each worker")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk_size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--num_shards", type=int, default=1, help="split the seed programs into this many shards")
+    parser.add_argument("--shard_index", type=int, default=0, help="the shard to run")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.seeds_dir, name) for name in os.listdir(args.seeds_dir) if re.match(seed_pattern, name))
+    paths = paths[args.shard_index::args.num_shards]
+    metrics_name = "metrics.json" if args.num_shards == 1 else f"metrics_{args.shard_index:03d}_of_{args.num_shards:03d}.json"
+    metrics = run_seeds(paths, args.output_dir, args.num_inputs, args.timeout, args.memory_limit_mb, args.num_workers, args.chunk_size, args.seed, metrics_name)
+
+    total_attempts = sum(m["attempts"] for m in metrics)
+    total_successes = sum(m["successes"] for m in metrics)
+    print(f"Ran {len(metrics)} seeds: {total_successes}/{total_attempts} successful calls "
+          f"({total_successes / max(1, total_attempts):.1%}), {sum(m['unique_pairs'] for m in metrics)} unique pairs.")
+    for m in metrics:
+        if m["success_rate"] < 1:
+            print(f"  {m['seed']}: {m['success_rate']:.1%} success, {m['errors']} errors, {m['timeouts']} timeouts, {m['crashes']} crashes")
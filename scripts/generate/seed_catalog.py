@@ -0,0 +1,222 @@
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import tokenize
+from typing import List, Dict
+
+from common_lib import public_definitions, common_calls
+
+
+current_file_dir = os.path.dirname(os.path.realpath(__file__))
+seeds_dir = os.path.join(current_file_dir, "seeds")
+cache_dir = os.path.join(current_file_dir, "outputs", "cache")
+seed_pattern = r"[0-9a-f]{8}(_[a-zA-Z]+)?\.py"
+prompt_marker = "# ============= remove below this point for prompting ============="
+
+# Bump when the parsed fields change, to rebuild persisted catalogs
+CATALOG_VERSION = 1
+
+
+def header_comments(content: str) -> Dict[int, str]:
+    """Line number -> text of the comments that take a whole line, found with `tokenize`."""
+    comments = {}
+    for token in tokenize.generate_tokens(io.StringIO(content).readline):
+        if token.type == tokenize.COMMENT and token.start[1] == 0:
+            comments[token.start[0]] = token.string
+    return comments
+
+
+def parse_seed(content: str, common_names) -> Dict:
+    """
+    Concepts, description and `common.py` names used by a seed, from the part of its source shown in prompts.
+    A comment block is the `# concepts:` / `# description:` line and the `# ...` comment lines right below it.
+    """
+    comments = header_comments(content)
+    concepts, description = [], []
+    for line, text in sorted(comments.items()):
+        if text.startswith("# concepts:"):
+            if text[12:].strip():
+                concepts.extend(text[12:].split(","))
+            while comments.get(line + 1, "").startswith("# ") and not comments[line + 1].startswith("# description:"):
+                line += 1
+                concepts.extend(comments[line][2:].split(","))
+            concepts = [concept.strip() for concept in concepts]
+            break
+    for line, text in sorted(comments.items()):
+        if text.startswith("# description:"):
+            while comments.get(line + 1, "").startswith("# "):
+                line += 1
+                description.append(comments[line][2:])
+            break
+    return {
+        "concepts": concepts,
+        "description": " ".join(description) if description else "No description found.",
+        "common_calls": sorted(common_calls(content, common_names)),
+    }
+
+
+class SeedCatalog:
+    """
+    Parsed metadata of every seed program, persisted to `path` (by default a file of `cache_dir` named after the
+    seeds directory) and updated incrementally: a seed is only re-parsed when its modification time or size
+    changes, and everything is re-parsed when `common.py` changes.
+
+    catalog = SeedCatalog()
+    catalog["0dfd9992"]                 # {"name", "content", "concepts", "description", "common_calls", "hash", ...}
+    catalog.with_concept("occlusion")   # names of the seeds tagged with a concept
+    catalog.using("orbit_labels")       # names of the seeds that use a common.py function
+    """
+
+    def __init__(self, seeds_dir: str = seeds_dir, path: str = None, refresh: bool = True):
+        self.seeds_dir = seeds_dir
+        if path is None:
+            directory_hash = hashlib.sha1(os.path.realpath(seeds_dir).encode()).hexdigest()[:12]
+            path = os.path.join(cache_dir, f"seed_catalog_{directory_hash}.json")
+        self.path = path
+        self.entries = {}
+        self.common_stat = None
+        self.dir_stat = None
+        self.refreshed = None
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                self.entries = data["entries"]
+                self.common_stat = data["common_stat"]
+        self._build_indexes()
+        if refresh:
+            self.refresh()
+
+    @staticmethod
+    def _stat(path: str) -> List[int]:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def refresh(self) -> int:
+        """
+        Re-parse new and modified seeds, forget deleted ones, and save the catalog if anything changed.
+        Returns the number of re-parsed and removed seeds.
+        """
+        # Taken before the scan, so that seeds written during it are picked up by the next `update`
+        self.dir_stat = self._stat(self.seeds_dir)
+        self.refreshed = time.monotonic()
+        common_path = os.path.join(self.seeds_dir, "common.py")
+        common_stat = self._stat(common_path)
+        if common_stat != self.common_stat:
+            self.entries, self.common_stat = {}, common_stat
+        common_names = None
+
+        changed = 0
+        names = set()
+        for entry in os.scandir(self.seeds_dir):
+            if not re.match(seed_pattern, entry.name):
+                continue
+            name = entry.name[:-len(".py")]
+            names.add(name)
+            stat = [entry.stat().st_mtime_ns, entry.stat().st_size]
+            if name in self.entries and self.entries[name]["stat"] == stat:
+                continue
+            if common_names is None:
+                with open(common_path) as f:
+                    common_names = public_definitions(f.read())
+            self.entries[name] = self.parse(entry.path, common_names)
+            self.entries[name]["stat"] = stat
+            changed += 1
+        for name in set(self.entries) - names:
+            del self.entries[name]
+            changed += 1
+
+        if changed:
+            self.entries = dict(sorted(self.entries.items()))
+            self._build_indexes()
+            self.save()
+        return changed
+
+    def update(self, max_age: float = None) -> int:
+        """
+        `refresh`, only if a seed was added, removed or replaced since the last one, `common.py` changed, or the last
+        refresh is more than `max_age` seconds old. Otherwise this costs two stat calls instead of one per seed, but
+        a seed edited in place does not change the directory: it is only seen by the next full refresh.
+        """
+        if max_age is not None and (self.refreshed is None or time.monotonic() - self.refreshed > max_age):
+            return self.refresh()
+        if self._stat(self.seeds_dir) == self.dir_stat and self._stat(os.path.join(self.seeds_dir, "common.py")) == self.common_stat:
+            return 0
+        return self.refresh()
+
+    def parse(self, path: str, common_names) -> Dict:
+        with open(path) as f:
+            source = f.read()
+        content = source.split(prompt_marker)[0].strip()
+        entry = {
+            "name": os.path.basename(path)[:-len(".py")],
+            "hash": hashlib.sha1(source.encode()).hexdigest(),
+            "content": content,
+        }
+        try:
+            entry.update(parse_seed(content, common_names))
+        except (SyntaxError, tokenize.TokenError) as e:
+            entry.update({"concepts": [], "description": "No description found.", "common_calls": [], "error": f"{type(e).__name__}: {e}"})
+        return entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"version": CATALOG_VERSION, "common_stat": self.common_stat, "entries": self.entries}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def _build_indexes(self):
+        self._by_concept, self._by_function = {}, {}
+        for name, entry in self.entries.items():
+            for concept in entry["concepts"]:
+                self._by_concept.setdefault(concept.lower(), []).append(name)
+            for function in entry["common_calls"]:
+                self._by_function.setdefault(function, []).append(name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def __contains__(self, name: str):
+        return name in self.entries
+
+    def __getitem__(self, name: str) -> Dict:
+        return self.entries[name]
+
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def with_concept(self, concept: str) -> List[str]:
+        return list(self._by_concept.get(concept.lower(), []))
+
+    def using(self, function: str) -> List[str]:
+        return list(self._by_function.get(function, []))
+
+    def concepts(self) -> Dict[str, int]:
+        """Every concept with its number of seeds."""
+        return {concept: len(names) for concept, names in sorted(self._by_concept.items())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds_dir", type=str, default=seeds_dir)
+    parser.add_argument("--concept", type=str, default=None, help="list the seeds tagged with this concept")
+    parser.add_argument("--function", type=str, default=None, help="list the seeds that use this common.py function")
+    args = parser.parse_args()
+
+    catalog = SeedCatalog(args.seeds_dir)
+    if args.concept:
+        print("\n".join(catalog.with_concept(args.concept)))
+    elif args.function:
+        print("\n".join(catalog.using(args.function)))
+    else:
+        print(f"{len(catalog)} seeds, {len(catalog.concepts())} concepts")
+        for entry in catalog:
+            error = f" ({entry['error']})" if "error" in entry else ""
+            print(f"{entry['name']}: {', '.join(entry['concepts'])} | uses {', '.join(entry['common_calls'])}{error}")
@@ -0,0 +1,195 @@
+import re
+import math
+import zlib
+import argparse
+import numpy as np
+from collections import Counter
+from typing import List, Tuple
+
+from seed_catalog import SeedCatalog
+
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "each", "for", "from", "if", "in", "into", "is", "it", "its",
+    "of", "on", "or", "that", "the", "their", "them", "then", "there", "these", "they", "this", "to", "will",
+    "with", "you", "your", "make", "output", "input", "grid", "see",
+}
+
+# Mersenne prime for the universal hashes of MinHash; with 31-bit coefficients and 32-bit term hashes,
+# h * a + b stays below 2^63 and never overflows uint64
+_PRIME = (1 << 61) - 1
+
+
+def tokenize_text(text: str) -> List[str]:
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def seed_terms(concepts: List[str], description: str) -> List[str]:
+    """Terms of a seed: its concepts count twice, as they are the most telling words."""
+    return tokenize_text(" ".join(concepts)) * 2 + tokenize_text(description)
+
+
+class SeedIndex:
+    """
+    Local similarity index over seed concepts and descriptions: TF-IDF cosine similarity, scored only on candidate
+    seeds. Candidates come from MinHash/LSH buckets (seeds sharing many terms with the query), and from the
+    inverted index of the query terms when LSH finds fewer than `min_candidates`.
+    Seeds can be added and removed at any time. An insertion changes the idf of every term (through N), so instead
+    of norms, each seed keeps sums from which its norm follows for any N; only the sums of the seeds sharing a term
+    with the inserted or removed one change.
+
+    index = SeedIndex.from_catalog(SeedCatalog())
+    index.search("the pattern is occluded by black pixels", k=3)    # [(name, similarity), ...]
+    index.add("0f1e2d3c", concepts=["gravity"], description="Objects fall down until they hit the floor.")
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, min_candidates: int = 50, seed: int = 0):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.num_perm, self.bands, self.rows = num_perm, bands, num_perm // bands
+        self.min_candidates = min_candidates
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+        self.term_counts = {}    # name -> Counter of terms
+        self.hashes = {}         # name -> source hash of the indexed seed, for `sync`
+        self.signatures = {}     # name -> MinHash signature
+        self.postings = {}       # term -> set of names
+        self.buckets = [{} for _ in range(bands)]   # band -> band hash -> set of names
+        self._sums = {}          # name -> norm sums, see `_update_sums`
+
+    @classmethod
+    def from_catalog(cls, catalog: SeedCatalog, **kwargs) -> "SeedIndex":
+        index = cls(**kwargs)
+        index.sync(catalog)
+        return index
+
+    def __len__(self):
+        return len(self.term_counts)
+
+    def __contains__(self, name: str):
+        return name in self.term_counts
+
+    def signature(self, terms) -> np.ndarray:
+        """MinHash signature of a set of terms, one minimum per hash function (h * a + b mod p)."""
+        hashes = np.array(sorted({zlib.crc32(term.encode()) for term in terms}) or [0], dtype=np.uint64)
+        return ((hashes[None, :] * self._a[:, None] + self._b[:, None]) % np.uint64(_PRIME)).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, name: str, concepts: List[str], description: str):
+        """Insert a seed, or replace it if the name is already indexed."""
+        if name in self:
+            self.remove(name)
+        counts = Counter(seed_terms(concepts, description))
+        for term in counts:
+            self.postings.setdefault(term, set()).add(name)
+            self._update_sums(term, len(self.postings[term]) - 1)
+        self.term_counts[name] = counts
+        self._sums[name] = self._document_sums(counts)
+        self.signatures[name] = self.signature(counts)
+        for bucket, key in zip(self.buckets, self._band_keys(self.signatures[name])):
+            bucket.setdefault(key, set()).add(name)
+
+    def remove(self, name: str):
+        counts = self.term_counts.pop(name)
+        self.hashes.pop(name, None)
+        del self._sums[name]
+        for term in counts:
+            self.postings[term].discard(name)
+            self._update_sums(term, len(self.postings[term]) + 1)
+            if not self.postings[term]:
+                del self.postings[term]
+        for bucket, key in zip(self.buckets, self._band_keys(self.signatures.pop(name))):
+            bucket[key].discard(name)
+            if not bucket[key]:
+                del bucket[key]
+
+    def sync(self, catalog: SeedCatalog) -> int:
+        """
+        Add the catalog's seeds that are new or changed since they were indexed, and drop the ones it no longer has.
+        Returns the number of added and removed seeds.
+        """
+        changed = 0
+        for entry in catalog:
+            if self.hashes.get(entry["name"]) != entry["hash"]:
+                self.add(entry["name"], entry["concepts"], entry["description"])
+                self.hashes[entry["name"]] = entry["hash"]
+                changed += 1
+        for name in [name for name in self.term_counts if name not in catalog]:
+            self.remove(name)
+            changed += 1
+        return changed
+
+    def idf(self, term: str) -> float:
+        return math.log((1 + len(self)) / (1 + len(self.postings.get(term, ())))) + 1
+
+    # With L = log(1 + N) + 1 and a_t = log(1 + df_t), idf_t = L - a_t and the squared norm of a seed is
+    # L^2 * sum(c_t^2) - 2L * sum(c_t^2 a_t) + sum(c_t^2 a_t^2): N only enters through L, and the sums of a seed
+    # only change with the document frequencies of its own terms.
+
+    def _document_sums(self, counts: Counter) -> List[float]:
+        sums = [0.0, 0.0, 0.0]
+        for term, count in counts.items():
+            a = math.log(1 + len(self.postings[term]))
+            sums[0] += count ** 2
+            sums[1] += count ** 2 * a
+            sums[2] += count ** 2 * a ** 2
+        return sums
+
+    def _update_sums(self, term: str, previous_df: int):
+        """Update the sums of the indexed seeds with `term` after its document frequency changed from `previous_df`."""
+        a, b = math.log(1 + previous_df), math.log(1 + len(self.postings[term]))
+        for name in self.postings[term]:
+            if name in self._sums:
+                weight = self.term_counts[name][term] ** 2
+                self._sums[name][1] += weight * (b - a)
+                self._sums[name][2] += weight * (b ** 2 - a ** 2)
+
+    def norm(self, name: str, L: float = None) -> float:
+        """TF-IDF norm of an indexed seed; `L` can be passed when computing many norms of the same index."""
+        s0, s1, s2 = self._sums[name]
+        if L is None:
+            L = math.log(1 + len(self)) + 1
+        return math.sqrt(max(L * L * s0 - 2 * L * s1 + s2, 0.0))
+
+    def candidates(self, terms: Counter) -> set:
+        names = set()
+        for bucket, key in zip(self.buckets, self._band_keys(self.signature(terms))):
+            names |= bucket.get(key, set())
+        if len(names) < self.min_candidates:
+            for term in terms:
+                names |= self.postings.get(term, set())
+        return names
+
+    def search(self, description: str, k: int = 3, concepts: List[str] = (), exclude: List[str] = ()) -> List[Tuple[str, float]]:
+        """
+        The `k` seeds most similar to a description (and optional concepts), as (name, cosine similarity) pairs.
+        """
+        query = Counter(seed_terms(list(concepts), description))
+        if not query or not self.term_counts:
+            return []
+        idf = {term: self.idf(term) for term in query if term in self.postings}
+        L = math.log(1 + len(self)) + 1
+        query_norm = math.sqrt(sum((query[term] * idf[term]) ** 2 for term in idf)) or 1.0
+
+        scores = []
+        for name in self.candidates(query) - set(exclude):
+            counts = self.term_counts[name]
+            dot = sum(query[term] * counts[term] * idf[term] ** 2 for term in idf if term in counts)
+            if dot > 0:
+                scores.append((name, dot / (query_norm * self.norm(name, L))))
+        scores.sort(key=lambda score: (-score[1], score[0]))
+        return scores[:k]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("description", type=str)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    index = SeedIndex.from_catalog(SeedCatalog())
+    for name, similarity in index.search(args.description, k=args.k):
+        print(f"{name}: {similarity:.3f}")
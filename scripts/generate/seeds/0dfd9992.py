@@ -15,33 +15,25 @@ def main(input_grid):
     # 1. Find the translational symmetries
     # 2. Reconstruct the sprite by ignoring the black pixels and exploiting the symmetry
 
-    w, h = input_grid.shape
-
     # Identify the translational symmetries. Note that there is no background color for this problem.
     translations = detect_translational_symmetry(input_grid, ignore_colors=[Color.BLACK], background=None)
     assert len(translations) > 0, "No translational symmetry found"
 
     # Reconstruct the occluded black pixels by replacing them with colors found in the orbit of the symmetries
+    # Use the translational symmetry to fill in the occluded pixels:
+    # to do this we split the canvas into ORBITS under the translations, and give every orbit its non-black color
     output_grid = np.copy(input_grid)
-    for x in range(w):
-        for y in range(h):
-            if output_grid[x, y] == Color.BLACK:
-                # Use the translational symmetry to fill in the occluded pixels
-                # to do this we compute the ORBIT of the current pixel under the translations
-                # and take the most common non-black color in the orbit
+    labels = orbit_labels(output_grid, translations)
+    for label in np.unique(labels[output_grid == Color.BLACK]):
+        orbit_mask = labels == label
 
-                # Compute the orbit into the output
-                orbit_pixels = orbit(output_grid, x, y, translations)
-                orbit_colors = {input_grid[transformed_x, transformed_y]
-                                for transformed_x, transformed_y in orbit_pixels}
-                
-                # occluded by black, so whatever color it is, black doesn't count
-                orbit_colors = orbit_colors - {Color.BLACK}
+        # occluded by black, so whatever color it is, black doesn't count
+        orbit_colors = set(input_grid[orbit_mask]) - {Color.BLACK}
+
+        # Copy the color
+        assert len(orbit_colors) == 1, "Ambiguity: multiple colors in the orbit"
+        output_grid[orbit_mask] = orbit_colors.pop()
 
-                # Copy the color
-                assert len(orbit_colors) == 1, "Ambiguity: multiple colors in the orbit"
-                output_grid[x, y] = orbit_colors.pop()
-    
     return output_grid
 
 def generate_input():
@@ -2,6 +2,55 @@
 
 import numpy as np
 import random
+from contextlib import contextmanager
+
+
+# Generator set by `rng_context`
+_rng = None
+
+
+@contextmanager
+def rng_context(rng):
+    """
+    internal function not used by LLM
+
+    Make every sampling function of this library draw from `rng` (an np.random.Generator, or a seed for one)
+    inside the `with` block, so that generators can run with independent, reproducible streams.
+    """
+    global _rng
+    previous = _rng
+    _rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    try:
+        yield _rng
+    finally:
+        _rng = previous
+
+
+def get_rng(rng=None):
+    """
+    internal function not used by LLM
+
+    The generator to draw from: `rng` if given, else the one of the enclosing `rng_context`, else the global
+    `np.random` state, so that `np.random.seed` keeps results reproducible. The global `random` module is never used:
+    unlike when these helpers drew from `random`, seeding only `random` no longer reproduces their results, so code
+    that reruns seeds must also seed `np.random` (or use `rng_context`), as `run_seeds.run_attempts` does.
+    """
+    if rng is not None:
+        return rng
+    if _rng is not None:
+        return _rng
+    # Shares the bit generator behind np.random.* instead of drawing a seed from it, so no extra draw is consumed
+    return np.random.Generator(np.random.get_bit_generator())
+
+
+def _uniforms(rng, block_size=256):
+    """
+    internal function not used by LLM
+
+    Endless stream of uniform floats in [0, 1) from `rng`, drawn in blocks.
+    """
+    while True:
+        yield from rng.random(block_size).tolist()
 
 
 class Color:
@@ -41,45 +90,41 @@ def flood_fill(grid, x, y, color, connectivity=4):
     Fill the connected region that contains the point (x, y) with the specified color.
 
     connectivity: 4 or 8, for 4-way or 8-way connectivity. 8-way counts diagonals as connected, 4-way only counts cardinal directions as connected.
-    """
+    x, y can also be lists of coordinates, in which case the regions of all of those points are filled.
 
-    old_color = grid[x, y]
+    Example usage:
+    flood_fill(grid, x, y, color=fill_color, connectivity=4)
+    flood_fill(grid, [x1, x2], [y1, y2], color=fill_color) # fill the regions containing (x1, y1) and (x2, y2)
+    """
 
     assert connectivity in [4, 8], "flood_fill: Connectivity must be 4 or 8."
 
-    _flood_fill(grid, x, y, color, old_color, connectivity)
+    _flood_fill(grid, np.atleast_1d(x), np.atleast_1d(y), color, connectivity)
 
 
-def _flood_fill(grid, x, y, color, old_color, connectivity):
+def _flood_fill(grid, xs, ys, color, connectivity):
     """
     internal function not used by LLM
-    """
-    if grid[x, y] != old_color or grid[x, y] == color:
-        return
-
-    grid[x, y] = color
 
-    # flood fill in all directions
-    if x > 0:
-        _flood_fill(grid, x - 1, y, color, old_color, connectivity)
-    if x < grid.shape[0] - 1:
-        _flood_fill(grid, x + 1, y, color, old_color, connectivity)
-    if y > 0:
-        _flood_fill(grid, x, y - 1, color, old_color, connectivity)
-    if y < grid.shape[1] - 1:
-        _flood_fill(grid, x, y + 1, color, old_color, connectivity)
+    Labels the regions of each seed color once and fills every region that contains a seed.
+    """
+    from scipy.ndimage import label
 
     if connectivity == 4:
-        return
+        structure = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]])
+    else:
+        structure = np.array([[1, 1, 1], [1, 1, 1], [1, 1, 1]])
+
+    seed_colors = grid[xs, ys]
+    fill = np.zeros(grid.shape, dtype=bool)
+    for old_color in np.unique(seed_colors):
+        if old_color == color:
+            continue
+        labeled, _ = label(grid == old_color, structure)
+        is_seed = seed_colors == old_color
+        fill |= np.isin(labeled, labeled[xs[is_seed], ys[is_seed]])
 
-    if x > 0 and y > 0:
-        _flood_fill(grid, x - 1, y - 1, color, old_color, connectivity)
-    if x > 0 and y < grid.shape[1] - 1:
-        _flood_fill(grid, x - 1, y + 1, color, old_color, connectivity)
-    if x < grid.shape[0] - 1 and y > 0:
-        _flood_fill(grid, x + 1, y - 1, color, old_color, connectivity)
-    if x < grid.shape[0] - 1 and y < grid.shape[1] - 1:
-        _flood_fill(grid, x + 1, y + 1, color, old_color, connectivity)
+    grid[fill] = color
 
 
 def draw_line(grid, x, y, end_x=None, end_y=None, length=None, direction=None, color=None, stop_at_color=[]):
@@ -129,60 +174,155 @@ def draw_line(grid, x, y, end_x=None, end_y=None, length=None, direction=None, c
     return stop_x, stop_y
 
 
-def find_connected_components(
-    grid, background=Color.BLACK, connectivity=4, monochromatic=True
-):
+class Component:
     """
-    Find the connected components in the grid. Returns a list of connected components, where each connected component is a numpy array.
+    A connected component found by `label_connected_components`, stored compactly as its bounding box.
+
+    label: the value of the component's pixels in the label image
+    x, y, width, height: bounding box of the component, as returned by `bounding_box`
+    n_pixels: number of pixels in the component
+    colors: sorted list of the colors in the component
+
+    Example usage:
+    labels, components = label_connected_components(input_grid, background=Color.BLACK, connectivity=4)
+    for component in components:
+        sprite = component.sprite    # cropped to the bounding box, background outside the component
+        mask = component.mask        # cropped to the bounding box, True on the component
+        obj = component.to_grid()    # full-size grid, like the objects of `find_connected_components`
+    """
+
+    def __init__(self, grid, labels, label, x, y, width, height, n_pixels, colors, background=Color.BLACK):
+        self._grid, self._labels, self.background = grid, labels, background
+        self.label = label
+        self.x, self.y, self.width, self.height = x, y, width, height
+        self.n_pixels = n_pixels
+        self.colors = colors
+
+    @property
+    def _window(self):
+        return slice(self.x, self.x + self.width), slice(self.y, self.y + self.height)
+
+    @property
+    def mask(self):
+        return self._labels[self._window] == self.label
+
+    @property
+    def sprite(self):
+        sprite = np.full((self.width, self.height), self.background, dtype=np.result_type(self._grid.dtype, int))
+        mask = self.mask
+        sprite[mask] = self._grid[self._window][mask]
+        return sprite
+
+    def to_grid(self):
+        obj = np.full(self._grid.shape, self.background, dtype=np.result_type(self._grid.dtype, int))
+        window = self._window
+        mask = self._labels[window] == self.label
+        obj[window][mask] = self._grid[window][mask]
+        return obj
+
+    def __repr__(self):
+        return f"Component(label={self.label}, x={self.x}, y={self.y}, width={self.width}, height={self.height}, n_pixels={self.n_pixels}, colors={self.colors})"
+
+
+def label_connected_components(grid, background=Color.BLACK, connectivity=4, monochromatic=True):
+    """
+    Find the connected components in the grid without making a full-size copy of each of them.
+    Returns (labels, components): labels is an integer array with the shape of `grid`, 0 on the background and i + 1 on components[i],
+    and components is a list of `Component`, in the order of their first pixel (row by row).
 
     connectivity: 4 or 8, for 4-way or 8-way connectivity.
     monochromatic: if True, each connected component is assumed to have only one color. If False, each connected component can include multiple colors.
-    """
 
-    from scipy.ndimage import label
+    Example usage:
+    labels, components = label_connected_components(input_grid, background=Color.BLACK, connectivity=8, monochromatic=True)
+    biggest = max(components, key=lambda component: component.n_pixels)
+    output_grid[labels == biggest.label] = Color.RED
+    """
+    from scipy.ndimage import find_objects
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
 
     if connectivity == 4:
-        structure = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]])
+        offsets = [(0, 1), (1, 0)]
     elif connectivity == 8:
-        structure = np.array([[1, 1, 1], [1, 1, 1], [1, 1, 1]])
+        offsets = [(0, 1), (1, 0), (1, 1), (1, -1)]
     else:
         raise ValueError("Connectivity must be 4 or 8.")
 
-    if (
-        not monochromatic
-    ):  # if we allow multiple colors in a connected component, we can ignore color except for whether it's the background
-        labeled, n_objects = label(grid != background, structure)
-        connected_components = []
-        for i in range(n_objects):
-            connected_component = grid * (labeled == i + 1) + background * (labeled != i + 1)
-            connected_components.append(connected_component)
+    # Link every pair of neighboring pixels that belong together; all colors are handled in the same pass
+    n, m = grid.shape
+    occupied = grid != background
+    index = np.arange(n * m).reshape(n, m)
+    sources, targets = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+    for dx, dy in offsets:
+        here = slice(0, n - dx), slice(max(0, -dy), m - max(0, dy))
+        there = slice(dx, n), slice(max(0, dy), m - max(0, -dy))
+        linked = occupied[here] & occupied[there]
+        if monochromatic:
+            linked &= grid[here] == grid[there]
+        sources.append(index[here][linked])
+        targets.append(index[there][linked])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    graph = coo_matrix((np.ones(len(sources), dtype=bool), (sources, targets)), shape=(n * m, n * m))
+    _, pixel_components = connected_components(graph, directed=False)
+
+    # Number the components in the order of their first pixel
+    pixels = np.flatnonzero(occupied)
+    _, first_pixels, inverse = np.unique(pixel_components[pixels], return_index=True, return_inverse=True)
+    rank = np.empty(len(first_pixels), dtype=int)
+    rank[np.argsort(first_pixels)] = np.arange(len(first_pixels))
+    labels = np.zeros((n, m), dtype=int)
+    labels.flat[pixels] = rank[inverse.ravel()] + 1
+
+    n_pixels = np.bincount(labels.ravel(), minlength=len(first_pixels) + 1)
+    label_colors = np.unique(np.stack([labels.flat[pixels], grid.flat[pixels]]), axis=1)
+    colors = [[] for _ in first_pixels]
+    for label, color in label_colors.T.tolist():
+        colors[label - 1].append(color)
+
+    components = []
+    for i, (rows, columns) in enumerate(find_objects(labels)):
+        components.append(Component(
+            grid, labels, i + 1,
+            rows.start, columns.start, rows.stop - rows.start, columns.stop - columns.start,
+            int(n_pixels[i + 1]), colors[i], background=background,
+        ))
+    return labels, components
 
-        return connected_components
-    else:
-        # if we only allow one color per connected component, we need to iterate over the colors
-        connected_components = []
-        for color in set(grid.flatten()) - {background}:
-            labeled, n_objects = label(grid == color, structure)
-            for i in range(n_objects):
-                connected_component = grid * (labeled == i + 1) + background * (labeled != i + 1)
-                connected_components.append(connected_component)
-        return connected_components
+def find_connected_components(
+    grid, background=Color.BLACK, connectivity=4, monochromatic=True
+):
+    """
+    Find the connected components in the grid. Returns a list of connected components, where each connected component is a numpy array.
 
-def randomly_scatter_points(grid, color, density=0.5, background=Color.BLACK):
+    connectivity: 4 or 8, for 4-way or 8-way connectivity.
+    monochromatic: if True, each connected component is assumed to have only one color. If False, each connected component can include multiple colors.
+    """
+
+    _, components = label_connected_components(grid, background=background, connectivity=connectivity, monochromatic=monochromatic)
+    if monochromatic:
+        # components are listed color by color, in the order of iterating over the set of colors in the grid
+        values, first_pixels = np.unique(grid.ravel(), return_index=True)
+        color_set = set(values[np.argsort(first_pixels)].tolist()) - {background}
+        color_order = {color: i for i, color in enumerate(color_set)}
+        components = sorted(components, key=lambda component: color_order[component.colors[0]])
+    return [component.to_grid() for component in components]
+
+def randomly_scatter_points(grid, color, density=0.5, background=Color.BLACK, rng=None):
     """
     Randomly scatter points of the specified color in the grid with specified density.
+    Colors ceil(density * grid size) background pixels, or every background pixel if there are fewer.
+
+    rng: optional np.random.Generator to draw from, for reproducible results (default: the global np.random state)
 
     Example usage:
     randomly_scatter_points(grid, color=a_color, density=0.5, background=background_color)
     """
-    colored = 0
+    rng = get_rng(rng)
     n, m = grid.shape
-    while colored < density * n * m:
-        x = np.random.randint(0, n)
-        y = np.random.randint(0, m)
-        if grid[x, y] == background:
-            grid[x, y] = color
-            colored += 1
+    free = np.flatnonzero(grid == background)
+    n_points = min(len(free), int(np.ceil(density * n * m)))
+    grid.flat[rng.choice(free, size=n_points, replace=False)] = color
     return grid
 
 def scale_pattern(pattern, scale_factor):
@@ -190,13 +330,7 @@ def scale_pattern(pattern, scale_factor):
     Scales the pattern by the specified factor.
     """
     print("scale_pattern: DEPRECATED, switch to scale_sprite")
-    n, m = pattern.shape
-    new_n, new_m = n * scale_factor, m * scale_factor
-    new_pattern = np.zeros((new_n, new_m), dtype=pattern.dtype)
-    for i in range(new_n):
-        for j in range(new_m):
-            new_pattern[i, j] = pattern[i // scale_factor, j // scale_factor]
-    return new_pattern
+    return np.repeat(np.repeat(pattern, scale_factor, axis=0), scale_factor, axis=1)
 
 def scale_sprite(sprite, factor):
     """
@@ -221,12 +355,23 @@ def blit(grid, sprite, x=0, y=0, background=None):
 
     x, y = int(x), int(y)
 
-    for i in range(sprite.shape[0]):
-        for j in range(sprite.shape[1]):
-            if background is None or sprite[i, j] != background:
-                # check that it is inbounds
-                if 0 <= x + i < grid.shape[0] and 0 <= y + j < grid.shape[1]:
-                    new_grid[x + i, y + j] = sprite[i, j]
+    # clip the sprite to the part that lands inbounds
+    x_start, y_start = max(x, 0), max(y, 0)
+    x_end, y_end = min(x + sprite.shape[0], grid.shape[0]), min(y + sprite.shape[1], grid.shape[1])
+    if x_start >= x_end or y_start >= y_end:
+        return new_grid
+    window = sprite[x_start - x : x_end - x, y_start - y : y_end - y]
+
+    if np.shares_memory(grid, sprite):
+        # the sprite is a view of the grid (e.g. np.rot90(grid)), so later pixels must see earlier writes
+        for i, j in np.ndindex(*window.shape):
+            if background is None or window[i, j] != background:
+                new_grid[x_start + i, y_start + j] = window[i, j]
+    elif background is None:
+        new_grid[x_start:x_end, y_start:y_end] = window
+    else:
+        opaque = window != background
+        new_grid[x_start:x_end, y_start:y_end][opaque] = window[opaque]
 
     return new_grid
 
@@ -260,17 +405,16 @@ def bounding_box(grid, background=Color.BLACK):
     teal_x, teal_y, teal_w, teal_h = bounding_box(teal_object)
     """
     n, m = grid.shape
-    x_min, x_max = n, -1
-    y_min, y_max = m, -1
+    mask = grid != background
+    xs = np.flatnonzero(mask.any(axis=1))
+    ys = np.flatnonzero(mask.any(axis=0))
 
-    for x in range(n):
-        for y in range(m):
-            if grid[x, y] != background:
-                x_min = min(x_min, x)
-                x_max = max(x_max, x)
-                y_min = min(y_min, y)
-                y_max = max(y_max, y)
+    if len(xs) == 0:
+        # empty grid: same degenerate box as an exhaustive min/max search starting from (n, m) and (-1, -1)
+        return n, m, -n, -m
 
+    x_min, x_max = int(xs[0]), int(xs[-1])
+    y_min, y_max = int(ys[0]), int(ys[-1])
     return x_min, y_min, x_max - x_min + 1, y_max - y_min + 1
 
 def bounding_box_mask(grid, background=Color.BLACK):
@@ -365,13 +509,12 @@ def translate(obj, x, y, background=Color.BLACK):
     """
     grid = obj
     n, m = grid.shape
+    x, y = int(x), int(y)
     new_grid = np.zeros((n, m), dtype=grid.dtype)
     new_grid[:, :] = background
-    for i in range(n):
-        for j in range(m):
-            new_x, new_y = i + x, j + y
-            if 0 <= new_x < n and 0 <= new_y < m:
-                new_grid[new_x, new_y] = grid[i, j]
+    if abs(x) >= n or abs(y) >= m:
+        return new_grid
+    new_grid[max(x, 0) : n + min(x, 0), max(y, 0) : m + min(y, 0)] = grid[max(-x, 0) : n - max(x, 0), max(-y, 0) : m - max(y, 0)]
     return new_grid
 
 
@@ -389,26 +532,30 @@ def collision(
     # Check if two objects collide
     collision(object1=object1, object2=object2, x1=X1, y1=Y1, x2=X2, y2=Y2)
     """
-    n1, m1 = object1.shape
-    n2, m2 = object2.shape
-
     dx = x2 - x1
     dy = y2 - y1
     dx, dy = int(dx), int(dy)
 
-    for x in range(n1):
-        for y in range(m1):
-            if object1[x, y] != background:
-                new_x = x - dx
-                new_y = y - dy
-                if (
-                    0 <= new_x < n2
-                    and 0 <= new_y < m2
-                    and object2[new_x, new_y] != background
-                ):
-                    return True
+    return _shifted_overlap(object1 != background, object2 != background, dx, dy)
 
-    return False
+
+def _shifted_overlap(mask1, mask2, dx, dy):
+    """
+    internal function not used by LLM
+
+    True if mask1[x, y] and mask2[x - dx, y - dy] are both set for some x, y.
+    """
+    n1, m1 = mask1.shape
+    n2, m2 = mask2.shape
+
+    x_start, x_end = max(0, dx), min(n1, n2 + dx)
+    y_start, y_end = max(0, dy), min(m1, m2 + dy)
+    if x_start >= x_end or y_start >= y_end:
+        return False
+
+    return bool(np.any(
+        mask1[x_start:x_end, y_start:y_end] & mask2[x_start - dx : x_end - dx, y_start - dy : y_end - dy]
+    ))
 
 
 def contact(
@@ -436,9 +583,6 @@ def contact(
     # Check if two objects touch each other
     contact(object1=object1, object2=object2)
     """
-    n1, m1 = object1.shape
-    n2, m2 = object2.shape
-
     dx = int(x2 - x1)
     dy = int(y2 - y1)
 
@@ -459,51 +603,41 @@ def contact(
     else:
         raise ValueError("Connectivity must be 4 or 8.")
 
-    for x in range(n1):
-        for y in range(m1):
-            if object1[x, y] != background:
-                for mx, my in moves:
-                    new_x = x - dx + mx
-                    new_y = y - dy + my
-                    if (
-                        0 <= new_x < n2
-                        and 0 <= new_y < m2
-                        and object2[new_x, new_y] != background
-                    ):
-                        return True
-
-    return False
+    # touching means overlapping after shifting by one of the moves
+    mask1, mask2 = object1 != background, object2 != background
+    return any(_shifted_overlap(mask1, mask2, dx - mx, dy - my) for mx, my in moves)
 
-def randomly_spaced_indices(max_len, n_indices, border_size=1, padding=1):
+def randomly_spaced_indices(max_len, n_indices, border_size=1, padding=1, rng=None):
     """
     Generate randomly-spaced indices guaranteed to not be adjacent.
     Useful for generating random dividers.
 
     padding: guaranteed empty space in between indices
     border_size: guaranteed empty space at the border
+    rng: optional np.random.Generator to draw from, for reproducible results (default: the global np.random state)
+
+    Raises ValueError if the indices do not fit.
 
     Example usage:
     x_indices = randomly_spaced_indices(grid.shape[0], num_dividers, border_size=1, padding=2) # make sure each region is at least 2 pixels wide
     for x in x_indices:
         grid[x, :] = divider_color
     """
-    if border_size>0:
-        return randomly_spaced_indices(max_len-border_size-2, n_indices, border_size=0, padding=padding) + border_size
-    
-    indices = [0 for _ in range(max_len)]
-    while sum(indices) < n_indices:
-        # Randomly select an index to turn 1
-        try:
-            possible_indices = [i for i in range(max_len)
-                                if sum(indices[max(0,i-padding) : min(i+1+padding, max_len)]) == 0 ]
-        except:
-            print('max_len:', max_len)
-            print('indices:', indices)
-            print('n_indices:', n_indices)
-            assert 0
-        indices[random.choice(possible_indices)] = 1
-
-    return np.argwhere(indices).flatten()
+    rng = get_rng(rng)
+    offset = 0
+    if border_size > 0:
+        # the indices are placed in [border_size, max_len - 3]
+        offset, max_len = border_size, max_len - border_size - 2
+
+    # Stars and bars: after removing `padding` slots after each index but the last, any choice of n_indices slots
+    # out of the remaining ones gives a valid placement, and every valid placement is equally likely
+    n_slots = max_len - (n_indices - 1) * padding
+    if n_indices > 0 and n_slots < n_indices:
+        raise ValueError(f"Cannot place {n_indices} indices with padding {padding} in {max_len} positions.")
+    if n_indices <= 0:
+        return np.zeros(0, dtype=int)
+    slots = np.sort(rng.choice(n_slots, size=n_indices, replace=False))
+    return slots + padding * np.arange(n_indices) + offset
 
 def check_between_objects(obj1, obj2, x, y, padding = 0, background=Color.BLACK):
     """
@@ -555,6 +689,7 @@ def random_free_location_for_sprite(
     border_size=0,
     padding=0,
     padding_connectivity=8,
+    rng=None,
 ):
     """
     Find a random free location for the sprite in the grid
@@ -572,11 +707,81 @@ def random_free_location_for_sprite(
 
     If no free location can be found, raises a ValueError.
     """
+    free_locations = free_locations_for_sprite(
+        grid, sprite, background=background, border_size=border_size, padding=padding, padding_connectivity=padding_connectivity
+    )
+    return random_location(free_locations, rng=rng)
+
+def free_locations_for_sprite(
+    grid,
+    sprite,
+    background=Color.BLACK,
+    border_size=0,
+    padding=0,
+    padding_connectivity=8,
+):
+    """
+    Find every free location for the sprite in the grid, using the same rules as `random_free_location_for_sprite`.
+    Returns a new grid of `bool` where True at (x, y) means the top-left corner of the sprite can go at (x, y).
+
+    Example usage:
+    # place several copies of a sprite without recomputing the free locations from scratch
+    free = free_locations_for_sprite(grid, sprite, padding=1, background=Color.BLACK)
+    for _ in range(n_copies):
+        x, y = random_location(free)
+        blit_sprite(grid, sprite, x, y)
+        mark_sprite_placed(free, sprite, x, y, padding=1, background=Color.BLACK)
+    """
     n, m = grid.shape
+    grid_mask = _occupancy_mask(grid != background, padding, padding_connectivity)
 
-    sprite_mask = 1 * (sprite != background)
+    free = np.zeros((n, m), dtype=bool)
+    overlaps = _placement_overlaps(grid_mask, sprite != background)
+    if overlaps is None:
+        return free
+
+    # top-left corners from border_size up to the last position that keeps border_size on the far side
+    x_end = n + 1 - border_size - sprite.shape[0]
+    y_end = m + 1 - border_size - sprite.shape[1]
+    if x_end <= border_size or y_end <= border_size:
+        return free
+    free[border_size:x_end, border_size:y_end] = overlaps[border_size:x_end, border_size:y_end] == 0
+    return free
+
+def mark_sprite_placed(free_locations, sprite, x, y, placed_sprite=None, background=Color.BLACK, padding=0, padding_connectivity=8):
+    """
+    Updates (in place) the result of `free_locations_for_sprite` after a sprite was drawn at (x, y).
+    Use the same background/padding/padding_connectivity as when computing `free_locations`.
 
-    # if padding is non-zero, we emulate padding by dilating everything within the grid
+    placed_sprite: the sprite that was drawn, if it is different from the sprite the free locations are for
+    """
+    if placed_sprite is None:
+        placed_sprite = sprite
+
+    placed_mask = np.zeros(free_locations.shape, dtype=bool)
+    blit(placed_mask, placed_sprite != background, x, y, background=False)
+    overlaps = _placement_overlaps(_occupancy_mask(placed_mask, padding, padding_connectivity), sprite != background)
+    if overlaps is not None:
+        free_locations[: overlaps.shape[0], : overlaps.shape[1]] &= overlaps == 0
+
+def random_location(locations, rng=None):
+    """
+    Pick a random (x, y) where the `bool` grid `locations` is True, e.g. from `free_locations_for_sprite`.
+
+    If there is no such location, raises a ValueError.
+    """
+    xs, ys = np.nonzero(locations)
+    if len(xs) == 0:
+        raise ValueError("No free location for sprite found.")
+    i = int(get_rng(rng).integers(len(xs)))
+    return int(xs[i]), int(ys[i])
+
+def _occupancy_mask(mask, padding, padding_connectivity):
+    """
+    internal function not used by LLM
+
+    The occupied pixels as 0/1 ints, dilated by `padding` pixels.
+    """
     if padding > 0:
         from scipy import ndimage
 
@@ -588,39 +793,24 @@ def random_free_location_for_sprite(
             raise ValueError("padding_connectivity must be 4 or 8.")
 
         # use binary dilation to pad the sprite with a non-background color
-        grid_mask = ndimage.binary_dilation(
-            grid != background, iterations=padding, structure=structuring_element
-        ).astype(int)
-    else:
-        grid_mask = 1 * (grid != background)
+        mask = ndimage.binary_dilation(mask, iterations=padding, structure=structuring_element)
 
-    possible_locations = [
-        (x, y)
-        for x in range(border_size, n + 1 - border_size - sprite.shape[0])
-        for y in range(border_size, m + 1 - border_size - sprite.shape[1])
-    ]
-
-    non_background_grid = np.sum(grid_mask)
-    non_background_sprite = np.sum(sprite_mask)
-    target_non_background = non_background_grid + non_background_sprite
+    return mask.astype(int)
 
-    # Scale background pixels to 0 so np.maximum can be used later
-    scaled_grid = grid.copy()
-    scaled_grid[scaled_grid == background] = Color.BLACK
-
-    # prune possible locations by making sure there is no overlap with non-background pixels if we were to put the sprite there
-    pruned_locations = []
-    for x, y in possible_locations:
-        # try blitting the sprite and see if the resulting non-background pixels is the expected value
-        new_grid_mask = grid_mask.copy()
-        blit(new_grid_mask, sprite_mask, x, y, background=0)
-        if np.sum(new_grid_mask) == target_non_background:
-            pruned_locations.append((x, y))
+def _placement_overlaps(grid_mask, sprite_mask):
+    """
+    internal function not used by LLM
 
-    if len(pruned_locations) == 0:
-        raise ValueError("No free location for sprite found.")
+    overlaps[x, y] is the number of occupied pixels of `grid_mask` covered by the sprite with its top-left corner at (x, y),
+    for every position that keeps the sprite inside the grid. Returns None if the sprite does not fit.
+    """
+    if sprite_mask.shape[0] > grid_mask.shape[0] or sprite_mask.shape[1] > grid_mask.shape[1]:
+        return None
+    if sprite_mask.size == 0:
+        return np.zeros((grid_mask.shape[0] + 1 - sprite_mask.shape[0], grid_mask.shape[1] + 1 - sprite_mask.shape[1]), dtype=int)
 
-    return random.choice(pruned_locations)
+    from scipy.signal import correlate2d
+    return correlate2d(grid_mask, sprite_mask.astype(int), mode="valid")
 
 def random_free_location_for_object(*args, **kwargs):
     """
@@ -644,15 +834,11 @@ def object_interior(grid, background=Color.BLACK):
 
     mask = 1*(grid != background)
 
-    # March around the border and flood fill (with 42) wherever we find zeros
-    n, m = grid.shape
-    for i in range(n):
-        if grid[i, 0] == background:
-            flood_fill(mask, i, 0, 42)
-        if grid[i, m-1] == background: flood_fill(mask, i, m-1, 42)
-    for j in range(m):
-        if grid[0, j] == background: flood_fill(mask, 0, j, 42)
-        if grid[n-1, j] == background: flood_fill(mask, n-1, j, 42)
+    # Flood fill (with 42) from every background pixel on the border at once
+    border = np.zeros(grid.shape, dtype=bool)
+    border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+    xs, ys = np.nonzero(border & (grid == background))
+    flood_fill(mask, xs, ys, 42)
 
     return mask != 42
 
@@ -756,6 +942,41 @@ def orbit(grid, x, y, symmetries):
 
     return list(set(all_possible))
 
+def orbit_labels(grid, symmetries):
+    """
+    Partition the whole grid into orbits under the symmetry transformations `symmetries`, in one call.
+    Two pixels are in the same orbit if one can be mapped onto the other by applying the symmetries (staying on the canvas).
+    Returns an integer array with the shape of `grid`, where pixels in the same orbit share a label.
+
+    Example usage:
+    symmetries = detect_translational_symmetry(input_grid, ignore_colors=[Color.BLACK])
+    labels = orbit_labels(input_grid, symmetries)
+    for label in np.unique(labels):
+        # All the pixels in one orbit, e.g. to fill occluded pixels with the color of the rest of the orbit
+        orbit_mask = labels == label
+        orbit_colors = set(input_grid[orbit_mask]) - {Color.BLACK}
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n, m = grid.shape
+    x, y = np.indices((n, m)).reshape(2, -1)
+    pixels = np.arange(n * m)
+    sources, targets = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+    for sym in symmetries:
+        # Like `orbit`, link every pixel to each of its iterates that lands on the canvas; the orbits are the
+        # connected components. `apply` maps all the pixels at once, rounding like it does for a single point
+        for i in range(*sym._iter_range(grid.shape)):
+            new_x, new_y = (np.broadcast_to(np.rint(v).astype(int), x.shape) for v in sym.apply(x, y, i))
+            inside = (0 <= new_x) & (new_x < n) & (0 <= new_y) & (new_y < m)
+            sources.append(pixels[inside])
+            targets.append(new_x[inside] * m + new_y[inside])
+
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    graph = coo_matrix((np.ones(len(sources), dtype=bool), (sources, targets)), shape=(n * m, n * m))
+    _, labels = connected_components(graph, directed=True, connection="weak")
+    return labels.reshape(n, m)
+
 class TranslationalSymmetry(Symmetry):
     """
     Translation symmetry transformation, which repeatedly translates by a fixed vector
@@ -777,9 +998,9 @@ class TranslationalSymmetry(Symmetry):
         x = x + iters * self.translate_x
         y = y + iters * self.translate_y
         if isinstance(x, np.ndarray):
-            x = x.astype(int)
+            x = np.rint(x).astype(int)
         if isinstance(y, np.ndarray):
-            y = y.astype(int)
+            y = np.rint(y).astype(int)
         if isinstance(x, float):
             x = int(round(x))
         if isinstance(y, float):
@@ -820,36 +1041,40 @@ def detect_translational_symmetry(grid, ignore_colors=[Color.BLACK], background=
     """
 
     n, m = grid.shape
-    x_possibilities = [ TranslationalSymmetry(translate_x, 0) for translate_x in range(1, n) ]
-    x_possibilities.extend([ TranslationalSymmetry(-translate_x, 0) for translate_x in range(1, n) ])
-    y_possibilities = [ TranslationalSymmetry(0, translate_y) for translate_y in range(1, m) ]
-    y_possibilities.extend([ TranslationalSymmetry(0, -translate_y) for translate_y in range(1, m) ])
-    xy_possibilities = [ TranslationalSymmetry(translate_x, translate_y) for translate_x in range(1,n) for translate_y in range(1,m) ]
-
-    def score(sym):
-        perfectly_preserved, outside_canvas, conflict = _score_symmetry(grid, sym, ignore_colors, background=background)
-        return perfectly_preserved - 0.01 * outside_canvas - 100000 * conflict
-    x_scores = [score(sym) for sym in x_possibilities]
-    y_scores = [score(sym) for sym in y_possibilities]
-    xy_scores = [score(sym) for sym in xy_possibilities]
-    # Anything with a negative score gets killed. Then, we take the best of x/y. If we can't find anything, we take the best of xy.
-    x_possibilities = [(x_possibilities[i], x_scores[i]) for i in range(len(x_possibilities)) if x_scores[i] > 0]
-    y_possibilities = [(y_possibilities[i], y_scores[i]) for i in range(len(y_possibilities)) if y_scores[i] > 0]
-    xy_possibilities = [(xy_possibilities[i], xy_scores[i]) for i in range(len(xy_possibilities)) if xy_scores[i] > 0]
+    # Candidate translations: +x then -x, +y then -y, then the diagonals
+    x_translations = np.concatenate([np.arange(1, n), -np.arange(1, n)])
+    y_translations = np.concatenate([np.arange(1, m), -np.arange(1, m)])
+    diagonal_x, diagonal_y = np.meshgrid(np.arange(1, n), np.arange(1, m), indexing="ij")
+    translate_x = np.concatenate([x_translations, np.zeros_like(y_translations), diagonal_x.ravel()])
+    translate_y = np.concatenate([np.zeros_like(x_translations), y_translations, diagonal_y.ravel()])
+
+    def transform(x, y, candidates):
+        return x + translate_x[candidates, None], y + translate_y[candidates, None]
 
+    perfectly_preserved, outside_canvas, conflict = _score_symmetries(grid, transform, len(translate_x), ignore_colors, background=background)
+    scores = perfectly_preserved - 0.01 * outside_canvas - 100000 * conflict
+
+    # Anything with a negative score gets killed. Then, we take the best of x/y. If we can't find anything, we take the best of xy.
+    # Ties are broken by preferring smaller translations
+    def best(candidates, tie_break):
+        candidates = [i for i in candidates if scores[i] > 0]
+        if len(candidates) == 0:
+            return None
+        i = max(candidates, key=lambda i: (scores[i], tie_break(i)))
+        return TranslationalSymmetry(int(translate_x[i]), int(translate_y[i]))
+
+    num_x, num_y = len(x_translations), len(y_translations)
     detections = []
-    if len(x_possibilities) > 0:
-        # Take the best x, breaking ties by preferring smaller translations
-        best_x = max(x_possibilities, key=lambda x: (x[1], -x[0].translate_x))[0]
+    best_x = best(range(num_x), lambda i: -translate_x[i])
+    if best_x is not None:
         detections.append(best_x)
-    if len(y_possibilities) > 0:
-        # Take the best y, breaking ties by preferring smaller translations
-        best_y = max(y_possibilities, key=lambda y: (y[1], -y[0].translate_y))[0]
+    best_y = best(range(num_x, num_x + num_y), lambda i: -translate_y[i])
+    if best_y is not None:
         detections.append(best_y)
-    if len(detections) == 0 and len(xy_possibilities) > 0:
-        # Take the best xy, breaking ties by preferring smaller translations
-        best_xy = max(xy_possibilities, key=lambda xy: (xy[1], -xy[0].translate_x - xy[0].translate_y))[0]
-        detections.append(best_xy)
+    if len(detections) == 0:
+        best_xy = best(range(num_x + num_y, len(translate_x)), lambda i: -translate_x[i] - translate_y[i])
+        if best_xy is not None:
+            detections.append(best_xy)
 
     return detections
 
@@ -877,9 +1102,9 @@ class MirrorSymmetry():
         if self.mirror_y is not None:
             y = 2*self.mirror_y - y
         if isinstance(x, np.ndarray):
-            x = x.astype(int)
+            x = np.rint(x).astype(int)
         if isinstance(y, np.ndarray):
-            y = y.astype(int)
+            y = np.rint(y).astype(int)
         if isinstance(x, float):
             x = int(round(x))
         if isinstance(y, float):
@@ -911,37 +1136,48 @@ def detect_mirror_symmetry(grid, ignore_colors=[Color.BLACK], background=None):
     """
 
     n, m = grid.shape
-    xy_possibilities = [
-        MirrorSymmetry(x_center + z, y_center + z)
-        for x_center in range(n)
-        for y_center in range(m)
-        for z in [0, 0.5]
-    ]
-    x_possibilities = [
-        MirrorSymmetry(x_center + z, None)
-        for x_center in range(n)
-        for z in [0, 0.5]
-    ]
-    y_possibilities = [
-        MirrorSymmetry(None, y_center + z)
-        for y_center in range(m)
-        for z in [0, 0.5]
-    ]
+    # Candidate mirrors in the order x, y, xy; NaN marks an axis that is not mirrored
+    x_centers = (np.arange(n)[:, None] + np.array([0, 0.5])).ravel()
+    y_centers = (np.arange(m)[:, None] + np.array([0, 0.5])).ravel()
+    xy_x, xy_y = _candidate_centers(n, m)
+    mirror_x = np.concatenate([x_centers, np.full(len(y_centers), np.nan), xy_x])
+    mirror_y = np.concatenate([np.full(len(x_centers), np.nan), y_centers, xy_y])
+
+    def transform(x, y, candidates):
+        cx, cy = mirror_x[candidates, None], mirror_y[candidates, None]
+        x = np.where(np.isnan(cx), x, 2 * cx - x).astype(int)
+        y = np.where(np.isnan(cy), y, 2 * cy - y).astype(int)
+        return x, y
 
-    best_symmetries, best_score = [], 0
-    for sym in x_possibilities + y_possibilities + xy_possibilities:
-        perfectly_preserved, outside_canvas, conflict = _score_symmetry(grid, sym, ignore_colors, background=background)
-        score = perfectly_preserved - 0.01 * outside_canvas - 10000 * conflict
-        if conflict > 0 or perfectly_preserved == 0:
-            continue
+    perfectly_preserved, outside_canvas, conflict = _score_symmetries(grid, transform, len(mirror_x), ignore_colors, background=background)
+    scores = perfectly_preserved - 0.01 * outside_canvas - 10000 * conflict
 
-        if score > best_score:
-            best_symmetries = [sym]
-            best_score = score
-        elif score == best_score:
-            best_symmetries.append(sym)
+    valid = (conflict == 0) & (perfectly_preserved > 0)
+    if not valid.any() or scores[valid].max() < 0:
+        return []
+    best = np.flatnonzero(valid & (scores == scores[valid].max()))
+    return [MirrorSymmetry(_center(mirror_x[i]), _center(mirror_y[i])) for i in best]
+
+
+def _candidate_centers(n, m):
+    """
+    internal function not used by LLM
+
+    Candidate symmetry centers (x_center + z, y_center + z) for z in [0, 0.5], in row-major order.
+    """
+    x_center, y_center, z = np.meshgrid(np.arange(n), np.arange(m), [0, 0.5], indexing="ij")
+    return (x_center + z).ravel(), (y_center + z).ravel()
+
+
+def _center(value):
+    """
+    internal function not used by LLM
 
-    return best_symmetries
+    Converts a candidate center back to the int/float/None it is reported as.
+    """
+    if np.isnan(value):
+        return None
+    return int(value) if float(value).is_integer() else float(value)
 
 
 def detect_rotational_symmetry(grid, ignore_colors=[Color.BLACK], background=None):
@@ -976,9 +1212,9 @@ def detect_rotational_symmetry(grid, ignore_colors=[Color.BLACK], background=Non
             x, y = x + self.center_x, y + self.center_y
 
             if isinstance(x, np.ndarray):
-                x = x.astype(int)
+                x = np.rint(x).astype(int)
             if isinstance(y, np.ndarray):
-                y = y.astype(int)
+                y = np.rint(y).astype(int)
             if isinstance(x, float):
                 x = int(round(x))
             if isinstance(y, float):
@@ -992,22 +1228,59 @@ def detect_rotational_symmetry(grid, ignore_colors=[Color.BLACK], background=Non
     # Find the center of the grid
     # This is the first x,y which could serve as the center
     n, m = grid.shape
-    possibilities = [
-        RotationalSymmetry(x_center + z, y_center + z)
-        for x_center in range(n)
-        for y_center in range(m)
-        for z in [0, 0.5]
-    ]
+    center_x, center_y = _candidate_centers(n, m)
+
+    def transform(x, y, candidates):
+        cx, cy = center_x[candidates, None], center_y[candidates, None]
+        return ((y - cy) + cx).astype(int), (-(x - cx) + cy).astype(int)
 
-    best_rotation, best_score = None, 0
-    for sym in possibilities:
-        perfectly_preserved, outside_canvas, conflict = _score_symmetry(grid, sym, ignore_colors, background=background)
-        score = perfectly_preserved - 5 * outside_canvas - 1000 * conflict
-        if score > best_score:
-            best_rotation = sym
-            best_score = score
+    perfectly_preserved, outside_canvas, conflict = _score_symmetries(grid, transform, len(center_x), ignore_colors, background=background)
+    scores = perfectly_preserved - 5 * outside_canvas - 1000 * conflict
+
+    best = int(np.argmax(scores))
+    if scores[best] <= 0:
+        return None
+    return RotationalSymmetry(_center(center_x[best]), _center(center_y[best]))
+
+def _score_symmetries(grid, transform, n_candidates, ignore_colors, background=None):
+    """
+    internal function not used by LLM
+
+    Batched version of `_score_symmetry` over a family of candidate symmetries.
+    `transform(x, y, candidates)` maps the occupied pixels, given as arrays of shape (N,), under the candidates
+    in the slice `candidates` and returns integer arrays of shape (K, N).
+
+    Returns three arrays with one entry per candidate: perfectly preserved, outside canvas and conflicting pixels.
+    """
+
+    n, m = grid.shape
+    ignored = np.isin(grid, ignore_colors)
+    occupied = ~ignored
+    if background is not None:
+        occupied &= grid != background
+    x, y = np.nonzero(occupied)
+    colors = grid[x, y]
+
+    perfect_mapping = np.zeros(n_candidates, dtype=int)
+    off_canvas = np.zeros(n_candidates, dtype=int)
+    bad_mapping = np.zeros(n_candidates, dtype=int)
+
+    # Bound the size of the (K, N) arrays
+    chunk_size = max(1, (1 << 20) // max(1, len(x)))
+    for start in range(0, n_candidates, chunk_size):
+        candidates = slice(start, min(start + chunk_size, n_candidates))
+        transformed_x, transformed_y = transform(x, y, candidates)
+        in_canvas = (transformed_x >= 0) & (transformed_x < n) & (transformed_y >= 0) & (transformed_y < m)
+        transformed_x = np.where(in_canvas, transformed_x, 0)
+        transformed_y = np.where(in_canvas, transformed_y, 0)
+
+        preserved = in_canvas & (grid[transformed_x, transformed_y] == colors)
+        conflicting = in_canvas & ~preserved & ~ignored[transformed_x, transformed_y]
+        perfect_mapping[candidates] = preserved.sum(axis=1)
+        off_canvas[candidates] = (~in_canvas).sum(axis=1)
+        bad_mapping[candidates] = conflicting.sum(axis=1)
 
-    return best_rotation
+    return perfect_mapping, off_canvas, bad_mapping
 
 def _score_symmetry(grid, symmetry, ignore_colors, background=None):
     """
@@ -1181,17 +1454,15 @@ def apply_symmetry(sprite, symmetry_type, background=Color.BLACK):
     """
     n, m = sprite.shape
     if symmetry_type == "horizontal":
-        for y in range(m):
-            for x in range(n // 2):
-                sprite[x, y] = sprite[n - 1 - x, y] = (
-                    sprite[x, y] if sprite[x, y] != background else sprite[n - 1 - x, y]
-                )
+        half = np.arange(n // 2)
+        mirrored = sprite[half, :], sprite[n - 1 - half, :]
+        merged = np.where(mirrored[0] != background, mirrored[0], mirrored[1])
+        sprite[half, :] = sprite[n - 1 - half, :] = merged
     elif symmetry_type == "vertical":
-        for x in range(n):
-            for y in range(m // 2):
-                sprite[x, y] = sprite[x, m - 1 - y] = (
-                    sprite[x, y] if sprite[x, y] != background else sprite[x, m - 1 - y]
-                )
+        half = np.arange(m // 2)
+        mirrored = sprite[:, half], sprite[:, m - 1 - half]
+        merged = np.where(mirrored[0] != background, mirrored[0], mirrored[1])
+        sprite[:, half] = sprite[:, m - 1 - half] = merged
     else:
         raise ValueError(f"Invalid symmetry type {symmetry_type}.")
     return sprite
@@ -1205,12 +1476,11 @@ def apply_diagonal_symmetry(sprite, background=Color.BLACK):
     n, m = sprite.shape
     if n != m:
         raise ValueError("Diagonal symmetry requires a square sprite.")
-    for x in range(n):
-        for y in range(x + 1, m):
-            c=background
-            if sprite[y, x]!=background: c=sprite[y, x]
-            if sprite[x, y]!=background: c=sprite[x, y]
-            sprite[x, y] = sprite[y, x] = c
+    # each pair of mirrored pixels takes the upper pixel's color, or else the lower one's
+    merged = np.where(sprite != background, sprite, sprite.T)
+    upper = np.triu_indices(n, k=1)
+    sprite[upper] = merged[upper]
+    sprite.T[upper] = merged[upper]
     return sprite
 
 
@@ -1236,6 +1506,38 @@ def is_contiguous(bitmask, background=Color.BLACK, connectivity=4):
     return n_objects == 1
 
 
+# Borders of the drawn area that the random walk has to reach, for each symmetry type, so that the finished sprite
+# touches all four of its borders (and, for "mirror", its four quadrants connect). Each requirement is a tuple of
+# borders of which at least one must be reached.
+_SPRITE_BORDER_REQUIREMENTS = {
+    "not_symmetric": [("top",), ("bottom",), ("left",), ("right",)],
+    "horizontal": [("top", "bottom"), ("left",), ("right",)],
+    "vertical": [("left", "right"), ("top",), ("bottom",)],
+    "diagonal": [("top", "left"), ("bottom", "right")],
+    "anti_diagonal": [("top", "right"), ("bottom", "left")],
+    "mirror": [("top",), ("bottom",), ("left",), ("right",)],
+    "radial": [("top", "left")],
+}
+
+# Number of sprites made by `random_sprite`, and of generated sprites it had to throw away
+_sprite_stats = {"sprites": 0, "rejected": 0}
+
+# Attempts of `random_sprite` before giving up on parameters that cannot produce an acceptable sprite
+_MAX_SPRITE_ATTEMPTS = 1000
+
+
+def sprite_stats(reset=False):
+    """
+    internal function not used by LLM
+
+    Counts of sprites returned by `random_sprite` and of attempts it rejected since the last reset.
+    """
+    stats = dict(_sprite_stats)
+    if reset:
+        _sprite_stats.update(sprites=0, rejected=0)
+    return stats
+
+
 def generate_sprite(
     n,
     m,
@@ -1244,38 +1546,54 @@ def generate_sprite(
     max_colors=9,
     color_palate=None,
     connectivity=4,
-    background=Color.BLACK
+    background=Color.BLACK,
+    rng=None,
 ):
     """
     internal function not used by LLM
     """
+    rng = get_rng(rng)
+    uniforms = _uniforms(rng)
+
     # pick random colors, number of colors follows a geometric distribution truncated at 9
     if color_palate is None:
         n_colors = 1
-        while n_colors < max_colors and random.random() < 0.3:
+        while n_colors < max_colors and next(uniforms) < 0.3:
             n_colors += 1
-        color_palate = random.sample([c for c in Color.ALL_COLORS if c!=background ], n_colors)
+        candidate_colors = [c for c in Color.ALL_COLORS if c!=background ]
+        color_palate = [candidate_colors[i] for i in rng.choice(len(candidate_colors), n_colors, replace=False)]
     else:
         n_colors = len(color_palate)
+    # The walk below only stops once it has drawn enough pixels that are not background
+    if all(color == background for color in color_palate):
+        raise ValueError(f"color palette {list(color_palate)} has no color other than the background {background}")
 
     grid = np.full((n, m), background)
+    requirements = _SPRITE_BORDER_REQUIREMENTS[symmetry_type] if symmetry_type in _SPRITE_BORDER_REQUIREMENTS else None
+    def randint(low, high):
+        return low + int(next(uniforms) * (high - low + 1))
+
     if symmetry_type == "not_symmetric":
-        x, y = random.randint(0, n - 1), random.randint(0, m - 1)
+        x, y = randint(0, n - 1), randint(0, m - 1)
+    # symmetric sprites start on the mirror axis, so that the two halves are connected
     elif symmetry_type == "horizontal":
-        x, y = random.randint(0, n - 1), m // 2
+        x, y = n // 2, randint(0, m - 1)
     elif symmetry_type == "vertical":
-        x, y = n // 2, random.randint(0, m - 1)
+        x, y = randint(0, n - 1), m // 2
     elif symmetry_type == "diagonal":
         # coin flip for which diagonal orientation
-        diagonal_orientation = random.choice([True, False])
-        x = random.randint(0, n - 1)
-        y = x if diagonal_orientation else n - 1 - x
+        diagonal_orientation = next(uniforms) < 0.5
+        # start on the axis of the symmetry applied below: the anti-diagonal if flipped, else the diagonal
+        x = randint(0, n - 1)
+        y = n - 1 - x if diagonal_orientation else x
+        if diagonal_orientation:
+            requirements = _SPRITE_BORDER_REQUIREMENTS["anti_diagonal"]
     elif symmetry_type == "mirror":
         # shrink to a quarter size, we are just making a single quadrant
         original_n = n
         original_m = m
         n, m = int(n / 2 + 0.5), int(m / 2 + 0.5)
-        x, y = random.randint(0, n - 1), random.randint(0, m - 1)
+        x, y = randint(0, n - 1), randint(0, m - 1)
         grid = np.full((n, m), background)
     elif symmetry_type == "radial":
         # we are just going to make a single quadrant and then apply symmetry
@@ -1296,13 +1614,28 @@ def generate_sprite(
         moves = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
     else:
         raise ValueError("Connectivity must be 4 or 8.")
+    toward = {"top": (-1, 0), "bottom": (1, 0), "left": (0, -1), "right": (0, 1)}
 
+    # Random walk until the sprite is filled enough and touches the borders it needs.
+    # Once it is filled enough, every other step heads for the closest border that is still missing.
     color_index = 0
-    while np.sum(grid != background) < fill_percentage * n * m:
+    n_filled, target = 0, fill_percentage * n * m
+    touched = set()
+    missing = list(requirements)
+    while n_filled < target or missing:
+        n_filled += int(grid[x, y] == background) - int(color_palate[color_index] == background)
         grid[x, y] = color_palate[color_index]
-        if random.random() < 0.33:
-            color_index = random.choice(range(n_colors))
-        dx, dy = random.choice(moves)
+        if color_palate[color_index] != background:
+            touched.update(border for border, reached in
+                           [("top", x == 0), ("bottom", x == n - 1), ("left", y == 0), ("right", y == m - 1)] if reached)
+            missing = [borders for borders in missing if not touched.intersection(borders)]
+        if next(uniforms) < 0.33:
+            color_index = randint(0, n_colors - 1)
+        if n_filled >= target and missing and next(uniforms) < 0.5:
+            distance = {"top": x, "bottom": n - 1 - x, "left": y, "right": m - 1 - y}
+            dx, dy = toward[min((border for borders in missing for border in borders), key=distance.get)]
+        else:
+            dx, dy = moves[randint(0, len(moves) - 1)]
         new_x, new_y = x + dx, y + dy
         if 0 <= new_x < n and 0 <= new_y < m:
             x, y = new_x, new_y
@@ -1327,19 +1660,9 @@ def generate_sprite(
         output[n+dx:, :m] = np.flipud(grid)
         output[:n, m+dy:] = np.fliplr(grid)
         output[n+dx:, m+dy:] = np.flipud(np.fliplr(grid))
-        
-        grid = output
 
-        if not is_contiguous(grid, background=background, connectivity=connectivity):
-            return generate_sprite(
-                n=original_n,
-                m=original_m,
-                symmetry_type=symmetry_type,
-                fill_percentage=fill_percentage,
-                color_palate=color_palate,
-                connectivity=connectivity,
-                background=background,
-            )
+        # The quadrant reaches its inner borders, so the four copies are connected
+        grid = output
 
     elif symmetry_type == "diagonal":
         # diagonal symmetry goes both ways, flip a coin to decide which way
@@ -1353,7 +1676,7 @@ def generate_sprite(
     return grid
 
 
-def random_sprite(n, m, density=0.5, symmetry=None, color_palette=None, connectivity=4, background=Color.BLACK):
+def random_sprite(n, m, density=0.5, symmetry=None, color_palette=None, connectivity=4, background=Color.BLACK, rng=None):
     """
     Generate a sprite (an object), represented as a numpy array.
 
@@ -1362,6 +1685,7 @@ def random_sprite(n, m, density=0.5, symmetry=None, color_palette=None, connecti
     color_palette: optional list of colors to use in the sprite. If None, a random color palette will be chosen.
 
     Returns an (n,m) NumPy array representing the sprite.
+    Raises ValueError if no contiguous sprite touching every border is found.
     """
 
     # canonical form: force dimensions to be lists
@@ -1374,27 +1698,54 @@ def random_sprite(n, m, density=0.5, symmetry=None, color_palette=None, connecti
     if not isinstance(m, list):
         m = [m]
 
-    # save the original inputs
-    n_original, m_original, density_original, symmetry_original, color_palette_original, connectivity_original, background_original = \
-        n, m, density, symmetry, color_palette, connectivity, background
-
     # radial and diagonal require target shape to be square
     can_be_square = any(n_ == m_ for n_ in n for m_ in m)
+    rng = get_rng(rng)
+
+    # The walk in generate_sprite reaches the borders, so the first attempt is normally accepted
+    for _ in range(_MAX_SPRITE_ATTEMPTS):
+        sprite = _random_sprite_attempt(n, m, density, symmetry, color_palette, connectivity, background, can_be_square, rng)
+        # check that the sprite is contiguous and has pixels that are flushed with the border
+        if (
+            is_contiguous(sprite, connectivity=connectivity, background=background)
+            and np.any(sprite[0, :] != background)
+            and np.any(sprite[-1, :] != background)
+            and np.any(sprite[:, 0] != background)
+            and np.any(sprite[:, -1] != background)
+        ):
+            _sprite_stats["sprites"] += 1
+            return sprite
+        # otherwise we need to regenerate it
+        _sprite_stats["rejected"] += 1
+    raise ValueError(
+        f"random_sprite found no contiguous sprite touching every border in {_MAX_SPRITE_ATTEMPTS} attempts with "
+        f"n={n}, m={m}, density={density}, symmetry={symmetry}, connectivity={connectivity}, background={background}"
+    )
 
+
+def _random_sprite_attempt(n, m, density, symmetry, color_palette, connectivity, background, can_be_square, rng):
+    """
+    internal function not used by LLM
+
+    One attempt of `random_sprite`, with n and m given as lists.
+    """
     # Decide on symmetry type before generating the sprites
     symmetry_types = ["horizontal", "vertical", "not_symmetric", "mirror"]
     if can_be_square:
         symmetry_types = symmetry_types + ["diagonal", "radial"]
 
-    symmetry = symmetry or random.choice(symmetry_types)
+    def choice(options):
+        return options[int(rng.integers(len(options)))]
+
+    symmetry = symmetry or choice(symmetry_types)
 
     # Decide on dimensions
     has_to_be_square = symmetry in ["diagonal", "radial"]
     if has_to_be_square:
-        n, m = random.choice([(n_, m_) for n_ in n for m_ in m if n_ == m_])
+        n, m = choice([(n_, m_) for n_ in n for m_ in m if n_ == m_])
     else:
-        n = random.choice(n)
-        m = random.choice(m)
+        n = choice(n)
+        m = choice(m)
 
     # if one of the dimensions is 1, then we need to make sure the density is high enough to fill the entire sprite
     if n == 1 or m == 1:
@@ -1408,9 +1759,9 @@ def random_sprite(n, m, density=0.5, symmetry=None, color_palette=None, connecti
         pass
     # randomly perturb the density so that we get a wider variety of densities
     else:
-        density = max(0.4, min(0.95, random.gauss(density, 0.1)))
+        density = max(0.4, min(0.95, rng.normal(density, 0.1)))
 
-    sprite = generate_sprite(
+    return generate_sprite(
         n,
         m,
         symmetry_type=symmetry,
@@ -1418,21 +1769,21 @@ def random_sprite(n, m, density=0.5, symmetry=None, color_palette=None, connecti
         fill_percentage=density,
         connectivity=connectivity,
         background=background,
+        rng=rng,
     )
-    assert is_contiguous(
-        sprite, connectivity=connectivity, background=background
-    ), "Generated sprite is not contiguous."
-    # check that the sprite has pixels that are flushed with the border
-    if (
-        np.sum(sprite[0, :]!=background) > 0
-        and np.sum(sprite[-1, :]!=background) > 0
-        and np.sum(sprite[:, 0]!=background) > 0
-        and np.sum(sprite[:, -1]!=background) > 0
-    ):
-        return sprite
-    
-    # if the sprite is not flushed with the border, then we need to regenerate it
-    return random_sprite(n_original, m_original, density_original, symmetry_original, color_palette_original, connectivity_original, background_original)
+
+
+def random_sprites(k, n, m, density=0.5, symmetry=None, color_palette=None, connectivity=4, background=Color.BLACK, rng=None):
+    """
+    Generate `k` sprites at once, each drawn like `random_sprite` with the same arguments.
+
+    Returns a list of k NumPy arrays.
+
+    Example usage:
+    sprites = random_sprites(3, n=[3, 4, 5], m=[3, 4, 5], color_palette=[Color.RED])
+    """
+    rng = get_rng(rng)
+    return [random_sprite(n, m, density, symmetry, color_palette, connectivity, background, rng=rng) for _ in range(k)]
 
 
 
@@ -1453,17 +1804,21 @@ def detect_objects(grid, _=None, predicate=None, background=Color.BLACK, monochr
 
     objects = []
 
+    def allowed_colors(obj):
+        return colors is None or bool(np.all(np.isin(obj, colors) | (obj == background)))
+
     if connectivity:
         objects.extend(find_connected_components(grid, background=background, connectivity=connectivity, monochromatic=monochromatic))
         if colors:
-            objects = [obj for obj in objects if all((color in colors) or color == background for color in obj.flatten())]
+            objects = [obj for obj in objects if allowed_colors(obj)]
         if predicate:
             objects = [obj for obj in objects if predicate(crop(obj, background=background))]
 
     if allowed_dimensions:
         objects = [obj for obj in objects if obj.shape in allowed_dimensions]
 
-        # Also scan through the grid
+        # Also scan through the grid, skipping candidates equal to an object we already have
+        seen = {_object_key(obj, 0, 0, background) for obj in objects}
         scan_objects = []
         for n, m in allowed_dimensions:
             for i in range(grid.shape[0] - n + 1):
@@ -1471,81 +1826,186 @@ def detect_objects(grid, _=None, predicate=None, background=Color.BLACK, monochr
                     candidate_sprite = grid[i:i+n, j:j+m]
 
                     if np.any(candidate_sprite != background) and \
-                        (colors is None or all((color in colors) or color == background for color in candidate_sprite.flatten())) and \
+                        allowed_colors(candidate_sprite) and \
                         (predicate is None or predicate(candidate_sprite)):
-                        candidate_object = np.full(grid.shape, background)
-                        candidate_object[i:i+n, j:j+m] = candidate_sprite
-                        if not any( np.all(candidate_object == obj) for obj in objects):
+                        key = _object_key(candidate_sprite, i, j, background)
+                        if key not in seen:
+                            seen.add(key)
+                            candidate_object = np.full(grid.shape, background)
+                            candidate_object[i:i+n, j:j+m] = candidate_sprite
                             scan_objects.append(candidate_object)
-        #print("scanning produced", len(scan_objects), "objects")
         objects.extend(scan_objects)
 
     if not can_overlap:
-        import time
-        start = time.time()
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        # Objects are represented sparsely by the flat indices of their pixels
+        object_pixels = [np.flatnonzero(obj != background) for obj in objects]
+        object_shapes = []
+        for pixels in object_pixels:
+            xs, ys = np.unravel_index(pixels, grid.shape)
+            object_shapes.append(((xs.max() - xs.min() + 1) * (ys.max() - ys.min() + 1), len(pixels)) if len(pixels) else (0, 0))
+
         # sort objects by size, breaking ties by mass
-        objects.sort(key=lambda obj: (crop(obj, background).shape[0] * crop(obj, background).shape[1], np.sum(obj!=background)), reverse=True)
-        overlap_matrix = np.full((len(objects), len(objects)), False)
-        object_masks = [obj != background for obj in objects]
-        object_bounding_boxes = [bounding_box(obj, background=background) for obj in object_masks]
-        for i, obj1 in enumerate(object_masks):
-            for j, obj2 in enumerate(object_masks):
-                if i < j:
-                    # check if the bounding boxes overlap
-                    # FIXME: this doesn't work
-                    x1, y1, n1, m1 = object_bounding_boxes[i]
-                    x2, y2, n2, m2 = object_bounding_boxes[j]
-                    if True or x1 + n1 <= x2 or x2 + n2 <= x1 or y1 + m1 <= y2 or y2 + m2 <= y1:
-                        overlap_matrix[i, j] = np.any(obj1 & obj2)
-                        overlap_matrix[j, i] = overlap_matrix[i, j]
-        #print("time to compute overlaps", time.time() - start)
-        start= time.time()
+        order = sorted(range(len(objects)), key=lambda i: object_shapes[i], reverse=True)
+        objects = [objects[i] for i in order]
+        object_pixels = [object_pixels[i] for i in order]
+
+        # Two objects overlap if they share a pixel: use the object x pixel incidence matrix
+        incidence = csr_matrix(
+            (np.ones(sum(len(pixels) for pixels in object_pixels), dtype=np.int32),
+             np.concatenate([np.zeros(0, dtype=int)] + object_pixels),
+             np.cumsum([0] + [len(pixels) for pixels in object_pixels])),
+            shape=(len(objects), grid.size),
+        )
+        overlaps = (incidence @ incidence.T).tocoo()
+        overlap_pairs = overlaps.row != overlaps.col
+        neighbors = [[] for _ in objects]
+        for i, j in zip(overlaps.row[overlap_pairs], overlaps.col[overlap_pairs]):
+            neighbors[i].append(j)
 
         # Pick a subset of objects that don't overlap and which cover as many pixels as possible
         # First, we definitely pick everything that doesn't have any overlaps
-        keep_objects = [obj for i, obj in enumerate(objects) if not np.any(overlap_matrix[i])]
+        keep_objects = [obj for i, obj in enumerate(objects) if not neighbors[i]]
 
-        # Second, we might pick the remaining objects
-        remaining_indices = [i for i, obj in enumerate(objects) if np.any(overlap_matrix[i])]
-
-        # Figure out the best possible score we could get if we cover everything
-        best_possible_mask = np.zeros_like(grid, dtype=bool)
+        # Second, we might pick the remaining objects. Objects in different groups of overlapping objects
+        # never interact, so every group is solved on its own.
+        remaining_indices = [i for i in range(len(objects)) if neighbors[i]]
+        _, groups = connected_components(overlaps, directed=False)
+        group_indices = {}
         for i in remaining_indices:
-            best_possible_mask |= objects[i] != background
-        best_possible_score = np.sum(best_possible_mask)
+            group_indices.setdefault(groups[i], []).append(i)
 
-        # Now we just do a brute force search recursively
-        def pick_objects(remaining_indices, current_indices, current_mask):
-            nonlocal overlap_matrix
+        local_index = {i: k for indices in group_indices.values() for k, i in enumerate(indices)}
+        chosen = _select_non_overlapping(
+            [[object_pixels[i] for i in indices] for indices in group_indices.values()],
+            [[[local_index[j] for j in neighbors[i]] for i in indices] for indices in group_indices.values()],
+        )
+        solution = sorted(indices[k] for indices, group_chosen in zip(group_indices.values(), chosen) for k in group_chosen)
 
-            if not remaining_indices:
-                solution = [objects[i] for i in current_indices]
-                solution_goodness = np.sum(current_mask)
-                return solution, solution_goodness
+        objects = keep_objects + [objects[i] for i in solution]
 
-            first_index, *rest = remaining_indices
-            # Does that object have any overlap with the current objects? If so don't pick it
-            if any( overlap_matrix[i, first_index] for i in current_indices):
-                return pick_objects(rest, current_indices, current_mask)
+    return objects
 
-            # Try picking it
-            with_index, with_goodness = pick_objects(rest, current_indices + [first_index], current_mask | (objects[first_index] != background))
 
-            # Did we win?
-            if with_goodness == best_possible_score:
-                return with_index, with_goodness
+def _object_key(sprite, x, y, background):
+    """
+    internal function not used by LLM
 
-            # Try not picking it
-            without_index, without_goodness = pick_objects(rest, current_indices, current_mask)
+    Hashable key of the object drawn by placing `sprite` at (x, y) on an empty canvas: two objects on the same
+    canvas have equal keys exactly when they are equal.
+    """
+    mask = sprite != background
+    if not mask.any():
+        return None
+    xs, ys = np.nonzero(mask)
+    x0, y0 = xs.min(), ys.min()
+    cropped = np.ascontiguousarray(sprite[x0:xs.max() + 1, y0:ys.max() + 1], dtype=np.int64)
+    return (int(x + x0), int(y + y0), cropped.shape, cropped.tobytes())
 
-            if with_goodness > without_goodness:
-                return with_index, with_goodness
-            else:
-                return without_index, without_goodness
 
-        solution, _ = pick_objects(remaining_indices, [], np.zeros_like(grid, dtype=bool))
-        #print("time to pick objects", time.time() - start)
+class _SelectionTimeout(Exception):
+    pass
 
-        objects = keep_objects + solution
 
-    return objects
+def _select_non_overlapping(group_pixels, group_neighbors, time_budget=1.0):
+    """
+    internal function not used by LLM
+
+    Picks objects that don't overlap and which cover as many pixels as possible, for groups of mutually
+    overlapping objects. group_pixels[g][k] are the pixels of object k of group g, group_neighbors[g][k] the
+    objects of the group it overlaps with. Returns the picked objects of every group.
+
+    Each group is solved exactly by a memoized branch-and-bound over (next object, blocked objects) states,
+    taking objects in order and preferring to leave an object out on ties (unless taking it covers every pixel
+    of every group). Groups left when the time budget runs out are solved greedily.
+    """
+    import time
+
+    deadline = time.time() + time_budget
+
+    def popcount(bits):
+        return bin(bits).count("1")
+
+    def pixel_bits(pixels):
+        return sum(1 << int(p) for p in pixels)
+
+    groups = []
+    for pixels, neighbors in zip(group_pixels, group_neighbors):
+        masses = [len(p) for p in pixels]
+        blocks = [sum(1 << j for j in nbrs) for nbrs in neighbors]
+        bits = [pixel_bits(p) for p in pixels]
+        union = 0
+        for b in bits:
+            union |= b
+        groups.append((masses, blocks, bits, popcount(union)))
+
+    def solver(masses, blocks, bits):
+        memo = {}
+
+        def value(k, blocked):
+            # best number of pixels covered by objects k, k+1, ... that are not blocked
+            while k < len(masses) and (blocked >> k) & 1:
+                k += 1
+            if k == len(masses):
+                return 0
+            key = (k, blocked >> k)
+            if key in memo:
+                return memo[key]
+            if time.time() > deadline:
+                raise _SelectionTimeout()
+
+            best = masses[k] + value(k + 1, blocked | blocks[k])
+            # Bound: leaving object k out cannot cover more than all of the other available objects together
+            available = 0
+            for i in range(k + 1, len(masses)):
+                if not (blocked >> i) & 1:
+                    available |= bits[i]
+            if best < popcount(available):
+                best = max(best, value(k + 1, blocked))
+            memo[key] = best
+            return best
+
+        return value
+
+    def greedy(masses, blocks):
+        chosen, blocked = [], 0
+        for k in range(len(masses)):
+            if not (blocked >> k) & 1:
+                chosen.append(k)
+                blocked |= blocks[k]
+        return chosen
+
+    solvers, optimal = [], []
+    for masses, blocks, bits, _ in groups:
+        value = solver(masses, blocks, bits)
+        try:
+            optimal.append(value(0, 0))
+        except (_SelectionTimeout, RecursionError):
+            value = None
+            optimal.append(None)
+        solvers.append(value)
+
+    perfect = [opt is not None and opt == total for opt, (_, _, _, total) in zip(optimal, groups)]
+    results = []
+    for g, ((masses, blocks, _, total), value) in enumerate(zip(groups, solvers)):
+        if value is None:
+            results.append(greedy(masses, blocks))
+            continue
+        # Taking an object wins ties only if it leads to covering every pixel of every group
+        everything_else_perfect = all(perfect[:g] + perfect[g + 1:])
+        chosen, blocked, covered = [], 0, 0
+        try:
+            for k in range(len(masses)):
+                if (blocked >> k) & 1:
+                    continue
+                with_value = masses[k] + value(k + 1, blocked | blocks[k])
+                if (everything_else_perfect and covered + with_value == total) or with_value > value(k + 1, blocked):
+                    chosen.append(k)
+                    blocked |= blocks[k]
+                    covered += masses[k]
+        except (_SelectionTimeout, RecursionError):
+            chosen = greedy(masses, blocks)
+        results.append(chosen)
+    return results
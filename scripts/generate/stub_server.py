@@ -0,0 +1,98 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI chat-completions endpoint for testing `generate_text.py` offline.
+    Answers POST /chat/completions, /v1/chat/completions and the Azure /openai/deployments/<model>/chat/completions
+    after `latency_ms`, and fails with 429 (with Retry-After) or 500 at rate `failure_rate`.
+    `failures` is a list of status codes to answer the next requests with, in order, before any random failure.
+    GET /stats returns the number of requests and failures, and the largest number of requests served at once.
+    """
+    protocol_version = "HTTP/1.1"
+    failure_rate = 0.0
+    latency_ms = 0.0
+    failures = []
+    lock = threading.Lock()
+    counts = {"requests": 0, "failures": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.lock:
+                self.send_json(200, dict(self.counts))
+        else:
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = self.path.split("?")[0]
+        if not path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"unknown path {path}"}})
+            return
+
+        with self.lock:
+            self.counts["in_flight"] += 1
+            self.counts["max_in_flight"] = max(self.counts["max_in_flight"], self.counts["in_flight"])
+        time.sleep(self.latency_ms / 1000)
+        with self.lock:
+            self.counts["in_flight"] -= 1
+            self.counts["requests"] += 1
+            if self.failures:
+                status = self.failures.pop(0)
+            elif random.random() < self.failure_rate:
+                status = random.choice([429, 500])
+            else:
+                status = 200
+            self.counts["failures"] += status != 200
+        if status == 429:
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, {"Retry-After": "0.1"})
+            return
+        if status != 200:
+            self.send_json(status, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+        content = f"# concepts:\n# stub\n\n# description:\n# Stub response {self.counts['requests']}."
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        self.send_json(200, {
+            "id": f"chatcmpl-stub-{self.counts['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--failure_rate", type=float, default=0.0, help="fraction of requests answered with 429 or 500")
+    parser.add_argument("--latency_ms", type=float, default=50)
+    parser.add_argument("--fail_first", type=int, nargs="*", default=[], help="status codes of the first responses, e.g. 429 500")
+    args = parser.parse_args()
+
+    StubHandler.failure_rate = args.failure_rate
+    StubHandler.latency_ms = args.latency_ms
+    StubHandler.failures = list(args.fail_first)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub chat-completions server on http://127.0.0.1:{args.port}/v1 (failure rate {args.failure_rate}, latency {args.latency_ms} ms)")
+    server.serve_forever()
@@ -0,0 +1,190 @@
+import os
+import json
+import struct
+import argparse
+import numpy as np
+from typing import List, Dict
+from tqdm import tqdm
+
+
+base_path = "/home/tangwenhao/Workspace/ARC"
+
+# File layout, all integers little-endian:
+#   prelude   magic (8 bytes), format version (uint32), flags (uint32), footer offset (uint64)
+#   cells     uint8 cell values, or two cells per byte (low nibble first) if packed; every grid starts
+#             on a byte boundary
+#   tables    task table int64 (num_tasks, 3): first grid, number of train pairs, number of test pairs
+#             grid table int64 (num_grids, 3): height, width, cell offset
+#   footer    JSON with the task names and the table offsets
+# Grids of a task are stored as train input, train output, ..., test input, test output.
+# A missing test output is stored as a (0, 0) grid.
+MAGIC = b"ARCGRID\0"
+FORMAT_VERSION = 1
+FLAG_PACKED = 1
+PRELUDE = struct.Struct("<8sIIQ")
+
+
+def _pack(cells: np.ndarray) -> np.ndarray:
+    if len(cells) % 2:
+        cells = np.append(cells, 0)
+    return (cells[0::2] | (cells[1::2] << 4)).astype(np.uint8)
+
+
+def _unpack(packed: np.ndarray, count: int) -> np.ndarray:
+    cells = np.empty(2 * len(packed), dtype=np.uint8)
+    cells[0::2] = packed & 0x0F
+    cells[1::2] = packed >> 4
+    return cells[:count]
+
+
+def write_store(tasks, path: str, packed: bool = False):
+    """
+    Write (name, task) pairs, where task is ARC JSON ({'train': [...], 'test': [...]}), to a grid store.
+    Cells are streamed to disk as tasks come in, only the tables are kept in memory.
+    """
+    names, task_table, grid_table = [], [], []
+    offset = 0  # in cells
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PRELUDE.pack(MAGIC, FORMAT_VERSION, FLAG_PACKED if packed else 0, 0))
+        for name, task in tasks:
+            names.append(name)
+            task_table.append((len(grid_table), len(task['train']), len(task['test'])))
+            for item in task['train'] + task['test']:
+                for key in ['input', 'output']:
+                    grid = np.asarray(item.get(key, np.zeros((0, 0))), dtype=np.uint8)
+                    if grid.ndim != 2:
+                        grid = grid.reshape(0, 0)
+                    cells = grid.ravel()
+                    grid_table.append((grid.shape[0], grid.shape[1], offset))
+                    if packed:
+                        f.write(_pack(cells).tobytes())
+                        offset += len(cells) + len(cells) % 2
+                    else:
+                        f.write(cells.tobytes())
+                        offset += len(cells)
+
+        cells_bytes = offset // 2 if packed else offset
+        f.write(b"\0" * (-(PRELUDE.size + cells_bytes) % 8))
+        task_table_offset = f.tell()
+        f.write(np.asarray(task_table, dtype='<i8').reshape(-1, 3).tobytes())
+        grid_table_offset = f.tell()
+        f.write(np.asarray(grid_table, dtype='<i8').reshape(-1, 3).tobytes())
+        footer_offset = f.tell()
+        f.write(json.dumps({
+            "names": names,
+            "num_grids": len(grid_table),
+            "cells_bytes": cells_bytes,
+            "task_table_offset": task_table_offset,
+            "grid_table_offset": grid_table_offset,
+        }).encode())
+        f.seek(0)
+        f.write(PRELUDE.pack(MAGIC, FORMAT_VERSION, FLAG_PACKED if packed else 0, footer_offset))
+    os.replace(tmp_path, path)
+
+
+def _memmap(path: str, dtype, offset: int, shape: tuple) -> np.ndarray:
+    # np.memmap cannot map zero bytes
+    if np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+class GridStore:
+    """
+    Read-only, memory-mapped view of a grid store.
+
+    store = GridStore(path)
+    task = store["0a938d79_01"]        # same structure as ARC JSON, grids are numpy arrays
+    grid = store.grid(store.task_grids(0)[0])
+    Unpacked stores return zero-copy views into the file; packed stores decode each grid on access.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            magic, version, flags, footer_offset = PRELUDE.unpack(f.read(PRELUDE.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} grid store.")
+            f.seek(footer_offset)
+            footer = json.loads(f.read())
+
+        self.path = path
+        self.packed = bool(flags & FLAG_PACKED)
+        self.names = footer["names"]
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self.task_table = _memmap(path, '<i8', footer["task_table_offset"], (len(self.names), 3))
+        self.grid_table = _memmap(path, '<i8', footer["grid_table_offset"], (footer["num_grids"], 3))
+        self.cells = _memmap(path, np.uint8, PRELUDE.size, (footer["cells_bytes"],))
+
+    def __len__(self):
+        return len(self.names)
+
+    def grid(self, index: int) -> np.ndarray:
+        height, width, offset = (int(v) for v in self.grid_table[index])
+        count = height * width
+        if self.packed:
+            return _unpack(self.cells[offset // 2:(offset + count + 1) // 2], count).reshape(height, width)
+        return self.cells[offset:offset + count].reshape(height, width)
+
+    def task_grids(self, task: int) -> range:
+        first, num_train, num_test = (int(v) for v in self.task_table[task])
+        return range(first, first + 2 * (num_train + num_test))
+
+    def task(self, task) -> Dict[str, List[Dict[str, np.ndarray]]]:
+        """The task at an index or with a name, in ARC JSON structure with numpy grids."""
+        if isinstance(task, str):
+            task = self._index[task]
+        first, num_train, num_test = (int(v) for v in self.task_table[task])
+        pairs = []
+        for i in range(num_train + num_test):
+            pair = {'input': self.grid(first + 2 * i)}
+            output = self.grid(first + 2 * i + 1)
+            if output.size > 0:
+                pair['output'] = output
+            pairs.append(pair)
+        return {'train': pairs[:num_train], 'test': pairs[num_train:]}
+
+    def __getitem__(self, task):
+        return self.task(task)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.task(i)
+
+
+def json_to_store(data_path: str, path: str, packed: bool = False):
+    """
+    Convert a directory of ARC JSON task files to a grid store.
+    """
+    names = sorted(name for name in os.listdir(data_path) if name.endswith('.json'))
+
+    def tasks():
+        for name in tqdm(names, desc=f"Converting {data_path}"):
+            with open(os.path.join(data_path, name), 'r') as f:
+                yield name[:-len('.json')], json.load(f)
+
+    write_store(tasks(), path, packed=packed)
+
+
+def store_to_json(path: str, output_dir: str):
+    """
+    Convert a grid store back to a directory of ARC JSON task files.
+    """
+    store = GridStore(path)
+    os.makedirs(output_dir, exist_ok=True)
+    for i, name in enumerate(tqdm(store.names, desc=f"Converting {path}")):
+        task = store.task(i)
+        with open(os.path.join(output_dir, f"{name}.json"), 'w') as f:
+            json.dump({
+                key: [{k: grid.tolist() for k, grid in pair.items()} for pair in pairs]
+                for key, pairs in task.items()
+            }, f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--split", type=str, default="training")
+    parser.add_argument("--packed", action="store_true", help="store two cells per byte")
+    args = parser.parse_args()
+
+    json_to_store(os.path.join(base_path, "data", args.split), os.path.join(base_path, "data", f"{args.split}.arcg"), packed=args.packed)
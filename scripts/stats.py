@@ -1,17 +1,18 @@
 import os
 import json
+import argparse
 from collections import Counter
 
+import task_index
+
 base_path = "/home/tangwenhao/Workspace/ARC"
 
-def record_stats(version: int, split: str, name: str):
-    with open(os.path.join(base_path, f"ARC-AGI-{version}", "data", split, f"{name}.json"), "r") as f:
-        data = json.load(f)
-        train_data = data["train"]
+def record_stats(tasks, pairs, task: int):
+    train_data = task_index.task_pairs(tasks, pairs, task)[:tasks[task]["num_train"]]
 
     num_shots = len(train_data)
-    input_shape = (len(train_data[0]["input"]), len(train_data[0]["input"][0]))
-    output_shape = (len(train_data[0]["output"]), len(train_data[0]["output"][0]))
+    input_shape = tuple(int(s) for s in train_data[0]["input_shape"])
+    output_shape = tuple(int(s) for s in train_data[0]["output_shape"])
     is_shape_equal = input_shape == output_shape
 
     return {
@@ -24,28 +25,31 @@ def record_stats(version: int, split: str, name: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base_path", type=str, default=base_path)
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # Only new or modified task files are read
+    tasks, pairs = task_index.update_index(args.base_path, num_workers=args.num_workers)
 
-    for version in [1, 2]:
-        for split in ["training", "evaluation"]:
+    for version in task_index.VERSIONS:
+        for split in task_index.SPLITS:
             stats = {}
             num_shots = []
             is_shape_equal = []
 
-            for filename in os.listdir(os.path.join(base_path, f"ARC-AGI-{version}", "data", split)):
-                if filename.endswith(".json"):
-                    name = filename.split(".")[0]
-                    result = record_stats(version, split, name)
-                    stats[name] = result
-                    num_shots.append(result["num_shots"])
-                    is_shape_equal.append(result["is_shape_equal"])
-            
-            with open(os.path.join(base_path, "scripts", "stats", f"stats_v{version}_{split}.json"), "w") as f:
-                json.dump(stats, f, indent=4)
-
-            with open(os.path.join(base_path, "scripts", "stats", f"counts_v{version}_{split}.json"), "w") as f:
+            for task in task_index.select_tasks(tasks, version, split):
+                result = record_stats(tasks, pairs, task)
+                stats[str(tasks[task]["name"])] = result
+                num_shots.append(result["num_shots"])
+                is_shape_equal.append(result["is_shape_equal"])
+
+            with open(os.path.join(args.base_path, "scripts", "stats", f"stats_v{version}_{split}.json"), "w") as f:
+                json.dump(stats, f)
+
+            with open(os.path.join(args.base_path, "scripts", "stats", f"counts_v{version}_{split}.json"), "w") as f:
                 json.dump({
                     "num_shots": dict(Counter(num_shots)),
                     "is_shape_equal": dict(Counter(is_shape_equal))
                 }, f, indent=4)
-    
-
@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+
+base_path = "/home/tangwenhao/Workspace/ARC"
+
+VERSIONS = [1, 2]
+SPLITS = ["training", "evaluation"]
+
+# One row per task file
+TASK_DTYPE = np.dtype([
+    ('version', np.uint8),
+    ('split', 'U10'),
+    ('name', 'U32'),
+    ('mtime', np.float64),
+    ('size', np.int64),
+    ('sha1', 'U40'),
+    ('num_train', np.int16),
+    ('num_test', np.int16),
+    ('pair_start', np.int64),   # first row of the task in the pair table
+])
+
+# One row per train/test pair; shapes are (height, width), histograms count cells of each color
+PAIR_DTYPE = np.dtype([
+    ('task', np.int32),
+    ('is_test', np.bool_),
+    ('index', np.int16),
+    ('input_shape', np.int16, (2,)),
+    ('output_shape', np.int16, (2,)),
+    ('shape_equal', np.bool_),
+    ('input_pixels', np.int32),    # non-black cells
+    ('output_pixels', np.int32),
+    ('input_hist', np.int32, (10,)),
+    ('output_hist', np.int32, (10,)),
+])
+
+
+def default_index_path(base_path: str = base_path) -> str:
+    return os.path.join(base_path, "scripts", "stats", "task_index.npz")
+
+
+def _grid_stats(grid) -> Tuple[Tuple[int, int], np.ndarray]:
+    """
+    Shape and color histogram of a grid, (0, 0) and zeros for a missing grid.
+    """
+    if grid is None or len(grid) == 0:
+        return (0, 0), np.zeros(10, dtype=np.int32)
+    array = np.asarray(grid, dtype=np.int64)
+    return array.shape, np.bincount(array.ravel(), minlength=10)[:10].astype(np.int32)
+
+
+def index_file(path: str):
+    """
+    Parse one task file. Returns (sha1, num_train, num_test, pair rows without the task column).
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    data = json.loads(content)
+
+    rows = []
+    for is_test, key in [(False, 'train'), (True, 'test')]:
+        for index, item in enumerate(data.get(key, [])):
+            input_shape, input_hist = _grid_stats(item.get('input'))
+            output_shape, output_hist = _grid_stats(item.get('output'))
+            rows.append((
+                0, is_test, index, input_shape, output_shape, input_shape == output_shape,
+                input_hist[1:].sum(), output_hist[1:].sum(), input_hist, output_hist,
+            ))
+    pairs = np.array(rows, dtype=PAIR_DTYPE)
+    return hashlib.sha1(content).hexdigest(), len(data.get('train', [])), len(data.get('test', [])), pairs
+
+
+def load_index(path: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load the task index. Returns (tasks, pairs) structured arrays, empty if no index exists yet.
+    """
+    path = path or default_index_path()
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=TASK_DTYPE), np.zeros(0, dtype=PAIR_DTYPE)
+    with np.load(path) as index:
+        return index['tasks'], index['pairs']
+
+
+def save_index(tasks: np.ndarray, pairs: np.ndarray, path: str = None):
+    path = path or default_index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, tasks=tasks, pairs=pairs)
+    os.replace(tmp_path, path)
+
+
+def update_index(base_path: str = base_path, path: str = None, num_workers: int = None,
+                 versions: List[int] = VERSIONS, splits: List[str] = SPLITS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build or incrementally update the task index over all versions and splits in one parallel pass.
+    Files whose size and mtime are unchanged are not opened; files whose content hash is unchanged
+    keep their previous pair rows. Returns (tasks, pairs) and saves them to `path`.
+    """
+    path = path or default_index_path(base_path)
+    old_tasks, old_pairs = load_index(path)
+    old_rows = {(int(t['version']), str(t['split']), str(t['name'])): i for i, t in enumerate(old_tasks)}
+
+    # List the files and decide which ones need to be read
+    entries = []
+    for version in versions:
+        for split in splits:
+            data_dir = os.path.join(base_path, f"ARC-AGI-{version}", "data", split)
+            if not os.path.isdir(data_dir):
+                continue
+            with os.scandir(data_dir) as it:
+                for entry in sorted(it, key=lambda e: e.name):
+                    if entry.name.endswith('.json'):
+                        stat = entry.stat()
+                        entries.append((version, split, entry.name[:-5], entry.path, stat.st_mtime, stat.st_size))
+
+    to_read = []
+    for i, (version, split, name, file_path, mtime, size) in enumerate(entries):
+        old = old_rows.get((version, split, name))
+        if old is None or old_tasks[old]['mtime'] != mtime or old_tasks[old]['size'] != size:
+            to_read.append(i)
+
+    parsed = {}
+    if to_read:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = executor.map(index_file, [entries[i][3] for i in to_read], chunksize=16)
+            parsed = dict(zip(to_read, results))
+
+    tasks = np.zeros(len(entries), dtype=TASK_DTYPE)
+    pair_blocks = []
+    pair_start = 0
+    for i, (version, split, name, file_path, mtime, size) in enumerate(entries):
+        old = old_rows.get((version, split, name))
+        if i in parsed and (old is None or parsed[i][0] != old_tasks[old]['sha1']):
+            sha1, num_train, num_test, pairs = parsed[i]
+        else:
+            # Unchanged file (or touched without changing its content): reuse the previous rows
+            start = old_tasks[old]['pair_start']
+            sha1, num_train, num_test = old_tasks[old]['sha1'], old_tasks[old]['num_train'], old_tasks[old]['num_test']
+            pairs = old_pairs[start:start + num_train + num_test].copy()
+        pairs['task'] = i
+        tasks[i] = (version, split, name, mtime, size, sha1, num_train, num_test, pair_start)
+        pair_blocks.append(pairs)
+        pair_start += len(pairs)
+
+    pairs = np.concatenate(pair_blocks) if pair_blocks else np.zeros(0, dtype=PAIR_DTYPE)
+    save_index(tasks, pairs, path)
+    return tasks, pairs
+
+
+def select_tasks(tasks: np.ndarray, version: int = None, split: str = None) -> np.ndarray:
+    """
+    Row indices of the tasks of a given version and/or split.
+    """
+    mask = np.ones(len(tasks), dtype=bool)
+    if version is not None:
+        mask &= tasks['version'] == version
+    if split is not None:
+        mask &= tasks['split'] == split
+    return np.flatnonzero(mask)
+
+
+def task_pairs(tasks: np.ndarray, pairs: np.ndarray, task: int) -> np.ndarray:
+    """
+    The pair rows (train first, then test) of the task at row `task`.
+    """
+    start = tasks[task]['pair_start']
+    return pairs[start:start + tasks[task]['num_train'] + tasks[task]['num_test']]
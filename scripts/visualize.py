@@ -1,9 +1,11 @@
 import os
 import json
+import zlib
+import hashlib
+import struct
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-from matplotlib.colors import ListedColormap, BoundaryNorm
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict
 from tqdm import tqdm
 
@@ -22,12 +24,149 @@ colors = [
     '#7AD6F5',  # 8: Light Blue
     '#800000'   # 9: Maroon
 ]
-cmap = ListedColormap(colors)
-bounds = np.arange(-0.5, 10, 1)
-norm = BoundaryNorm(bounds, cmap.N)
+palette = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=np.uint8)
 
+WHITE = np.array([255, 255, 255], dtype=np.uint8)
 
-def add_edge(ax: plt.Axes, matrix: np.ndarray, edge_color: str = 'w'):
+# Bump when the output of a backend changes, to invalidate cached renders
+RENDER_VERSION = 1
+
+
+# ========== Raster backend ==========
+
+def render_grid(matrix: np.ndarray, cell_size: int = 16, border: int = 1, edge_color: np.ndarray = WHITE) -> np.ndarray:
+    """
+    Rasterize a grid into an RGB image with `cell_size` pixel cells separated by `border` pixel lines.
+    """
+    h, w = matrix.shape
+    step = cell_size + border
+    # One block per cell, with the cell in the top-left corner and its right/bottom border around it
+    blocks = np.empty((h, step, w, step, 3), dtype=np.uint8)
+    blocks[...] = edge_color
+    blocks[:, :cell_size, :, :cell_size] = palette[matrix][:, None, :, None]
+
+    image = np.empty((h * step + border, w * step + border, 3), dtype=np.uint8)
+    image[...] = edge_color
+    image[border:, border:] = blocks.reshape(h * step, w * step, 3)
+    return image
+
+
+def render_task(data: Dict, cell_size: int = 16, border: int = 1, margin: int = 16) -> np.ndarray:
+    """
+    Composite a task into one RGB image laid out like `visualize`: one row per example, with the columns
+    train input, train output, test input and test output.
+    """
+    train_data = data.get('train', [])
+    test_data = data.get('test', [])
+    num_rows = max(len(train_data), len(test_data))
+
+    panels = [[None] * 4 for _ in range(num_rows)]
+    for column, examples in [(0, train_data), (2, test_data)]:
+        for row, shot in enumerate(examples):
+            for offset, key in enumerate(['input', 'output']):
+                if key in shot:
+                    panels[row][column + offset] = render_grid(np.array(shot[key]), cell_size, border)
+
+    row_heights = [max([p.shape[0] for p in row if p is not None], default=0) for row in panels]
+    column_widths = [max([row[c].shape[1] for row in panels if row[c] is not None], default=0) for c in range(4)]
+
+    image = np.empty((sum(row_heights) + margin * (num_rows + 1), sum(column_widths) + margin * 5, 3), dtype=np.uint8)
+    image[...] = WHITE
+    y = margin
+    for row, row_height in zip(panels, row_heights):
+        x = margin
+        for panel, column_width in zip(row, column_widths):
+            if panel is not None:
+                image[y:y + panel.shape[0], x:x + panel.shape[1]] = panel
+            x += column_width + margin
+        y += row_height + margin
+    return image
+
+
+def write_png(path: str, image: np.ndarray):
+    """
+    Write an RGB uint8 image as a PNG file.
+    """
+    h, w, _ = image.shape
+    # Every scanline starts with filter type 0 (none)
+    raw = np.concatenate([np.zeros((h, 1), dtype=np.uint8), image.reshape(h, w * 3)], axis=1).tobytes()
+
+    def chunk(kind: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+    with open(path, 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def render_key(content: bytes, settings: Dict) -> str:
+    """
+    Cache key of a render: hash of the task file content and of the render settings.
+    """
+    digest = hashlib.sha1(content)
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def render(version: int, split: str, name: str, cell_size: int = 16, backend: str = "raster", cached_key: str = None):
+    """
+    Render a task unless `cached_key` shows that the existing image was made from the same content and settings.
+    The image is written to a temporary file and moved into place.
+    Returns (name, key, whether the task was rendered).
+    """
+    with open(os.path.join(base_path, "data", split, f"{name}.json"), "rb") as f:
+        content = f.read()
+
+    output_path = os.path.join(base_path, "visualization", split, f"{name}.png")
+    settings = {"render_version": RENDER_VERSION, "backend": backend, "version": version, "cell_size": cell_size}
+    key = render_key(content, settings)
+    if key == cached_key and os.path.exists(output_path):
+        return name, key, False
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.tmp.{os.getpid()}.png"
+    if backend == "raster":
+        write_png(tmp_path, render_task(json.loads(content), cell_size=cell_size))
+    else:
+        visualize(version, split, name, output_path=tmp_path)
+    os.replace(tmp_path, output_path)
+    return name, key, True
+
+
+def render_split(version: int, split: str, names: List[str], num_workers: int = None, cell_size: int = 16, backend: str = "raster"):
+    """
+    Render many tasks with a process pool, skipping tasks whose content and settings are unchanged since
+    the last run. The cache keys are kept in visualization/<split>/manifest.json.
+    Returns (number of rendered tasks, number of skipped tasks).
+    """
+    manifest_path = os.path.join(base_path, "visualization", split, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+    num_rendered, num_skipped = 0, 0
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(render, version, split, name, cell_size, backend, manifest.get(name)) for name in names]
+            for future in tqdm(futures, desc=f"Visualizing {version} {split}"):
+                name, key, rendered = future.result()
+                manifest[name] = key
+                num_rendered += rendered
+                num_skipped += not rendered
+    finally:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(f"{manifest_path}.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+    return num_rendered, num_skipped
+
+
+# ========== Matplotlib backend (annotated figures) ==========
+
+def add_edge(ax: "plt.Axes", matrix: np.ndarray, edge_color: str = 'w'):
     # Get matrix dimensions
     h, w = matrix.shape
 
@@ -46,7 +185,15 @@ def add_edge(ax: plt.Axes, matrix: np.ndarray, edge_color: str = 'w'):
     ax.tick_params(which='major', bottom=False, left=False, labelbottom=False, labelleft=False)
 
 
-def visualize(version: int, split: str, name: str):
+def visualize(version: int, split: str, name: str, output_path: str = None):
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+    from matplotlib.colors import ListedColormap, BoundaryNorm
+
+    cmap = ListedColormap(colors)
+    bounds = np.arange(-0.5, 10, 1)
+    norm = BoundaryNorm(bounds, cmap.N)
+
     # Load the data from the JSON file
     with open(os.path.join(base_path, "data", split, f"{name}.json"), "r") as f:
         data = json.load(f)
@@ -72,7 +219,7 @@ def visualize(version: int, split: str, name: str):
         ax2.imshow(output_data, cmap=cmap, norm=norm, aspect='equal')
         add_edge(ax2, output_data)
         ax2.set_title(f"Output {i+1}")
-    
+
     for j, shot in enumerate(test_data):
         ax3 = fig.add_subplot(gs[j, 2])
         test_input_data = np.array(shot['input'])
@@ -87,7 +234,7 @@ def visualize(version: int, split: str, name: str):
         ax4.set_title(f"Test Output {j+1}")
 
 
-    output_path = os.path.join(base_path, "visualization", split, f"{name}.png")
+    output_path = output_path or os.path.join(base_path, "visualization", split, f"{name}.png")
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     plt.tight_layout()
     plt.savefig(output_path, bbox_inches='tight')
@@ -95,9 +242,14 @@ def visualize(version: int, split: str, name: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--version", type=int, default=2)
+    parser.add_argument("--split", type=str, default="training")
+    parser.add_argument("--backend", type=str, default="raster", choices=["raster", "matplotlib"])
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
     # visualize(2, "training", "0a938d79")
-    version = 2
-    split = "training"
-    names = [filename.split(".")[0] for filename in os.listdir(os.path.join(base_path, "data", split)) if filename.endswith(".json")]
-    for name in tqdm(names, desc=f"Visualizing {version} {split}"):
-        visualize(version, split, name)
+    names = [filename.split(".")[0] for filename in os.listdir(os.path.join(base_path, "data", args.split)) if filename.endswith(".json")]
+    num_rendered, num_skipped = render_split(args.version, args.split, names, num_workers=args.num_workers, backend=args.backend)
+    print(f"Rendered {num_rendered} tasks, {num_skipped} unchanged tasks skipped.")
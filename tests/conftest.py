@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts import each other as top-level modules, and the seeds do `from common import *`
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ["scripts", os.path.join("scripts", "generate"), os.path.join("scripts", "generate", "seeds")]:
+    sys.path.insert(0, os.path.join(root, path))
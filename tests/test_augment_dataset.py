@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+
+from augment_dataset import AugmentedDataset
+from grid_store import write_store
+
+GRID = [[1, 2], [3, 4]]
+# The test pair has no output, as in ARC evaluation tasks
+UNLABELED_TASK = {"train": [{"input": GRID, "output": GRID}], "test": [{"input": GRID}]}
+
+
+def test_no_datasets_import_until_hf_export(tmp_path):
+    # In a fresh interpreter: other tests may have imported datasets already
+    with open(tmp_path / "00000000.json", "w") as f:
+        json.dump({"train": [{"input": GRID, "output": GRID}], "test": [{"input": GRID, "output": GRID}]}, f)
+    code = (
+        "import sys, numpy as np\n"
+        "from augment_dataset import AugmentedDataset\n"
+        f"item = AugmentedDataset({str(tmp_path)!r})[('00000000', 0)]\n"   # augmentation 0 is the identity
+        f"assert np.array_equal(item['train_input_0'], np.array({GRID}))\n"
+        "assert 'datasets' not in sys.modules\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+def test_unlabeled_test_pair_from_json(tmp_path):
+    with open(tmp_path / "00000000.json", "w") as f:
+        json.dump(UNLABELED_TASK, f)
+    for augment_id in [0, 1]:
+        item = AugmentedDataset(str(tmp_path))[("00000000", augment_id)]
+        assert item["test_output_0"] is None
+        assert item["test_input_0"].shape == (2, 2)
+
+
+def test_unlabeled_test_pair_from_store(tmp_path):
+    path = str(tmp_path / "tasks.arcg")
+    write_store([("00000000", UNLABELED_TASK)], path)
+    item = AugmentedDataset(path)[("00000000", 1)]
+    assert item["test_output_0"] is None
+    assert item["train_output_0"].shape == (2, 2)
@@ -0,0 +1,51 @@
+"""
+Tests of the compaction of common.py for prompts.
+"""
+import ast
+
+from common_lib import compact_common_lib
+
+SOURCE = '''"""Library"""
+
+import numpy as np
+import random
+from typing import List
+from contextlib import contextmanager
+
+
+class Color:
+    BLACK = 0
+
+
+@contextmanager
+def _context():
+    yield
+
+
+def draw(grid: np.ndarray, colors: List[int] = None, background=Color.BLACK):
+    """Draw something."""
+    return random.random()
+
+
+def count(grid):
+    """Count something."""
+    return 0
+'''
+
+
+def imported_names(compacted):
+    return {
+        alias.asname or alias.name for node in ast.parse(compacted).body
+        if isinstance(node, (ast.Import, ast.ImportFrom)) for alias in node.names
+    }
+
+
+def test_imports_of_dropped_helpers_are_dropped():
+    compacted = compact_common_lib(SOURCE)
+    assert imported_names(compacted) == {"np", "List"}
+    assert "_context" not in compacted and "random.random" not in compacted
+
+
+def test_imports_follow_the_kept_definitions():
+    assert imported_names(compact_common_lib(SOURCE, keep={"count"})) == set()
+    assert imported_names(compact_common_lib(SOURCE, keep={"draw"})) == {"np", "List"}
@@ -0,0 +1,37 @@
+import random
+import numpy as np
+
+from common import Color, random_sprite, randomly_scatter_points, randomly_spaced_indices, rng_context
+
+
+def sample():
+    grid = np.zeros((10, 10), dtype=int)
+    randomly_scatter_points(grid, Color.RED, density=0.3)
+    return grid, randomly_spaced_indices(30, 4), random_sprite(4, 5)
+
+
+def test_np_random_seed_reproduces_helpers_without_rng():
+    np.random.seed(0)
+    first = sample()
+    np.random.seed(0)
+    second = sample()
+    for a, b in zip(first, second):
+        assert np.array_equal(a, b)
+
+
+def test_helpers_leave_the_random_module_alone():
+    random.seed(0)
+    expected = [random.random() for _ in range(3)]
+    random.seed(0)
+    sample()
+    assert [random.random() for _ in range(3)] == expected
+
+
+def test_rng_context_takes_precedence_over_np_random():
+    with rng_context(1):
+        first = sample()
+    np.random.seed(5)
+    with rng_context(1):
+        second = sample()
+    for a, b in zip(first, second):
+        assert np.array_equal(a, b)
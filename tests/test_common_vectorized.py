@@ -0,0 +1,189 @@
+"""
+Differential tests of the vectorized pixel primitives of common.py against the per-pixel loop implementations
+they replaced, on random grids, offsets, colors, connectivities and backgrounds.
+"""
+import numpy as np
+import pytest
+
+import common
+
+
+# ========== Reference loop implementations ==========
+
+def reference_scale_pattern(pattern, scale_factor):
+    n, m = pattern.shape
+    new_n, new_m = n * scale_factor, m * scale_factor
+    new_pattern = np.zeros((new_n, new_m), dtype=pattern.dtype)
+    for i in range(new_n):
+        for j in range(new_m):
+            new_pattern[i, j] = pattern[i // scale_factor, j // scale_factor]
+    return new_pattern
+
+
+def reference_blit(grid, sprite, x=0, y=0, background=None):
+    x, y = int(x), int(y)
+    for i in range(sprite.shape[0]):
+        for j in range(sprite.shape[1]):
+            if background is None or sprite[i, j] != background:
+                if 0 <= x + i < grid.shape[0] and 0 <= y + j < grid.shape[1]:
+                    grid[x + i, y + j] = sprite[i, j]
+    return grid
+
+
+def reference_bounding_box(grid, background=common.Color.BLACK):
+    n, m = grid.shape
+    x_min, x_max = n, -1
+    y_min, y_max = m, -1
+    for x in range(n):
+        for y in range(m):
+            if grid[x, y] != background:
+                x_min = min(x_min, x)
+                x_max = max(x_max, x)
+                y_min = min(y_min, y)
+                y_max = max(y_max, y)
+    return x_min, y_min, x_max - x_min + 1, y_max - y_min + 1
+
+
+def reference_translate(obj, x, y, background=common.Color.BLACK):
+    n, m = obj.shape
+    new_grid = np.zeros((n, m), dtype=obj.dtype)
+    new_grid[:, :] = background
+    for i in range(n):
+        for j in range(m):
+            new_x, new_y = i + x, j + y
+            if 0 <= new_x < n and 0 <= new_y < m:
+                new_grid[new_x, new_y] = obj[i, j]
+    return new_grid
+
+
+def reference_contact(object1, object2, x1=0, y1=0, x2=0, y2=0, background=common.Color.BLACK, connectivity=None):
+    # connectivity=None is the test of `collision`: only the (0, 0) move
+    n2, m2 = object2.shape
+    dx, dy = int(x2 - x1), int(y2 - y1)
+    moves = [(0, 0)]
+    if connectivity is not None:
+        moves += [(0, 1), (0, -1), (1, 0), (-1, 0)]
+    if connectivity == 8:
+        moves += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+    for x, y in np.argwhere(object1 != background):
+        for mx, my in moves:
+            new_x, new_y = x - dx + mx, y - dy + my
+            if 0 <= new_x < n2 and 0 <= new_y < m2 and object2[new_x, new_y] != background:
+                return True
+    return False
+
+
+def reference_apply_symmetry(sprite, symmetry_type, background=common.Color.BLACK):
+    n, m = sprite.shape
+    if symmetry_type == "horizontal":
+        for y in range(m):
+            for x in range(n // 2):
+                sprite[x, y] = sprite[n - 1 - x, y] = sprite[x, y] if sprite[x, y] != background else sprite[n - 1 - x, y]
+    else:
+        for x in range(n):
+            for y in range(m // 2):
+                sprite[x, y] = sprite[x, m - 1 - y] = sprite[x, y] if sprite[x, y] != background else sprite[x, m - 1 - y]
+    return sprite
+
+
+# ========== Random inputs ==========
+
+def random_grid(rng, max_size=12, density=None, num_colors=None):
+    n, m = rng.integers(1, max_size + 1, size=2)
+    num_colors = num_colors or int(rng.integers(2, 11))
+    colors = rng.choice(10, size=num_colors, replace=False)
+    grid = rng.choice(colors, size=(n, m))
+    if density is None:
+        density = rng.random()
+    grid[rng.random((n, m)) > density] = common.Color.BLACK
+    return grid
+
+
+def random_background(rng):
+    return [common.Color.BLACK, int(rng.integers(0, 10)), None][int(rng.integers(0, 3))]
+
+
+SEEDS = range(300)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_scale_pattern(seed):
+    rng = np.random.default_rng(seed)
+    pattern = random_grid(rng, max_size=6)
+    factor = int(rng.integers(1, 4))
+    assert np.array_equal(common.scale_pattern(pattern, factor), reference_scale_pattern(pattern, factor))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_blit(seed):
+    rng = np.random.default_rng(seed)
+    grid, sprite = random_grid(rng), random_grid(rng, max_size=8)
+    x, y = rng.integers(-8, 14, size=2)
+    background = random_background(rng)
+    expected = reference_blit(grid.copy(), sprite, x, y, background)
+    assert np.array_equal(common.blit(grid.copy(), sprite, x, y, background), expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_blit_of_a_view_of_the_grid(seed):
+    # generate_sprite blits np.rot90(sprite) onto the sprite itself: later pixels see earlier writes
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 8))
+    grid = np.resize(random_grid(rng), (n, n))
+    background = random_background(rng)
+    expected = grid.copy()
+    reference_blit(expected, np.rot90(expected), background=background)
+    assert np.array_equal(common.blit(grid, np.rot90(grid), background=background), expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_bounding_box(seed):
+    rng = np.random.default_rng(seed)
+    grid = random_grid(rng, density=rng.choice([0.0, 0.05, rng.random()]))
+    background = int(rng.choice([common.Color.BLACK, rng.integers(0, 10)]))
+    result = common.bounding_box(grid, background)
+    assert result == reference_bounding_box(grid, background)
+    assert all(type(value) is int for value in result)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_translate(seed):
+    rng = np.random.default_rng(seed)
+    grid = random_grid(rng)
+    x, y = rng.integers(-14, 15, size=2)
+    background = int(rng.integers(0, 10))
+    result = common.translate(grid, x, y, background)
+    assert np.array_equal(result, reference_translate(grid, x, y, background))
+    assert result.dtype == grid.dtype
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_collision(seed):
+    rng = np.random.default_rng(seed)
+    object1, object2 = random_grid(rng, density=0.2), random_grid(rng, max_size=6, density=0.5)
+    x1, y1, x2, y2 = rng.integers(-4, 12, size=4)
+    background = int(rng.choice([common.Color.BLACK, rng.integers(0, 10)]))
+    expected = reference_contact(object1, object2, x1, y1, x2, y2, background)
+    assert common.collision(object1=object1, object2=object2, x1=x1, y1=y1, x2=x2, y2=y2, background=background) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("connectivity", [4, 8])
+def test_contact(seed, connectivity):
+    rng = np.random.default_rng(seed)
+    object1, object2 = random_grid(rng, density=0.15), random_grid(rng, max_size=6, density=0.4)
+    x1, y1, x2, y2 = rng.integers(-4, 12, size=4)
+    background = int(rng.choice([common.Color.BLACK, rng.integers(0, 10)]))
+    expected = reference_contact(object1, object2, x1, y1, x2, y2, background, connectivity)
+    result = common.contact(object1=object1, object2=object2, x1=x1, y1=y1, x2=x2, y2=y2, background=background, connectivity=connectivity)
+    assert result == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("symmetry_type", ["horizontal", "vertical"])
+def test_apply_symmetry(seed, symmetry_type):
+    rng = np.random.default_rng(seed)
+    sprite = random_grid(rng, max_size=9)
+    background = int(rng.choice([common.Color.BLACK, rng.integers(0, 10)]))
+    expected = reference_apply_symmetry(sprite.copy(), symmetry_type, background)
+    assert np.array_equal(common.apply_symmetry(sprite.copy(), symmetry_type, background), expected)
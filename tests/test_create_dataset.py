@@ -0,0 +1,42 @@
+import os
+import json
+import pytest
+
+from create_dataset import build_sharded_dataset, load_sharded_dataset
+
+
+def write_task(data_path, name, num_train, num_test):
+    grid = [[1, 2], [3, 4]]
+    task = {
+        "train": [{"input": grid, "output": grid} for _ in range(num_train)],
+        "test": [{"input": grid, "output": grid} for _ in range(num_test)],
+    }
+    with open(os.path.join(data_path, f"{name}.json"), "w") as f:
+        json.dump(task, f)
+
+
+def test_empty_split(tmp_path):
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    assert build_sharded_dataset(str(data_path), str(tmp_path / "dataset"), "train") == []
+    with open(tmp_path / "dataset" / "manifest.json") as f:
+        assert json.load(f) == {"train": []}
+
+
+def test_load_shards_with_different_columns(tmp_path):
+    pytest.importorskip("datasets")
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    # One task per shard, with a growing number of pairs, so every shard has different columns
+    for i in range(4):
+        write_task(str(data_path), f"{i:08x}", num_train=i + 1, num_test=1 + i % 2)
+    output_dir = str(tmp_path / "dataset")
+    shards = build_sharded_dataset(str(data_path), output_dir, "train", shard_size_mb=1e-6, num_workers=2)
+    assert len(shards) == 4
+
+    dataset = load_sharded_dataset(output_dir)["train"]
+    assert len(dataset) == 4
+    for i, item in enumerate(dataset):
+        assert [item[f"train_input_{j}"] is not None for j in range(4)] == [j <= i for j in range(4)]
+        assert (item["test_input_1"] is not None) == (i % 2 == 1)
+        assert item["train_output_0"] == [[1, 2], [3, 4]]
@@ -0,0 +1,79 @@
+"""
+Batch generation against the local stub server, offline.
+"""
+import json
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+
+from generate_text import generate_batch, make_async_client
+from stub_server import StubHandler
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(StubHandler, "counts", {"requests": 0, "failures": 0, "in_flight": 0, "max_in_flight": 0})
+    monkeypatch.setattr(StubHandler, "failures", [])
+    monkeypatch.setattr(StubHandler, "latency_ms", 0.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def requests(ids):
+    return [{"id": i, "model": "stub", "messages": [{"role": "user", "content": f"prompt {i}"}]} for i in ids]
+
+
+def run_batch(base_url, output_path, ids, **kwargs):
+    kwargs = {"concurrency": 4, "requests_per_minute": 60000, "base_delay": 0.01, **kwargs}
+    return asyncio.run(generate_batch(requests(ids), str(output_path), make_async_client(base_url), **kwargs))
+
+
+def read_records(output_path):
+    with open(output_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_retries_of_injected_failures(stub, tmp_path):
+    StubHandler.failures = [429, 500, 503]
+    stats = run_batch(stub, tmp_path / "out.jsonl", [0], concurrency=1)
+    [record] = read_records(tmp_path / "out.jsonl")
+    assert record["response"] is not None and record["retries"] == 3
+    assert stats["succeeded"] == 1 and stats["retries"] == 3
+    assert StubHandler.counts["requests"] == 4
+
+
+def test_failure_after_the_last_retry(stub, tmp_path):
+    StubHandler.failures = [500, 500, 500]
+    stats = run_batch(stub, tmp_path / "out.jsonl", [0], concurrency=1, max_retries=1)
+    [record] = read_records(tmp_path / "out.jsonl")
+    assert record["response"] is None and "error" in record and record["retries"] == 1
+    assert stats["failed"] == 1 and stats["retries"] == 1
+
+
+def test_concurrency_limit_and_streamed_output(stub, tmp_path):
+    StubHandler.latency_ms = 50
+    stats = run_batch(stub, tmp_path / "out.jsonl", range(12), concurrency=3)
+    assert 1 < StubHandler.counts["max_in_flight"] <= 3
+    records = read_records(tmp_path / "out.jsonl")
+    assert sorted(record["id"] for record in records) == list(range(12))
+    assert all(record["response"] is not None for record in records)
+    assert stats["succeeded"] == 12 and stats["prompt_tokens"] > 0
+
+
+def test_resume_skips_written_ids(stub, tmp_path):
+    output_path = tmp_path / "out.jsonl"
+    StubHandler.failures = [400]    # not retryable: id 0 fails and is sent again on resume
+    run_batch(stub, output_path, range(5), concurrency=1)
+    stats = run_batch(stub, output_path, range(8))
+    assert stats["skipped"] == 4 and stats["requests"] == 4
+    assert StubHandler.counts["requests"] == 9
+    records = read_records(output_path)
+    assert sorted(record["id"] for record in records if record["response"] is not None) == list(range(8))
@@ -0,0 +1,97 @@
+"""
+Tests of the on-disk response cache.
+"""
+import pytest
+
+import llm_cache
+from llm_cache import ResponseCache, assign_slots, request_key
+
+REQUEST = {"model": "gpt-4.1-mini", "messages": [{"role": "user", "content": "Make a puzzle."}], "temperature": 1.0}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake time.time that moves one second per call, plus what the test adds to `clock[0]`."""
+    now = [1000.0]
+
+    def time():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(llm_cache.time, "time", time)
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ResponseCache(str(tmp_path / "cache.sqlite"), samples_per_key=2) as cache:
+        yield cache
+
+
+def test_same_request_hits(cache):
+    cache.put(REQUEST, {"content": "puzzle"})
+    assert cache.get(dict(REQUEST)) == {"content": "puzzle"}
+    # The batch id is bookkeeping, not part of the request
+    assert cache.get({**REQUEST, "id": 7}) == {"content": "puzzle"}
+
+
+@pytest.mark.parametrize("change", [
+    {"model": "gpt-4.1"},
+    {"messages": [{"role": "user", "content": "Make another puzzle."}]},
+    {"temperature": 0.5},
+    {"top_p": 0.9},
+])
+def test_changed_request_misses(cache, change):
+    cache.put(REQUEST, {"content": "puzzle"})
+    assert request_key({**REQUEST, **change}) != request_key(REQUEST)
+    assert cache.get({**REQUEST, **change}) is None
+
+
+def test_slots_keep_samples_distinct(cache):
+    batch = [REQUEST, {**REQUEST, "model": "gpt-4.1"}, REQUEST, REQUEST]
+    slots = assign_slots(batch)
+    assert slots == [0, 0, 1, 2]
+    for i, (request, slot) in enumerate(zip(batch, slots)):
+        cache.put(request, {"content": f"sample {i}"}, slot)
+    # Two slots per key: the third occurrence wraps around onto the first sample, which is kept
+    assert [cache.get(request, slot)["content"] for request, slot in zip(batch, slots)] == ["sample 0", "sample 1", "sample 2", "sample 0"]
+    assert len(cache) == 3
+
+
+def test_max_entries_evicts_least_recently_used(tmp_path, clock):
+    with ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2) as cache:
+        requests = [{**REQUEST, "messages": [{"role": "user", "content": f"prompt {i}"}]} for i in range(3)]
+        cache.put(requests[0], {"content": "0"})
+        cache.put(requests[1], {"content": "1"})
+        assert cache.get(requests[0]) is not None    # request 1 is now the least recently used
+        cache.put(requests[2], {"content": "2"})
+        assert len(cache) == 2 and cache.evictions == 1
+        assert cache.get(requests[1]) is None
+        assert cache.get(requests[0]) is not None and cache.get(requests[2]) is not None
+
+
+def test_ttl_expires_entries(tmp_path, clock):
+    with ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60) as cache:
+        cache.put(REQUEST, {"content": "puzzle"})
+        clock[0] += 30
+        assert cache.get(REQUEST) is not None
+        clock[0] += 30
+        assert cache.get(REQUEST) is None
+        assert cache.evictions == 1 and len(cache) == 0
+
+
+def test_stats_count_hits_and_misses(cache):
+    assert cache.get(REQUEST) is None
+    cache.put(REQUEST, {"content": "puzzle"})
+    cache.get(REQUEST)
+    cache.get(REQUEST)
+    cache.get(REQUEST, slot=1)
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "evictions": 0, "entries": 1}
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with ResponseCache(path) as cache:
+        cache.put(REQUEST, {"content": "puzzle", "usage": {"prompt_tokens": 3, "completion_tokens": 5}})
+    with ResponseCache(path) as cache:
+        assert cache.get(REQUEST)["usage"] == {"prompt_tokens": 3, "completion_tokens": 5}
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from common import Color, TranslationalSymmetry, MirrorSymmetry, orbit, orbit_labels, detect_rotational_symmetry
+
+
+def rotational_symmetry(center_x, center_y):
+    # RotationalSymmetry is local to detect_rotational_symmetry: take its class from a detection
+    uniform = np.full((3, 3), Color.RED)
+    return type(detect_rotational_symmetry(uniform, ignore_colors=[]))(center_x, center_y)
+
+
+def orbit_partition(grid, symmetries):
+    """Reference: the classes of the transitive closure of `orbit`, with a plain union-find."""
+    n, m = grid.shape
+    parent = list(range(n * m))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for x in range(n):
+        for y in range(m):
+            for x2, y2 in orbit(grid, x, y, symmetries):
+                parent[find(x * m + y)] = find(x2 * m + y2)
+    return np.array([find(i) for i in range(n * m)]).reshape(n, m)
+
+
+def same_partition(labels1, labels2):
+    pairs = set(zip(labels1.ravel().tolist(), labels2.ravel().tolist()))
+    return len(pairs) == len(np.unique(labels1)) == len(np.unique(labels2))
+
+
+CASES = [
+    ((4, 8), lambda: [rotational_symmetry(1.5, 3.5)]),              # off-center: (0, 0) only reaches (3, 7) in two steps
+    ((4, 8), lambda: [rotational_symmetry(2, 5)]),
+    ((7, 7), lambda: [rotational_symmetry(3, 3)]),
+    ((6, 9), lambda: [rotational_symmetry(2.5, 2.5), MirrorSymmetry(None, 4)]),
+    ((10, 12), lambda: [TranslationalSymmetry(3, 0), TranslationalSymmetry(0, 4)]),
+    ((9, 9), lambda: [TranslationalSymmetry(2, 1)]),
+    ((8, 5), lambda: [MirrorSymmetry(3.5, None), MirrorSymmetry(None, 2)]),
+    ((8, 5), lambda: [MirrorSymmetry(2, 1.5)]),
+    ((6, 7), lambda: [TranslationalSymmetry(1.5, 0.5)]),                # iterates off the lattice: rounding matters
+]
+
+
+@pytest.mark.parametrize("shape, symmetries", CASES)
+def test_orbit_labels_matches_orbit(shape, symmetries):
+    grid = np.zeros(shape, dtype=int)
+    symmetries = symmetries()
+    labels = orbit_labels(grid, symmetries)
+    assert labels.shape == shape
+    assert same_partition(labels, orbit_partition(grid, symmetries))
+
+
+def test_off_center_rotation_links_every_iterate():
+    grid = np.zeros((4, 8), dtype=int)
+    symmetry = rotational_symmetry(1.5, 3.5)
+    labels = orbit_labels(grid, [symmetry])
+    assert labels[0, 0] == labels[3, 7]
+    for x, y in [(0, 0), (1, 2), (3, 3)]:
+        for x2, y2 in orbit(grid, x, y, [symmetry]):
+            assert labels[x, y] == labels[x2, y2]
+
+
+@pytest.mark.parametrize("shape, symmetries", CASES)
+def test_apply_on_arrays_rounds_like_points(shape, symmetries):
+    x, y = np.indices(shape).reshape(2, -1)
+    for symmetry in symmetries():
+        for i in range(*symmetry._iter_range(shape)):
+            new_x, new_y = symmetry.apply(x, y, i)
+            expected = np.array([symmetry.apply(int(a), int(b), i) for a, b in zip(x, y)])
+            assert np.array_equal(np.broadcast_to(new_x, x.shape), expected[:, 0])
+            assert np.array_equal(np.broadcast_to(new_y, y.shape), expected[:, 1])
@@ -0,0 +1,68 @@
+"""
+Example selection of the prompt builders, on a catalog of synthetic seeds.
+"""
+import pytest
+
+pytest.importorskip("openai")
+
+import generate_text
+from seed_catalog import SeedCatalog
+from seed_index import SeedIndex
+
+CONCEPTS = ["gravity", "occlusion", "symmetry", "counting", "scaling", "recoloring", "rotation", "translation"]
+SEED = '''from common import *
+
+# concepts:
+# {concept}
+
+# description:
+# In the input you will see objects, and the transformation is about {concept} number {i}.
+
+def main(input_grid):
+    return input_grid
+'''
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    (tmp_path / "common.py").write_text("class Color:\n    BLACK = 0\n")
+    for i in range(40):
+        (tmp_path / f"{i:08x}.py").write_text(SEED.format(concept=CONCEPTS[i % len(CONCEPTS)], i=i))
+    catalog = SeedCatalog(str(tmp_path), path=str(tmp_path / "catalog.json"))
+    monkeypatch.setattr(generate_text, "_seed_catalog", catalog)
+    monkeypatch.setattr(generate_text, "_seed_index", SeedIndex())
+    return catalog
+
+
+def examples_in(prompt, catalog):
+    return [entry["name"] for entry in catalog if entry["content"] in prompt]
+
+
+@pytest.mark.parametrize("num_examples", [1, 3, 5])
+def test_problem_prompt_retrieves_similar_seeds(catalog, num_examples):
+    prompt = generate_text.get_problem_prompt("Objects fall down because of gravity", num_examples=num_examples)
+    examples = examples_in(prompt, catalog)
+    assert len(examples) == num_examples
+    assert all("gravity" in catalog[name]["concepts"] for name in examples)
+
+
+@pytest.mark.parametrize("description", ["zzqx qqvv", "Flood the maze with teal paint from the gravity well"])
+def test_problem_prompt_fills_with_random_seeds(catalog, description):
+    # Seeds 0, 8, 16, 24, 32 are about gravity: asking for more than them needs random ones
+    num_examples = 7
+    prompt = generate_text.get_problem_prompt(description, num_examples=num_examples)
+    assert len(examples_in(prompt, catalog)) == num_examples
+    assert generate_text.get_problem_prompt(description, num_examples=num_examples) == prompt
+
+
+def test_problem_prompt_fill_depends_on_the_description(catalog):
+    prompts = {generate_text.get_problem_prompt(f"zzqx qqvv {i}", num_examples=3) for i in range(5)}
+    assert len(prompts) > 1
+
+
+def test_description_prompt_is_capped(catalog):
+    prompt = generate_text.get_prompt(num_examples=10, seed=1)
+    assert sum(f"number {i}." in prompt for i in range(40)) == 10
+    assert generate_text.get_prompt(num_examples=10, seed=1) == prompt
+    assert generate_text.get_prompt(num_examples=10, seed=2) != prompt
+    assert sum(f"number {i}." in generate_text.get_prompt(num_examples=None) for i in range(40)) == 40
@@ -0,0 +1,33 @@
+"""
+random_sprite fails instead of hanging on parameters that cannot produce an acceptable sprite.
+"""
+import numpy as np
+import pytest
+
+import common
+from common import Color, random_sprite
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    attempts = []
+
+    def empty_sprite(n, m, *args):
+        attempts.append(1)
+        return np.full((n[0], m[0]), Color.BLACK)
+
+    monkeypatch.setattr(common, "_random_sprite_attempt", empty_sprite)
+    monkeypatch.setattr(common, "_MAX_SPRITE_ATTEMPTS", 20)
+    with pytest.raises(ValueError, match=r"n=\[1\], m=\[7\], density=0.05, symmetry=horizontal"):
+        random_sprite(1, 7, density=0.05, symmetry="horizontal", rng=np.random.default_rng(0))
+    assert len(attempts) == 20
+
+
+def test_background_only_palette():
+    with pytest.raises(ValueError, match="no color other than the background"):
+        random_sprite([2, 3], 9, color_palette=[Color.BLACK], rng=np.random.default_rng(0))
+
+
+@pytest.mark.parametrize("symmetry", ["horizontal", "vertical", "not_symmetric", "mirror"])
+def test_sparse_thin_sprites_are_still_generated(symmetry):
+    sprite = random_sprite(1, 7, density=0.05, symmetry=symmetry, rng=np.random.default_rng(0))
+    assert sprite.shape == (1, 7) and np.all(sprite != Color.BLACK)
@@ -0,0 +1,43 @@
+"""
+Crash accounting and reproducibility of the seed runner.
+"""
+import os
+
+import numpy as np
+
+from run_seeds import attempt_streams, run_attempts, run_seeds, seeds_dir
+
+# Kills its process on about half of the attempts, the same ones on every run (`random` is seeded per attempt)
+CRASHING_SEED = '''import os
+import random
+import numpy as np
+
+def generate_input():
+    if random.random() < 0.5:
+        os._exit(1)
+    return np.zeros((2, 2), dtype=int)
+
+def main(input_grid):
+    return input_grid
+'''
+
+
+def test_only_crashing_attempts_are_crashes(tmp_path):
+    path = tmp_path / "0000000a.py"
+    path.write_text(CRASHING_SEED)
+    [metrics] = run_seeds([str(path)], str(tmp_path / "run"), num_inputs=6, memory_limit_mb=0, num_workers=1, chunk_size=6)
+    assert metrics["attempts"] == 6
+    assert metrics["successes"] > 0 and metrics["crashes"] > 0
+    assert metrics["successes"] + metrics["crashes"] == 6
+    assert metrics["success_rate"] == metrics["successes"] / 6
+
+
+
+def test_seeded_reruns_give_the_same_grids():
+    # run_attempts seeds `random`, `np.random` and the rng_context of common.py from the same stream
+    path = os.path.join(seeds_dir, "0dfd9992.py")
+    streams = attempt_streams("0dfd9992", 3, seed=7)
+    first, second = (run_attempts(path, range(3), streams) for _ in range(2))
+    for a, b in zip(first, second):
+        assert a["status"] == b["status"] == "ok"
+        assert np.array_equal(a["input"], b["input"]) and np.array_equal(a["output"], b["output"])
@@ -0,0 +1,77 @@
+"""
+Tests of the incremental updates of the seed catalog.
+"""
+import os
+
+import pytest
+
+import seed_catalog
+from seed_catalog import SeedCatalog
+
+SEED = '''from common import *
+
+# concepts:
+# {concept}
+
+# description:
+# In the input you will see {concept}.
+
+def main(input_grid):
+    return input_grid
+'''
+
+
+@pytest.fixture
+def seeds_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(seed_catalog, "cache_dir", str(tmp_path / "cache"))
+    seeds_dir = tmp_path / "seeds"
+    seeds_dir.mkdir()
+    (seeds_dir / "common.py").write_text('class Color:\n    BLACK = 0\n')
+    (seeds_dir / "00000001.py").write_text(SEED.format(concept="gravity"))
+    return seeds_dir
+
+
+def test_update_rescans_only_when_the_directory_changes(seeds_dir, monkeypatch):
+    catalog = SeedCatalog(str(seeds_dir))
+    assert catalog.names() == ["00000001"]
+    assert catalog.update() == 0
+
+    (seeds_dir / "00000002.py").write_text(SEED.format(concept="occlusion"))
+    assert catalog.update() == 1
+    assert catalog.with_concept("occlusion") == ["00000002"]
+
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    assert catalog.update() == 0 and not scans
+
+    os.remove(seeds_dir / "00000001.py")
+    assert catalog.update() == 1 and scans
+    assert catalog.names() == ["00000002"]
+
+
+def test_update_without_initial_refresh(seeds_dir):
+    SeedCatalog(str(seeds_dir))
+    catalog = SeedCatalog(str(seeds_dir), refresh=False)
+    assert catalog.update() == 0
+    assert catalog.names() == ["00000001"] and catalog.dir_stat is not None
+
+
+def test_catalog_is_saved_outside_the_seeds_directory(seeds_dir, tmp_path):
+    catalog = SeedCatalog(str(seeds_dir))
+    assert os.path.dirname(catalog.path) == str(tmp_path / "cache") and os.path.exists(catalog.path)
+    assert sorted(os.listdir(seeds_dir)) == ["00000001.py", "common.py"]
+    assert SeedCatalog(str(seeds_dir), refresh=False).names() == ["00000001"]
+
+
+def test_seeds_edited_in_place_are_seen_by_a_full_refresh(seeds_dir):
+    catalog = SeedCatalog(str(seeds_dir))
+    path = seeds_dir / "00000001.py"
+    stat = os.stat(path)
+    path.write_text(SEED.format(concept="rotation"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    os.utime(seeds_dir, ns=(catalog.dir_stat[0], catalog.dir_stat[0]))   # an in-place write leaves the directory as is
+    assert catalog.update() == 0
+    assert catalog.update(max_age=60) == 0
+    assert catalog.update(max_age=0) == 1
+    assert catalog.with_concept("rotation") == ["00000001"]
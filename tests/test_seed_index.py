@@ -0,0 +1,44 @@
+"""
+Tests of the incremental TF-IDF norms of the seed index against a direct computation.
+"""
+import math
+import random
+
+import pytest
+
+from seed_index import SeedIndex
+
+WORDS = [f"word{i}" for i in range(40)]
+
+
+def direct_norm(index, name):
+    return math.sqrt(sum((count * index.idf(term)) ** 2 for term, count in index.term_counts[name].items()))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_norms_follow_insertions_and_removals(seed):
+    rng = random.Random(seed)
+    index = SeedIndex(min_candidates=1000)
+    for step in range(60):
+        if index.term_counts and rng.random() < 0.3:
+            index.remove(rng.choice(sorted(index.term_counts)))
+        else:
+            # Names are reused, so some insertions replace an indexed seed
+            index.add(f"seed{rng.randrange(40)}", rng.sample(WORDS, 2), " ".join(rng.choices(WORDS, k=rng.randrange(1, 8))))
+        for name in index.term_counts:
+            assert index.norm(name) == pytest.approx(direct_norm(index, name), rel=1e-9)
+
+
+def test_search_scores_are_cosine_similarities():
+    rng = random.Random(0)
+    index = SeedIndex(min_candidates=1000)
+    for i in range(30):
+        index.add(f"seed{i}", rng.sample(WORDS, 2), " ".join(rng.choices(WORDS, k=6)))
+    query = " ".join(rng.choices(WORDS, k=5))
+    query_index = SeedIndex()
+    query_index.add("query", [], query)
+    for name, similarity in index.search(query, k=30):
+        counts, query_counts = index.term_counts[name], query_index.term_counts["query"]
+        dot = sum(query_counts[t] * counts[t] * index.idf(t) ** 2 for t in query_counts if t in counts)
+        query_norm = math.sqrt(sum((query_counts[t] * index.idf(t)) ** 2 for t in query_counts if t in index.postings))
+        assert similarity == pytest.approx(dot / (query_norm * direct_norm(index, name)))